@@ -0,0 +1,65 @@
+"""
+Клиенты сценария: один посетитель со своими cookie (сессия, CSRF).
+
+InProcessClient — django.test.Client: запрос проходит весь WSGI-обработчик и middleware в этом же
+процессе, без сети. HttpClient — настоящий HTTP к запущенному серверу (gunicorn), urllib без
+переходов по редиректам: 302 после оформления заказа — это ответ шага, а не следующая страница.
+request() возвращает (статус, тело, Location).
+"""
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+class InProcessClient:
+    def __init__(self):
+        from django.test import Client
+
+        self._client = Client(SERVER_NAME="localhost", enforce_csrf_checks=True)
+
+    def request(self, method: str, path: str, data=None, headers=None) -> tuple[int, bytes, str]:
+        if method == "POST":
+            response = self._client.post(path, data or {}, headers=headers)
+        else:
+            response = self._client.get(path, data or {}, headers=headers)
+        return response.status_code, response.content, response.get("Location", "")
+
+    def cookie(self, name: str) -> str:
+        morsel = self._client.cookies.get(name)
+        return morsel.value if morsel else ""
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpClient:
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._jar = http.cookiejar.CookieJar()
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self._jar), _NoRedirect)
+
+    def request(self, method: str, path: str, data=None, headers=None) -> tuple[int, bytes, str]:
+        url = self.base_url + path
+        body = None
+        if method == "POST":
+            body = urllib.parse.urlencode(data or {}).encode()
+        elif data:
+            url += "?" + urllib.parse.urlencode(data)
+        req = urllib.request.Request(url, data=body, method=method, headers={"User-Agent": "HardcodeStore-bench/1.0"})
+        for key, value in (headers or {}).items():
+            req.add_header(key, value)
+        if body is not None:
+            req.add_header("Content-Type", "application/x-www-form-urlencoded")
+        try:
+            with self._opener.open(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read(), resp.headers.get("Location", "")
+        except urllib.error.HTTPError as e:
+            # 3xx (редиректы не выполняются), 4xx, 5xx
+            return e.code, e.read(), e.headers.get("Location", "")
+
+    def cookie(self, name: str) -> str:
+        return next((c.value for c in self._jar if c.name == name), "")
@@ -0,0 +1,165 @@
+"""
+Сценарий покупателя и прогон под нагрузкой.
+
+Один проход (journey) — новый посетитель: каталог → категория → товар → в корзину → корзина →
+оформление (страница и отправка формы) → выгрузка заказов через API (список и пачка), как внешняя система.
+Каждый шаг — отдельный HTTP-запрос; его время и ожидаемый ли ответ записываются в Sample.
+
+run() гоняет проходы в --concurrency потоках, каждый поток со своим генератором случайных чисел
+(seed + номер потока) — выбор товаров и категорий воспроизводим.
+"""
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.conf import settings
+
+# Шаг → ожидаемый HTTP-статус
+STEPS = {
+    "browse": 200,
+    "category": 200,
+    "product": 200,
+    "cart_add": 200,
+    "cart": 200,
+    "checkout": 200,
+    "checkout_submit": 302,
+    "sync_list": 200,
+    "sync_batch": 200,
+}
+# Шаг → куда должен вести редирект: при ошибке оформления вьюха тоже отвечает 302 (обратно на форму)
+REDIRECTS = {
+    "checkout_submit": "/catalog/order-success/",
+}
+
+
+@dataclass
+class Sample:
+    step: str
+    ms: float
+    ok: bool
+
+
+@dataclass
+class Catalog:
+    """Что выбирает посетитель: товары с вариантом по умолчанию, корневые категории, uuid заказов для API."""
+
+    products: list
+    categories: list
+    order_uuids: list
+    delivery_method_id: int
+
+    @classmethod
+    def load(cls, limit: int = 5000) -> "Catalog":
+        from catalog.models import ProductListing
+        from orders.models import Order
+
+        from .seed import ensure_delivery_method
+
+        listing = ProductListing.objects.filter(is_active=True, in_stock=True, default_variant_id__isnull=False)
+        products = list(listing.exclude(slug="").values_list("slug", "default_variant_id")[:limit])
+        categories = sorted(set(listing.exclude(root_category_slug="").values_list("root_category_slug", flat=True)))
+        if not products:
+            raise ValueError("В каталоге нет товаров в наличии: python manage.py bench_seed")
+        order_uuids = [str(u) for u in Order.objects.order_by("-pk").values_list("uuid", flat=True)[:limit]]
+        return cls(products, categories, order_uuids, ensure_delivery_method().pk)
+
+
+class Journey:
+    def __init__(self, client, catalog: Catalog, rng: random.Random, since: int, shopper: int):
+        self.client = client
+        self.catalog = catalog
+        self.rng = rng
+        self.since = since
+        self.shopper = shopper
+        self.samples: list[Sample] = []
+
+    def _step(self, step: str, method: str, path: str, data=None, headers=None) -> bytes:
+        t0 = time.perf_counter()
+        try:
+            status, body, location = self.client.request(method, path, data, headers)
+        except Exception:
+            status, body, location = 0, b"", ""
+        ok = status == STEPS[step] and REDIRECTS.get(step, "") in location
+        self.samples.append(Sample(step, (time.perf_counter() - t0) * 1000, ok))
+        return body
+
+    def _post(self, step: str, path: str, data: dict, headers=None) -> bytes:
+        headers = dict(headers or {}, **{"X-CSRFToken": self.client.cookie("csrftoken")})
+        return self._step(step, "POST", path, data, headers)
+
+    def run(self) -> list[Sample]:
+        slug, variant_id = self.rng.choice(self.catalog.products)
+        self._step("browse", "GET", "/catalog/")
+        if self.catalog.categories:
+            self._step("category", "GET", f"/catalog/category/{self.rng.choice(self.catalog.categories)}/")
+        self._step("product", "GET", f"/catalog/product/{slug}/")
+        self._post("cart_add", "/catalog/cart/add/", {"variant_id": variant_id, "qty": 1, "source": "detail"},
+                   headers={"X-Requested-With": "XMLHttpRequest"})
+        self._step("cart", "GET", "/catalog/cart/")
+        self._step("checkout", "GET", "/catalog/checkout/")
+        self._post("checkout_submit", "/catalog/checkout/", {
+            "name": "Покупатель",
+            "email": f"shopper{self.shopper}@bench.local",
+            "phone": "+79000000000",
+            "delivery_method": self.catalog.delivery_method_id,
+            "delivery_city": "Москва",
+            "delivery_address": "ул. Тестовая, д. 1",
+            "delivery_cost": "300",
+            "payment_type": "cash",
+        })
+
+        api_headers = {"X-API-Key": getattr(settings, "ORDER_SYNC_API_KEY", None) or ""}
+        body = self._step("sync_list", "GET", "/api/order-sync/", {"since": self.since}, api_headers)
+        try:
+            uuids = json.loads(body).get("results", [])[-50:]
+        except ValueError:
+            uuids = []
+        if not uuids and self.catalog.order_uuids:
+            uuids = self.rng.sample(self.catalog.order_uuids, min(50, len(self.catalog.order_uuids)))
+        if uuids:
+            self._step("sync_batch", "GET", "/api/orders/batch/", {"uuids": ",".join(uuids)}, api_headers)
+        return self.samples
+
+
+def run(client_factory: Callable[[], object], catalog: Catalog, *, iterations: int, concurrency: int = 1,
+        warmup: int = 1, random_seed: int = 42,
+        progress: Optional[Callable[[int, int], None]] = None) -> tuple[list[Sample], float]:
+    """
+    iterations проходов на каждый из concurrency потоков (плюс warmup проходов до замера, не учитываются).
+    Возвращает (замеры, время прогона в секундах).
+    """
+    since = int(time.time())
+    for i in range(warmup):
+        Journey(client_factory(), catalog, random.Random(random_seed - 1 - i), since, -1 - i).run()
+
+    samples: list[Sample] = []
+    lock = threading.Lock()
+    total = iterations * concurrency
+    done = [0]
+
+    def worker(n: int):
+        from django.db import connection
+
+        rng = random.Random(random_seed + n)
+        try:
+            for i in range(iterations):
+                result = Journey(client_factory(), catalog, rng, since, n * iterations + i).run()
+                with lock:
+                    samples.extend(result)
+                    done[0] += 1
+                    if progress:
+                        progress(done[0], total)
+        finally:
+            # Потоку своё соединение с БД (в режиме без сети), закрывается вместе с потоком
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(n,), name=f"bench-{n}") for n in range(concurrency)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - t0
@@ -0,0 +1,98 @@
+"""
+Нагрузочный тест: сценарий покупателя (bench/journey.py), RPS и перцентили времени по шагам,
+результат — JSON в bench/results/ для сравнения коммитов.
+
+Режимы:
+  inprocess — запросы через WSGI-обработчик в этом процессе (без сети и gunicorn; GIL — один поток
+              на CPU, параллельность показывает блокировки, а не пропускную способность);
+  http      — к запущенному серверу, например: gunicorn store.wsgi -w 4 -b 127.0.0.1:8000
+
+Перед прогоном — данные: python manage.py bench_seed. Прогон создаёт заказы (шаг оформления).
+
+Использование:
+  python manage.py bench_run
+  python manage.py bench_run --iterations 50 --concurrency 4
+  python manage.py bench_run --mode http --url http://127.0.0.1:8000 --concurrency 16 --iterations 20
+  python manage.py bench_run --compare bench/results/20261019-120000-abc1234.json
+"""
+import sys
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bench import results
+from bench.clients import HttpClient, InProcessClient
+from bench.journey import Catalog, run
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест магазина: сценарий покупателя, RPS и перцентили по шагам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Адрес сервера для --mode http")
+        parser.add_argument("--iterations", type=int, default=20, help="Проходов сценария на поток")
+        parser.add_argument("--concurrency", type=int, default=1, help="Параллельных посетителей (потоков)")
+        parser.add_argument("--warmup", type=int, default=2, help="Проходов до замера (прогрев кэшей)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--label", default="", help="Метка в результате (что меняли)")
+        parser.add_argument("--output", default="", help="Файл результата (по умолчанию bench/results/…)")
+        parser.add_argument("--compare", default="", help="Прошлый результат для сравнения")
+        parser.add_argument("--force", action="store_true", help="Запустить при DEBUG=False")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("DEBUG=False: прогон создаёт заказы. Если это тестовый сервер — добавьте --force.")
+        if options["iterations"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--iterations и --concurrency должны быть положительными.")
+        baseline = results.load(options["compare"]) if options["compare"] else None
+
+        try:
+            catalog = Catalog.load()
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["mode"] == "http":
+            client_factory = partial(HttpClient, options["url"])
+        else:
+            client_factory = InProcessClient
+            if settings.DEBUG:
+                self.stdout.write(self.style.WARNING(
+                    "DEBUG=True: Django запоминает SQL-запросы и отдаёт отладочные страницы — цифры хуже рабочих."
+                ))
+
+        tty = sys.stdout.isatty()
+
+        def progress(done, total):
+            if tty:
+                self.stdout.write(f"\rпроходов: {done}/{total}", ending="")
+                self.stdout.flush()
+
+        samples, seconds = run(
+            client_factory, catalog, iterations=options["iterations"], concurrency=options["concurrency"],
+            warmup=options["warmup"], random_seed=options["seed"], progress=progress,
+        )
+        if tty:
+            self.stdout.write("")
+
+        result = {"meta": results.meta(
+            mode=options["mode"],
+            url=options["url"] if options["mode"] == "http" else "",
+            iterations=options["iterations"],
+            concurrency=options["concurrency"],
+            warmup=options["warmup"],
+            seed=options["seed"],
+            label=options["label"],
+        )}
+        result.update(results.summarize(samples, seconds, options["iterations"] * options["concurrency"]))
+
+        for line in results.format_table(result, baseline):
+            self.stdout.write(line)
+        total = result["total"]
+        self.stdout.write(
+            f"Проходов: {total['journeys']} за {total['seconds']:.1f} с ({total['journeys_per_sec']:.1f}/с), "
+            f"запросов {total['requests']} ({total['rps']:.1f}/с), ошибок {total['errors']}"
+        )
+        path = results.save(result, options["output"])
+        style = self.style.WARNING if total["errors"] else self.style.SUCCESS
+        self.stdout.write(style(f"Результат: {path}"))
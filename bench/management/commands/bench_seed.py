@@ -0,0 +1,72 @@
+"""
+Данные для нагрузочного теста (bench): каталог, пользователи, заказы — см. bench/seed.py.
+
+Только для тестовой базы: данные помечены (slug «bench-…», email @bench.local) и удаляются --purge.
+При DEBUG=False команда не запускается без --force.
+
+Использование:
+  python manage.py bench_seed                      # --scale small
+  python manage.py bench_seed --scale medium
+  python manage.py bench_seed --products 5000 --orders 20000
+  python manage.py bench_seed --purge              # удалить данные теста
+  python manage.py bench_seed --reset --scale large   # удалить и создать заново
+"""
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bench import seed
+
+
+class Command(BaseCommand):
+    help = "Создать или удалить данные нагрузочного теста"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(seed.SCALES), default="small")
+        parser.add_argument("--products", type=int, help="Товаров (вместо значения из --scale)")
+        parser.add_argument("--users", type=int, help="Пользователей")
+        parser.add_argument("--orders", type=int, help="Заказов")
+        parser.add_argument("--seed", type=int, default=42, help="Seed генератора случайных чисел")
+        parser.add_argument("--purge", action="store_true", help="Только удалить данные теста")
+        parser.add_argument("--reset", action="store_true", help="Удалить данные теста и создать заново")
+        parser.add_argument("--force", action="store_true", help="Запустить при DEBUG=False")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("DEBUG=False: похоже на рабочую базу. Если это тестовый сервер — добавьте --force.")
+
+        if options["purge"] or options["reset"]:
+            removed = seed.purge()
+            self.stdout.write(
+                f"Удалено: товаров {removed['products']}, пользователей {removed['users']}, заказов {removed['orders']}"
+            )
+            if options["purge"]:
+                return
+        elif seed.exists():
+            raise CommandError("Данные теста уже есть: --reset, чтобы пересоздать, или --purge, чтобы удалить.")
+
+        sizes = dict(seed.SCALES[options["scale"]])
+        for key in sizes:
+            if options[key] is not None:
+                sizes[key] = max(0, options[key])
+        if sizes["products"] < 1:
+            raise CommandError("Нужен хотя бы один товар.")
+
+        tty = sys.stdout.isatty()
+
+        def progress(what, done, total):
+            if tty:
+                self.stdout.write(f"\r{what}: {done}/{total}", ending="")
+                self.stdout.flush()
+
+        t0 = time.perf_counter()
+        created = seed.seed(sizes["products"], sizes["users"], sizes["orders"], random_seed=options["seed"],
+                            progress=progress)
+        if tty:
+            self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: товаров {created['products']}, вариантов {created['variants']}, "
+            f"пользователей {created['users']}, заказов {created['orders']} за {time.perf_counter() - t0:.1f} с"
+        ))
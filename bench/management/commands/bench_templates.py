@@ -0,0 +1,38 @@
+"""
+Накладные расходы шаблонов по страницам (bench/render.py): отрисовка без кэша шаблонов, с кэшем
+и с ленивым контекстом (TEMPLATE_LAZY_CONTEXT) — p50 в мс и SQL-запросы за одну отрисовку.
+
+Нужны данные: python manage.py bench_seed. Добавляет товар в корзину своей сессии, заказов не создаёт.
+
+Использование:
+  python manage.py bench_templates
+  python manage.py bench_templates --repeat 200 --output bench/results/templates.json
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from bench import render, results
+from bench.journey import Catalog
+
+
+class Command(BaseCommand):
+    help = "Время отрисовки шаблонов страниц: кэш загрузчика и ленивый контекст"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50, help="Отрисовок на страницу и режим")
+        parser.add_argument("--output", default="", help="Сохранить результат в JSON")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat должен быть положительным.")
+        try:
+            catalog = Catalog.load()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        pages = render.run(catalog, repeat=options["repeat"])
+        for line in render.format_table(pages):
+            self.stdout.write(line)
+        if options["output"]:
+            path = results.save({"meta": results.meta(kind="templates", repeat=options["repeat"]), "pages": pages},
+                                options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Результат: {path}"))
@@ -0,0 +1,131 @@
+"""
+Накладные расходы шаблонов по страницам — без вьюх: отрисовка шаблона с контекстом и контекст-процессорами.
+
+Страница запрашивается через InProcessClient, внешний render() перехватывается: шаблон, контекст вьюхи
+и запрос. Затем тот же шаблон с тем же контекстом рисуется repeat раз в трёх режимах:
+  nocache — шаблоны (и родительские, и {% include %}) читаются и компилируются заново, контекст считается весь;
+  eager   — кэширующий загрузчик, TEMPLATE_LAZY_CONTEXT=False;
+  lazy    — кэширующий загрузчик, TEMPLATE_LAZY_CONTEXT=True (как в settings по умолчанию).
+На режим — p50/p95 времени отрисовки в мс и число SQL-запросов за одну отрисовку.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.template import Engine
+from django.template.backends.django import Template
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .clients import InProcessClient
+from .journey import Catalog
+from .results import _percentile
+
+MODES = ("nocache", "eager", "lazy")
+
+
+@contextmanager
+def _capture(found: list):
+    """Первый вызов render() шаблона страницы: (шаблон, контекст вьюхи, запрос)."""
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        if not found:
+            found.append((self, dict(context or {}), request))
+        return original(self, context, request)
+
+    Template.render = render
+    try:
+        yield
+    finally:
+        Template.render = original
+
+
+def _uncached_engine(template: Template) -> Engine:
+    """Движок с теми же настройками, что у шаблона, но без кэширующего загрузчика."""
+    engine = template.template.engine
+    return Engine(
+        dirs=engine.dirs,
+        context_processors=engine.context_processors,
+        debug=engine.debug,
+        loaders=["django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader"],
+        string_if_invalid=engine.string_if_invalid,
+        file_charset=engine.file_charset,
+        libraries=engine.libraries,
+        autoescape=engine.autoescape,
+    )
+
+
+def _measure(template: Template, context: dict, request, repeat: int, uncached: Engine = None) -> dict:
+    times = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            t0 = time.perf_counter()
+            if uncached is not None:
+                template = Template(uncached.get_template(template.origin.template_name), template.backend)
+            template.render(dict(context), request)
+            times.append((time.perf_counter() - t0) * 1000)
+        queries = len(captured)
+    times.sort()
+    return {"p50": round(_percentile(times, 50), 3), "p95": round(_percentile(times, 95), 3), "queries": queries}
+
+
+def _page(template: Template, context: dict, request, repeat: int) -> dict:
+    with override_settings(TEMPLATE_LAZY_CONTEXT=False):
+        result = {
+            "template": template.origin.template_name,
+            "nocache": _measure(template, context, request, repeat, _uncached_engine(template)),
+            "eager": _measure(template, context, request, repeat),
+        }
+    with override_settings(TEMPLATE_LAZY_CONTEXT=True):
+        result["lazy"] = _measure(template, context, request, repeat)
+    return result
+
+
+def _pages(catalog: Catalog) -> list:
+    slug = catalog.products[0][0]
+    pages = [("catalog", "/catalog/")]
+    if catalog.categories:
+        pages.append(("category", f"/catalog/category/{catalog.categories[0]}/"))
+    pages += [
+        ("product", f"/catalog/product/{slug}/"),
+        ("quick_view", f"/catalog/product/{slug}/quick/"),
+        ("cart", "/catalog/cart/"),
+        ("checkout", "/catalog/checkout/"),
+    ]
+    return pages
+
+
+def run(catalog: Catalog, repeat: int = 50) -> dict:
+    """Шаг → замеры по режимам (MODES). cart_row — фрагмент строки корзины из ответа AJAX /catalog/cart/replace/."""
+    client = InProcessClient()
+    client.request("GET", "/catalog/")
+    client.request("POST", "/catalog/cart/add/", {"variant_id": catalog.products[0][1], "qty": 1, "source": "detail"},
+                   {"X-CSRFToken": client.cookie("csrftoken"), "X-Requested-With": "XMLHttpRequest"})
+
+    results = {}
+    for name, path in _pages(catalog):
+        # Первый запрос прогревает кэши (и подключает middleware до перехвата render)
+        client.request("GET", path)
+        found = []
+        with _capture(found):
+            client.request("GET", path)
+        if not found:
+            continue
+        template, context, request = found[0]
+        results[name] = _page(template, context, request, repeat)
+        if name == "cart" and context.get("cart_items"):
+            row = template.backend.get_template("catalog/cart_item_row.html")
+            results["cart_row"] = _page(row, {"item": context["cart_items"][0]}, request, repeat)
+    return results
+
+
+def format_table(pages: dict) -> list[str]:
+    header = f"{'страница':12} " + " ".join(f"{m + ' p50':>12}" for m in MODES) + f" {'SQL eager':>9} {'SQL lazy':>8}"
+    lines = [header]
+    for name, page in pages.items():
+        lines.append(
+            f"{name:12} " + " ".join(f"{page[m]['p50']:12.2f}" for m in MODES)
+            + f" {page['eager']['queries']:9} {page['lazy']['queries']:8}"
+        )
+    return lines
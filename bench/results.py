@@ -0,0 +1,121 @@
+"""
+Сводка прогона, сохранение в JSON и сравнение с прошлым результатом (другой коммит, другие настройки).
+
+Файл: {"meta": {...}, "steps": {шаг: {...}}, "total": {...}}; время — в мс, rps — запросов шага в секунду
+за всё время прогона. meta — коммит (и есть ли незакоммиченные правки), режим, параллельность, объём данных.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.db import connection
+
+from .journey import STEPS
+
+PERCENTILES = (50, 90, 95, 99)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _percentile(sorted_values: list, p: int) -> float:
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def _stats(values: list, errors: int, seconds: float) -> dict:
+    values = sorted(values)
+    result = {"requests": len(values), "errors": errors, "rps": round(len(values) / seconds, 2) if seconds else 0}
+    if values:
+        result["mean"] = round(sum(values) / len(values), 2)
+        result.update({f"p{p}": round(_percentile(values, p), 2) for p in PERCENTILES})
+        result["max"] = round(values[-1], 2)
+    return result
+
+
+def summarize(samples: list, seconds: float, journeys: int) -> dict:
+    steps = {}
+    for step in STEPS:
+        own = [s for s in samples if s.step == step]
+        if own:
+            steps[step] = _stats([s.ms for s in own], sum(1 for s in own if not s.ok), seconds)
+    total = _stats([s.ms for s in samples], sum(1 for s in samples if not s.ok), seconds)
+    total.update({"seconds": round(seconds, 2), "journeys": journeys,
+                  "journeys_per_sec": round(journeys / seconds, 2) if seconds else 0})
+    return {"steps": steps, "total": total}
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, timeout=5,
+                              cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def data_counts() -> dict:
+    from catalog.models import Product, ProductVariant
+    from orders.models import Order
+    from users.models import User
+
+    return {
+        "products": Product.objects.count(),
+        "variants": ProductVariant.objects.count(),
+        "users": User.objects.count(),
+        "orders": Order.objects.count(),
+    }
+
+
+def meta(**options) -> dict:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "debug": settings.DEBUG,
+        "data": data_counts(),
+        **options,
+    }
+
+
+def save(result: dict, path: str = "") -> str:
+    if not path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{stamp}-{result['meta']['commit'] or 'nogit'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _delta(new, old) -> str:
+    if not old or new is None:
+        return "—"
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def format_table(result: dict, baseline: dict = None) -> list[str]:
+    """Строки таблицы по шагам; с baseline — изменение p50, p95 и rps в процентах."""
+    header = f"{'шаг':16} {'запросов':>8} {'ошибок':>6} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    if baseline:
+        header += f" | {'Δp50':>6} {'Δp95':>6} {'Δrps':>6}"
+    lines = [header]
+    rows = list(result["steps"].items()) + [("всего", result["total"])]
+    for step, s in rows:
+        line = (f"{step:16} {s['requests']:8} {s['errors']:6} {s['rps']:8.1f} {s.get('p50', 0):8.1f} "
+                f"{s.get('p90', 0):8.1f} {s.get('p95', 0):8.1f} {s.get('p99', 0):8.1f} {s.get('max', 0):8.1f}")
+        if baseline:
+            old = baseline["total"] if step == "всего" else baseline["steps"].get(step, {})
+            line += (f" | {_delta(s.get('p50'), old.get('p50')):>6} {_delta(s.get('p95'), old.get('p95')):>6} "
+                     f"{_delta(s['rps'], old.get('rps')):>6}")
+        lines.append(line)
+    return lines
@@ -0,0 +1,208 @@
+"""
+Данные для нагрузочного теста: каталог, пользователи и заказы заданного объёма.
+
+Всё создаётся пачками bulk_create (без save() и сигналов очередей выгрузки) и помечено:
+slug товаров, категорий и брендов начинается с «bench-», email — на @bench.local. Генератор
+случайных чисел с фиксированным seed: один и тот же --scale даёт одинаковые данные.
+purge() удаляет помеченное, включая заказы, созданные сценарием покупателя.
+"""
+import random
+from decimal import Decimal
+from typing import Callable, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+
+PREFIX = "bench-"
+EMAIL_DOMAIN = "bench.local"
+BATCH_SIZE = 1000
+
+# Объёмы: товаров, пользователей, заказов
+SCALES = {
+    "small": {"products": 300, "users": 100, "orders": 1000},
+    "medium": {"products": 3000, "users": 1000, "orders": 10000},
+    "large": {"products": 30000, "users": 10000, "orders": 100000},
+}
+
+SIZES = ("XS", "S", "M", "L", "XL", "XXL")
+COLORS = ("Чёрный", "Белый", "Серый", "Синий", "Красный", "Зелёный")
+ROOTS = ("Одежда", "Обувь", "Аксессуары", "Дом", "Спорт")
+CHILDREN = ("Новинки", "Базовое", "Премиум", "Распродажа")
+WORDS = ("Футболка", "Худи", "Кроссовки", "Рюкзак", "Кепка", "Шорты", "Носки", "Куртка", "Плед", "Бутылка")
+
+
+def exists() -> bool:
+    from catalog.models import Product
+
+    return Product.objects.filter(slug__startswith=PREFIX).exists()
+
+
+def _attribute(code: str, name: str, values) -> list:
+    from catalog.models import ProductAttribute, ProductAttributeValue
+
+    attribute, _ = ProductAttribute.objects.get_or_create(code=code, defaults={"name": name})
+    return [ProductAttributeValue.objects.get_or_create(attribute=attribute, value=v)[0] for v in values]
+
+
+def ensure_delivery_method():
+    from orders.models import DeliveryMethod
+
+    method, _ = DeliveryMethod.objects.get_or_create(
+        code="cdek_courier",
+        defaults={"name": "СДЭК курьер", "delivery_type": DeliveryMethod.DeliveryType.COURIER},
+    )
+    if not method.is_active:
+        method.is_active = True
+        method.save(update_fields=["is_active"])
+    return method
+
+
+def _catalog(products: int, rng: random.Random, progress) -> list:
+    """Категории (корни и подкатегории), бренды, товары с 1–4 вариантами и фото. Возвращает варианты."""
+    from catalog.models import Brand, Category, Product, ProductMedia, ProductVariant, ProductVariantAttribute
+
+    leaves = []
+    for i, root_name in enumerate(ROOTS):
+        root = Category.objects.create(name=root_name, slug=f"{PREFIX}c{i}", sort_order=i)
+        for j, child_name in enumerate(CHILDREN):
+            leaves.append(Category.objects.create(name=child_name, slug=f"{PREFIX}c{i}-{j}", parent=root, sort_order=j))
+    brands = Brand.objects.bulk_create([Brand(name=f"Бренд {i}", slug=f"{PREFIX}b{i}") for i in range(10)])
+    sizes = _attribute("size", "Размер", SIZES)
+    colors = _attribute("color", "Цвет", COLORS)
+
+    variants = []
+    for start in range(0, products, BATCH_SIZE):
+        batch = Product.objects.bulk_create([
+            Product(
+                category=rng.choice(leaves),
+                brand=rng.choice(brands) if rng.random() < 0.8 else None,
+                article=f"B{i:06d}",
+                name=f"{rng.choice(WORDS)} {rng.choice(COLORS).lower()} {i}",
+                slug=f"{PREFIX}p{i}",
+                description="Товар для нагрузочного теста.",
+                is_new=rng.random() < 0.1,
+                sort_order=i,
+            )
+            for i in range(start, min(products, start + BATCH_SIZE))
+        ])
+        rows, links, media = [], [], []
+        for product in batch:
+            color = rng.choice(colors)
+            price = Decimal(rng.randrange(500, 9000, 10))
+            for n, size in enumerate(rng.sample(sizes, rng.randint(1, 4))):
+                rows.append((ProductVariant(
+                    product=product, sku=f"{product.article}-{size.value}", price=price, pv=price / 100,
+                    stock=1_000_000, is_default=not n, weight_g=rng.randint(100, 1500),
+                ), (size, color)))
+            media.append(ProductMedia(product=product, file=f"products/bench/{product.slug}.jpg"))
+        created = ProductVariant.objects.bulk_create([v for v, _ in rows])
+        for variant, (_, values) in zip(created, rows):
+            links.extend(ProductVariantAttribute(variant=variant, attribute_value=value) for value in values)
+        ProductVariantAttribute.objects.bulk_create(links)
+        ProductMedia.objects.bulk_create(media)
+        variants.extend(created)
+        if progress:
+            progress("products", start + len(batch), products)
+    return variants
+
+
+def _users(count: int, rng: random.Random, progress) -> list:
+    from users.models import User, UserAddress
+
+    password = make_password("bench")
+    users = []
+    for start in range(0, count, BATCH_SIZE):
+        batch = User.objects.bulk_create([
+            User(
+                email=f"user{i}@{EMAIL_DOMAIN}", username=f"user{i}@{EMAIL_DOMAIN}", password=password,
+                first_name="Покупатель", last_name=str(i), phone=f"+7900{i:07d}",
+                referred_by=rng.choice(users) if users and rng.random() < 0.5 else None,
+            )
+            for i in range(start, min(count, start + BATCH_SIZE))
+        ])
+        UserAddress.objects.bulk_create([
+            UserAddress(user=u, city="Москва", address=f"ул. Тестовая, д. {u.pk}", is_default=True) for u in batch
+        ])
+        users.extend(batch)
+        if progress:
+            progress("users", len(users), count)
+    return users
+
+
+def _orders(count: int, users: list, variants: list, rng: random.Random, progress) -> None:
+    from orders.models import Order, OrderItem
+
+    method = ensure_delivery_method()
+    number = (Order.objects.aggregate(mx=Max("number"))["mx"] or 99999) + 1
+    done = 0
+    for start in range(0, count, BATCH_SIZE):
+        orders, lines = [], []
+        for _ in range(min(BATCH_SIZE, count - start)):
+            user = rng.choice(users) if users else None
+            picked = rng.sample(variants, min(len(variants), rng.randint(1, 3)))
+            order = Order(
+                number=number, user=user, name="Покупатель", email=user.email if user else f"guest@{EMAIL_DOMAIN}",
+                phone="+79000000000", delivery_method=method, delivery_city="Москва",
+                delivery_address="ул. Тестовая, д. 1", total=sum(v.price for v in picked),
+                total_pv=sum(v.pv for v in picked), comment="bench",
+            )
+            number += 1
+            orders.append(order)
+            lines.append(picked)
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, variant=v, quantity=1, price=v.price, pv=v.pv)
+            for order, picked in zip(orders, lines)
+            for v in picked
+        ])
+        done += len(orders)
+        if progress:
+            progress("orders", done, count)
+
+
+def seed(products: int, users: int, orders: int, random_seed: int = 42,
+         progress: Optional[Callable[[str, int, int], None]] = None) -> dict:
+    """Создать данные теста. Возвращает {products, variants, users, orders}."""
+    from catalog import category_tree, facets
+    from catalog.listing import refresh_all
+
+    rng = random.Random(random_seed)
+    with transaction.atomic():
+        variants = _catalog(products, rng, progress)
+        created_users = _users(users, rng, progress)
+        _orders(orders, created_users, variants, rng, progress)
+    refresh_all()
+    facets.invalidate()
+    category_tree.invalidate()
+    category_tree.invalidate_attributes()
+    return {"products": products, "variants": len(variants), "users": users, "orders": orders}
+
+
+def purge() -> dict:
+    """
+    Удалить данные теста. Сигналы удаления заказов и пользователей ставят записи в очереди выгрузки —
+    они удаляются следом: внешняя система не должна узнать о тестовых данных.
+    """
+    from catalog import category_tree, facets
+    from catalog.models import Brand, Category, Product
+    from orders.models import Order, OrderSyncQueue
+    from users.models import User, UserSyncQueue
+
+    email = f"@{EMAIL_DOMAIN}"
+    with transaction.atomic():
+        orders = Order.objects.filter(email__endswith=email)
+        order_uuids = list(orders.values_list("uuid", flat=True))
+        orders.delete()
+        OrderSyncQueue.objects.filter(order_uuid__in=order_uuids).delete()
+        products = Product.objects.filter(slug__startswith=PREFIX).delete()[1].get("catalog.Product", 0)
+        Category.objects.filter(slug__startswith=PREFIX, parent__isnull=True).delete()  # с подкатегориями
+        Brand.objects.filter(slug__startswith=PREFIX).delete()
+        users = User.objects.filter(email__endswith=email)
+        user_uuids = list(users.values_list("uuid", flat=True))
+        users.delete()
+        UserSyncQueue.objects.filter(user_uuid__in=user_uuids).delete()
+    facets.invalidate()
+    category_tree.invalidate()
+    category_tree.invalidate_attributes()
+    return {"products": products, "users": len(user_uuids), "orders": len(order_uuids)}
@@ -277,9 +277,9 @@ class ProductVariantAttributeInline(TabularInline):
 
 @admin.register(ProductVariant)
 class ProductVariantAdmin(ModelAdmin):
-    list_display = ["product", "price", "pv", "stock", "is_default", "weight_g"]
+    list_display = ["product", "sku", "price", "pv", "stock", "is_default", "weight_g"]
     list_filter = ["is_default"]
-    search_fields = ["product__name"]
+    search_fields = ["product__name", "sku"]
     autocomplete_fields = ["product"]
     inlines = [ProductVariantAttributeInline]
     save_as = True
@@ -291,6 +291,7 @@ class ProductVariantAdmin(ModelAdmin):
         for variant in queryset:
             attrs = list(variant.attribute_values.all())
             variant.pk = None
+            variant.sku = None
             variant.is_default = False
             variant.save()
             variant.attribute_values.set(attrs)
@@ -0,0 +1,404 @@
+"""
+Пакетный импорт каталога из CSV/XLSX: товары, варианты, характеристики.
+
+Одна строка файла — один вариант. Колонки (заголовок, регистр не важен):
+  article      — артикул товара (обязателен): строки с одним article — варианты одного товара;
+  name         — название товара (обязателен);
+  sku          — SKU варианта (обязателен, уникален) — ключ повторного импорта;
+  price        — цена (обязательна); pv, stock, weight_g, length_mm, width_mm, height_mm;
+  is_default   — 1/0, вариант по умолчанию;
+  category     — путь категорий через «/»: «Одежда / Футболки» (недостающие создаются);
+  brand, description, is_new, is_active — поля товара (берутся из первой строки товара в пачке);
+  attr:<код>   — значение характеристики, например attr:size = M, attr:color = Розовый.
+
+Колонки, которых нет в файле, не перезаписываются: повторный импорт только с ценами не трогает
+остальные поля и характеристики. Характеристики заменяются только по кодам из заголовка файла.
+Тип товара (простой / с вариантами) считается после загрузки по вариантам в базе.
+
+Файл читается потоково (csv / openpyxl read_only) пачками по chunk_size строк. Справочники
+(категории, бренды, характеристики и значения) — словари в памяти, недостающее создаётся
+bulk_create. Товары и варианты — bulk_create(update_conflicts=True) по slug / sku. Категории
+создаются без пересчёта MPTT на каждую вставку, дерево пересобирается один раз в конце.
+Сигналы save() при bulk_create не срабатывают, поэтому в конце пересобирается витрина
+(ProductListing) затронутых товаров и сбрасываются кэши дерева категорий и фасетов.
+"""
+import csv
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+from collections import Counter
+from itertools import chain, islice
+from typing import Iterator, Optional
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import category_tree, facets
+from .listing import refresh_products
+from .models import (
+    Brand, Category, Product, ProductAttribute, ProductAttributeValue, ProductVariant,
+    ProductVariantAttribute,
+)
+from .slugs import SlugAllocator
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+ATTR_PREFIX = "attr:"
+MAX_ERRORS = 50
+
+# Обновляются всегда / только если колонка есть в файле
+_PRODUCT_FIELDS = ["article", "name", "updated_at"]
+_PRODUCT_OPTIONAL_FIELDS = ["category", "brand", "description", "is_active", "is_new"]
+_VARIANT_FIELDS = ["product", "price"]
+_VARIANT_OPTIONAL_FIELDS = ["pv", "stock", "is_default", "weight_g", "length_mm", "width_mm", "height_mm"]
+
+
+class CatalogImportError(ValueError):
+    """Файл нельзя импортировать (формат, заголовок)."""
+
+
+def _rows_csv(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        delimiter = ";" if sample.count(";") > sample.count(",") else ","
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if not header:
+            raise CatalogImportError("Пустой файл")
+        keys = [(h or "").strip().lower() for h in header]
+        for row in reader:
+            yield dict(zip(keys, row))
+
+
+def _rows_xlsx(path: str) -> Iterator[dict]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            raise CatalogImportError("Пустой лист")
+        keys = [str(h or "").strip().lower() for h in header]
+        for row in rows:
+            if row and any(v not in (None, "") for v in row):
+                yield dict(zip(keys, row))
+    finally:
+        wb.close()
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    """Строки файла как dict {колонка: значение}; формат по расширению (.xlsx / .csv)."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return _rows_xlsx(path)
+    return _rows_csv(path)
+
+
+def _str(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _decimal(value, default=None) -> Optional[Decimal]:
+    s = _str(value).replace(" ", "").replace(",", ".")
+    if not s:
+        return default
+    try:
+        return Decimal(s)
+    except InvalidOperation:
+        raise ValueError(f"не число: {value!r}")
+
+
+def _int(value) -> Optional[int]:
+    d = _decimal(value)
+    return int(d) if d is not None else None
+
+
+def _bool(value, default=False) -> bool:
+    s = _str(value).lower()
+    if not s:
+        return default
+    return s in ("1", "true", "yes", "да", "+", "y")
+
+
+class CatalogImporter:
+    """Импорт одного файла; справочники кэшируются между пачками."""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = max(1, chunk_size)
+        self.categories = {(c.parent_id, c.name.strip().lower()): c for c in Category.objects.all()}
+        self.brands = {b.name.strip().lower(): b for b in Brand.objects.all()}
+        self.attributes = {a.code: a for a in ProductAttribute.objects.all()}
+        self.values = {
+            (attr_id, value.strip().lower()): pk
+            for pk, attr_id, value in ProductAttributeValue.objects.values_list("pk", "attribute_id", "value")
+        }
+        self.product_slugs = SlugAllocator(Product)
+        self.category_slugs = SlugAllocator(Category)
+        self.brand_slugs = SlugAllocator(Brand)
+        self.categories_created = 0
+        self.touched_products: set[int] = set()
+        self.stats = {"rows": 0, "products": 0, "variants": 0, "skipped": 0, "errors": []}
+        self._next_tree_id = None
+
+    # --- справочники ---
+
+    def _category(self, path: str) -> Category:
+        parent = None
+        for name in [p.strip() for p in path.split("/") if p.strip()]:
+            key = (parent.pk if parent else None, name.lower())
+            cat = self.categories.get(key)
+            if cat is None:
+                if parent is None:
+                    if self._next_tree_id is None:
+                        self._next_tree_id = (Category.objects.aggregate(m=Max("tree_id"))["m"] or 0) + 1
+                    tree_id = self._next_tree_id
+                    self._next_tree_id += 1
+                else:
+                    tree_id = parent.tree_id
+                # lft/rght/level проставит rebuild() в конце импорта
+                cat = Category(
+                    name=name, slug=self.category_slugs.allocate(slugify(name) or "category"),
+                    parent=parent, tree_id=tree_id, lft=0, rght=0, level=0,
+                )
+                with Category.objects.disable_mptt_updates():
+                    cat.save()
+                self.categories[key] = cat
+                self.categories_created += 1
+            parent = cat
+        if parent is None:
+            raise ValueError("не указана категория")
+        return parent
+
+    def _brands_for(self, names: set[str]) -> None:
+        missing = [n for n in names if n and n.lower() not in self.brands]
+        if missing:
+            created = Brand.objects.bulk_create(
+                [Brand(name=n, slug=self.brand_slugs.allocate(slugify(n) or "brand")) for n in missing]
+            )
+            for b in created:
+                self.brands[b.name.lower()] = b
+
+    def _attribute(self, code: str) -> ProductAttribute:
+        attr = self.attributes.get(code)
+        if attr is None:
+            attr = ProductAttribute.objects.create(code=code, name=code.replace("_", " ").capitalize())
+            self.attributes[code] = attr
+        return attr
+
+    def _values_for(self, pairs: set[tuple[int, str]]) -> None:
+        missing = {(a, v) for a, v in pairs if (a, v.lower()) not in self.values}
+        if not missing:
+            return
+        ProductAttributeValue.objects.bulk_create(
+            [ProductAttributeValue(attribute_id=a, value=v) for a, v in missing], ignore_conflicts=True
+        )
+        for pk, attr_id, value in ProductAttributeValue.objects.filter(
+            attribute_id__in={a for a, _ in missing}, value__in={v for _, v in missing}
+        ).values_list("pk", "attribute_id", "value"):
+            self.values[(attr_id, value.strip().lower())] = pk
+
+    # --- пачка ---
+
+    def _parse(self, row: dict) -> dict:
+        article, name, sku = _str(row.get("article")), _str(row.get("name")), _str(row.get("sku"))
+        if not article or not name or not sku:
+            raise ValueError("нужны article, name и sku")
+        price = _decimal(row.get("price"))
+        if price is None:
+            raise ValueError("нет цены")
+        attrs = {}
+        for key, value in row.items():
+            if key and key.startswith(ATTR_PREFIX) and _str(value):
+                attrs[key[len(ATTR_PREFIX):].strip()] = _str(value)
+        return {
+            "article": article[:100], "name": name[:500], "sku": sku[:100], "price": price,
+            "pv": _decimal(row.get("pv"), Decimal("0")), "stock": max(0, _int(row.get("stock")) or 0),
+            "is_default": _bool(row.get("is_default")),
+            "weight_g": _int(row.get("weight_g")), "length_mm": _int(row.get("length_mm")),
+            "width_mm": _int(row.get("width_mm")), "height_mm": _int(row.get("height_mm")),
+            "category": _str(row.get("category")), "brand": _str(row.get("brand"))[:200],
+            "description": _str(row.get("description")),
+            "is_new": _bool(row.get("is_new")), "is_active": _bool(row.get("is_active"), True),
+            "attrs": attrs,
+        }
+
+    def _error(self, line: int, message: str) -> None:
+        self.stats["skipped"] += 1
+        if len(self.stats["errors"]) < MAX_ERRORS:
+            self.stats["errors"].append(f"строка {line}: {message}")
+
+    def import_chunk(self, rows: list[tuple[int, dict]]) -> None:
+        parsed = []
+        for line, row in rows:
+            try:
+                item = self._parse(row)
+                item["category_obj"] = self._category(item["category"]) if item["category"] else None
+            except ValueError as e:
+                self._error(line, str(e))
+                continue
+            parsed.append((line, item))
+        if not parsed:
+            return
+
+        self._brands_for({item["brand"] for _, item in parsed})
+        pairs = set()
+        for _, item in parsed:
+            for code, value in item["attrs"].items():
+                pairs.add((self._attribute(code).pk, value[:200]))
+        self._values_for(pairs)
+
+        # Товары: первая строка каждого article; существующие — по article, новые получают slug
+        by_article: dict[str, tuple[int, dict]] = {}
+        for line, item in parsed:
+            by_article.setdefault(item["article"], (line, item))
+        rows_per_article = Counter(item["article"] for _, item in parsed)
+        existing = {}
+        for article, slug, category_id in Product.objects.filter(article__in=list(by_article)).values_list(
+            "article", "slug", "category_id"
+        ):
+            existing.setdefault(article, (slug, category_id))
+        now = timezone.now()
+        products = []
+        for article, (line, item) in by_article.items():
+            found = existing.get(article)
+            category = item["category_obj"]
+            if category is None and found is None:
+                self._error(line, f"товар {article}: не указана категория")
+                continue
+            brand = self.brands.get(item["brand"].lower()) if item["brand"] else None
+            # Тип нового товара; у существующих — пересчёт по базе в _update_product_types()
+            has_variants = rows_per_article[article] > 1 or bool(item["attrs"])
+            # Без pk: существующий товар находится по slug (ON CONFLICT (slug) DO UPDATE)
+            products.append(Product(
+                slug=found[0] if found else self.product_slugs.allocate((slugify(item["name"]) or "product")[:200]),
+                article=article, name=item["name"],
+                category_id=category.pk if category else found[1],
+                brand=brand, description=item["description"],
+                product_type=Product.ProductType.VARIABLE if has_variants else Product.ProductType.SIMPLE,
+                is_active=item["is_active"], is_new=item["is_new"], updated_at=now,
+            ))
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=["slug"], update_fields=self.product_fields,
+        )
+        product_ids = dict(
+            Product.objects.filter(slug__in=[p.slug for p in products]).values_list("article", "pk")
+        )
+        self.touched_products.update(product_ids.values())
+
+        variants = {}
+        for line, item in parsed:
+            product_id = product_ids.get(item["article"])
+            if product_id is None:
+                continue
+            variants[item["sku"]] = (ProductVariant(
+                sku=item["sku"], product_id=product_id, price=item["price"], pv=item["pv"], stock=item["stock"],
+                is_default=item["is_default"], weight_g=item["weight_g"], length_mm=item["length_mm"],
+                width_mm=item["width_mm"], height_mm=item["height_mm"],
+            ), item)
+        ProductVariant.objects.bulk_create(
+            [v for v, _ in variants.values()],
+            update_conflicts=True, unique_fields=["sku"], update_fields=self.variant_fields,
+        )
+        variant_ids = dict(ProductVariant.objects.filter(sku__in=list(variants)).values_list("sku", "pk"))
+        self.stats["variants"] += len(variants)
+
+        self._replace_attributes(variants, variant_ids)
+        self._update_product_types(set(product_ids.values()))
+
+    def _replace_attributes(self, variants: dict, variant_ids: dict) -> None:
+        """Характеристики из колонок attr:<код> заменяют прежние значения этих кодов; другие коды не трогаются."""
+        if not self.attr_codes:
+            return
+        links = []
+        for sku, (_, item) in variants.items():
+            for code, value in item["attrs"].items():
+                value_id = self.values.get((self.attributes[code].pk, value[:200].lower()))
+                if value_id:
+                    links.append(ProductVariantAttribute(variant_id=variant_ids[sku], attribute_value_id=value_id))
+        ProductVariantAttribute.objects.filter(
+            variant_id__in=list(variant_ids.values()), attribute_value__attribute__code__in=self.attr_codes,
+        ).delete()
+        ProductVariantAttribute.objects.bulk_create(links, ignore_conflicts=True)
+
+    def _update_product_types(self, product_ids: set[int]) -> None:
+        """Простой / с вариантами — по всем вариантам товара в базе, а не по строкам пачки."""
+        simple, variable = Product.ProductType.SIMPLE, Product.ProductType.VARIABLE
+        counts = ProductVariant.objects.filter(product_id__in=product_ids).values("product_id").annotate(
+            n=Count("id", distinct=True), attrs=Count("attribute_values"),
+        )
+        variable_ids = {c["product_id"] for c in counts if c["n"] > 1 or c["attrs"]}
+        touched = Product.objects.filter(pk__in=product_ids, product_type__in=(simple, variable))
+        touched.filter(pk__in=variable_ids).exclude(product_type=variable).update(product_type=variable)
+        touched.exclude(pk__in=variable_ids).exclude(product_type=simple).update(product_type=simple)
+
+    def _set_columns(self, columns) -> None:
+        columns = set(columns)
+        self.product_fields = _PRODUCT_FIELDS + [f for f in _PRODUCT_OPTIONAL_FIELDS if f in columns]
+        self.variant_fields = _VARIANT_FIELDS + [f for f in _VARIANT_OPTIONAL_FIELDS if f in columns]
+        self.attr_codes = {c[len(ATTR_PREFIX):].strip() for c in columns if c and c.startswith(ATTR_PREFIX)}
+
+    def run(self, rows) -> dict:
+        numbered = ((line, row) for line, row in enumerate(rows, start=2))
+        first = next(numbered, None)
+        if first is None:
+            return self.stats
+        self._set_columns(first[1])
+        numbered = chain([first], numbered)
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            self.stats["rows"] += len(chunk)
+            with transaction.atomic():
+                self.import_chunk(chunk)
+        # Товар, строки которого попали в разные пачки, считается один раз
+        self.stats["products"] = len(self.touched_products)
+        return self.stats
+
+    def finish(self) -> None:
+        """Один пересчёт MPTT для новых категорий, витрина затронутых товаров, сброс кэшей."""
+        if self.categories_created:
+            Category.objects.rebuild()
+        ids = sorted(self.touched_products)
+        for i in range(0, len(ids), CHUNK_SIZE):
+            refresh_products(ids[i:i + CHUNK_SIZE])
+        category_tree.invalidate()
+        category_tree.invalidate_attributes()
+        facets.invalidate()
+
+
+def import_catalog(path: str, chunk_size: int = CHUNK_SIZE, dry_run: bool = False) -> dict:
+    """
+    Импорт файла. Возвращает статистику: rows, products, variants, skipped, errors,
+    categories_created, seconds, rows_per_sec. dry_run — всё в транзакции с откатом.
+    """
+    t0 = time.perf_counter()
+    importer = CatalogImporter(chunk_size)
+    if dry_run:
+        with transaction.atomic():
+            stats = importer.run(read_rows(path))
+            importer.finish()
+            transaction.set_rollback(True)
+        category_tree.invalidate()
+        category_tree.invalidate_attributes()
+        facets.invalidate()
+    else:
+        stats = importer.run(read_rows(path))
+        importer.finish()
+    seconds = time.perf_counter() - t0
+    stats["categories_created"] = importer.categories_created
+    stats["seconds"] = seconds
+    stats["rows_per_sec"] = stats["rows"] / seconds if seconds > 0 else 0
+    logger.info(
+        "import_catalog %s: строк %s, товаров %s, вариантов %s, пропущено %s, %.0f строк/с",
+        path, stats["rows"], stats["products"], stats["variants"], stats["skipped"], stats["rows_per_sec"],
+    )
+    return stats
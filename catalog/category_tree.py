@@ -0,0 +1,122 @@
+"""
+Поддеревья категорий (MPTT) для каталога.
+
+Товары поддерева выбираются одним диапазоном по вложенным множествам:
+tree_id = X AND lft BETWEEN lft_категории AND rght_категории (индекс django-mptt по (tree_id, lft)).
+Множества id потомков (для фасетов и подсчётов в памяти) считаются по снимку дерева
+(id, tree_id, lft, rght) — один запрос на процесс — и кэшируются по категории.
+Снимок сбрасывается сигналами Category в этом процессе, в остальных воркерах — по CATEGORY_TREE_TTL.
+
+Атрибуты категории с учётом предков — один запрос к CategoryAttribute по диапазону предков
+(tree_id = X AND lft <= lft_категории AND rght >= rght_категории), результат в кэше Django.
+Ключи содержат версию, которую сигналы CategoryAttribute и Category меняют при любой правке.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Category, CategoryAttribute
+
+_ATTRS_VERSION_KEY = "category_attrs:version"
+
+_DEFAULT_TTL = 300  # сек.
+
+
+def subtree_q(category, prefix: str = "category__") -> Q:
+    """Условие «категория в поддереве category» (включая её саму) для запросов по связанной модели."""
+    return Q(**{
+        f"{prefix}tree_id": category.tree_id,
+        f"{prefix}lft__gte": category.lft,
+        f"{prefix}lft__lte": category.rght,
+    })
+
+
+class TreeSnapshot:
+    """Узлы всех деревьев, отсортированные по (tree_id, lft): поддерево — непрерывный срез."""
+
+    def __init__(self, nodes):
+        nodes = sorted(nodes, key=lambda n: (n[1], n[2]))
+        self.ids = [n[0] for n in nodes]
+        self.keys = [(n[1], n[2]) for n in nodes]
+        self.bounds = {n[0]: (n[1], n[2], n[3]) for n in nodes}
+        self._descendants: dict[int, frozenset] = {}
+        self._lock = threading.Lock()
+
+    def descendant_ids(self, category_id: int) -> frozenset:
+        cached = self._descendants.get(category_id)
+        if cached is not None:
+            return cached
+        bounds = self.bounds.get(category_id)
+        if bounds is None:
+            return frozenset()
+        tree_id, lft, rght = bounds
+        lo = bisect_left(self.keys, (tree_id, lft))
+        hi = bisect_right(self.keys, (tree_id, rght))
+        ids = frozenset(self.ids[lo:hi])
+        with self._lock:
+            self._descendants[category_id] = ids
+        return ids
+
+
+_snapshot: Optional[TreeSnapshot] = None
+_snapshot_loaded_at: float = 0
+_snapshot_lock = threading.Lock()
+
+
+def _ttl() -> float:
+    return float(getattr(settings, "CATEGORY_TREE_TTL", _DEFAULT_TTL))
+
+
+def get_snapshot() -> TreeSnapshot:
+    global _snapshot, _snapshot_loaded_at
+    snapshot = _snapshot
+    if snapshot is not None and time.time() - _snapshot_loaded_at < _ttl():
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or time.time() - _snapshot_loaded_at >= _ttl():
+            _snapshot = TreeSnapshot(Category.objects.values_list("pk", "tree_id", "lft", "rght"))
+            _snapshot_loaded_at = time.time()
+        return _snapshot
+
+
+def descendant_ids(category) -> frozenset:
+    """id категории и всех её потомков (из кэша процесса)."""
+    return get_snapshot().descendant_ids(category.pk)
+
+
+def invalidate() -> None:
+    """Перечитать дерево при следующем запросе (вызывается сигналами Category)."""
+    global _snapshot, _snapshot_loaded_at
+    with _snapshot_lock:
+        _snapshot = None
+        _snapshot_loaded_at = 0
+
+
+def _attrs_version() -> int:
+    return cache.get_or_set(_ATTRS_VERSION_KEY, time.time_ns, None)
+
+
+def attribute_ids_with_parents(category) -> set[int]:
+    """id атрибутов категории и всех её предков (из кэша или одним запросом)."""
+    key = f"category_attrs:{_attrs_version()}:{category.pk}"
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            CategoryAttribute.objects.filter(
+                category__tree_id=category.tree_id,
+                category__lft__lte=category.lft,
+                category__rght__gte=category.rght,
+            ).values_list("attribute_id", flat=True)
+        )
+        cache.set(key, ids, int(_ttl()))
+    return set(ids)
+
+
+def invalidate_attributes() -> None:
+    """Новая версия ключей атрибутов категорий (вызывается сигналами CategoryAttribute и Category)."""
+    cache.set(_ATTRS_VERSION_KEY, time.time_ns(), None)
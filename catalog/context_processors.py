@@ -1,31 +1,52 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+
+def _value(compute):
+    """
+    Значение переменной шаблона. При TEMPLATE_LAZY_CONTEXT (по умолчанию) — ленивое: считается при первом
+    обращении из шаблона, так что фрагменты (строка корзины, быстрый просмотр) и страницы, где переменная
+    скрыта или перекрыта контекстом вьюхи, не читают корзину и не запрашивают категории.
+    """
+    if getattr(settings, "TEMPLATE_LAZY_CONTEXT", True):
+        return SimpleLazyObject(compute)
+    return compute()
+
+
 def hide_hero_nav(request):
     """Скрывать hero и фильтры категорий на корзине, карточке товара, ЛК, оформлении заказа, избранном, авторизации."""
-    url_name = getattr(request.resolver_match, "url_name", "") if request.resolver_match else ""
-    return {"hide_hero_nav": url_name in (
-        "cart", "cart_replace", "checkout", "order_success", "product_detail", "favorites", "policy",
-        "register", "login",
-        "cabinet", "profile", "password_change", "referral", "business_join",
-        "order_detail", "orders_list", "address_list", "address_add", "address_edit", "address_delete", "address_set_default",
-    )}
+    def compute():
+        url_name = getattr(request.resolver_match, "url_name", "") if request.resolver_match else ""
+        return url_name in (
+            "cart", "cart_replace", "checkout", "order_success", "product_detail", "favorites", "policy",
+            "register", "login",
+            "cabinet", "profile", "password_change", "referral", "business_join",
+            "order_detail", "orders_list", "address_list", "address_add", "address_edit", "address_delete", "address_set_default",
+        )
+    return {"hide_hero_nav": _value(compute)}
 
 
 def favorites_count(request):
     """Количество товаров в избранном для бейджа в шапке."""
-    ids = request.session.get("favorites", [])
-    if not isinstance(ids, list):
-        return {"favorites_count": 0}
-    n = len([x for x in ids if isinstance(x, (int, str)) and str(x).isdigit()])
-    return {"favorites_count": n}
+    def compute():
+        ids = request.session.get("favorites", [])
+        if not isinstance(ids, list):
+            return 0
+        return len([x for x in ids if isinstance(x, (int, str)) and str(x).isdigit()])
+    return {"favorites_count": _value(compute)}
 
 
 def cart_count(request):
     from .cart_storage import get_cart
     from .cart_logic import cart_total_count
-    cart = get_cart(request)
-    return {"cart_count": cart_total_count(cart)}
+    return {"cart_count": _value(lambda: cart_total_count(get_cart(request)))}
 
 
 def nav_categories(request):
+    return {"categories": _value(_nav_categories)}
+
+
+def _nav_categories():
     from .models import Category, Product
     from django.db.models import Count, Subquery, OuterRef
 
@@ -41,4 +62,4 @@ def nav_categories(request):
     ).exclude(slug__isnull=True).exclude(slug="").annotate(
         product_count=Subquery(product_count_subq)
     ).filter(product_count__gt=0)
-    return {"categories": list(categories)}
+    return list(categories)
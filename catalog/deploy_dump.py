@@ -0,0 +1,220 @@
+"""
+Перенос контента между серверами: потоковая выгрузка JSONL по моделям и загрузка bulk_create.
+
+Выгрузка: на каждую модель файл <app_label>.<model>.jsonl[.gz] — по строке JSON на объект
+(значения полей по attname, в порядке pk), читается values().iterator() без создания объектов.
+Промежуточные таблицы ManyToMany без своей модели выгружаются отдельными файлами, если выгружается
+и модель на другой стороне связи: группы и права пользователя (auth.Group, auth.Permission) не
+переносятся — pk прав на другом сервере другие. manifest.json — порядок загрузки и число строк.
+Все файлы — один снимок базы: на PostgreSQL выгрузка идёт в транзакции REPEATABLE READ READ ONLY.
+
+Загрузка: пачками bulk_create(update_conflicts=True) по pk, всё в одной транзакции — как loaddata,
+существующие строки с тем же pk перезаписываются. save() и сигналы (очередь выгрузки пользователей,
+updated_at товара) не вызываются, auto_now/auto_now_add не перетирают выгруженные даты.
+В конце сбрасываются последовательности pk, пересобирается витрина каталога и кэши.
+"""
+import datetime
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 2000
+MANIFEST = "manifest.json"
+
+# Порядок важен: от зависимостей к зависимым
+DEPLOY_DATA_MODELS = [
+    "catalog.ProductAttribute",
+    "catalog.ProductAttributeValue",
+    "catalog.Brand",
+    "catalog.Category",
+    "catalog.CategoryAttribute",
+    "catalog.Product",
+    "catalog.ProductVariant",
+    "catalog.ProductVariantAttribute",
+    "catalog.ProductMedia",
+    "orders.City",
+    "users.User",
+    "users.UserAddress",
+]
+
+
+class _Encoder(DjangoJSONEncoder):
+    """Как DjangoJSONEncoder, но время с микросекундами (тот округляет до миллисекунд)."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _models(labels) -> list:
+    """
+    Модели выгрузки и автоматические промежуточные таблицы их ManyToMany (сразу после модели) —
+    только если модель на другой стороне связи тоже выгружается, иначе pk в таблице связи чужие.
+    """
+    models = [apps.get_model(label) for label in labels]
+    result = []
+    for model in models:
+        result.append(model)
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created and field.related_model in models:
+                result.append(through)
+    return result
+
+
+def _label(model) -> str:
+    return f"{model._meta.app_label}.{model._meta.model_name}"
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def dump(out_dir: str, compress: bool = False, chunk_size: int = CHUNK_SIZE,
+         progress: Optional[Callable[[str, int], None]] = None) -> dict:
+    """Выгрузить модели DEPLOY_DATA_MODELS в out_dir. Возвращает manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    encoder = _Encoder(ensure_ascii=False, separators=(",", ":"))
+    manifest = {"version": FORMAT_VERSION, "models": []}
+    # Снимок на один момент: все модели читаются в одной транзакции. В PostgreSQL по умолчанию
+    # (READ COMMITTED) снимок у каждого запроса свой — нужен REPEATABLE READ до первого запроса;
+    # внутри чужой транзакции уровень уже не поменять
+    outer = connection.in_atomic_block
+    with transaction.atomic():
+        if connection.vendor == "postgresql" and not outer:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        for model in _models(DEPLOY_DATA_MODELS):
+            fields = [f.attname for f in model._meta.concrete_fields]
+            filename = _label(model) + (".jsonl.gz" if compress else ".jsonl")
+            count = 0
+            with _open(os.path.join(out_dir, filename), "w") as f:
+                rows = model._base_manager.order_by("pk").values(*fields).iterator(chunk_size=chunk_size)
+                for row in rows:
+                    f.write(encoder.encode(row))
+                    f.write("\n")
+                    count += 1
+                    if progress and count % chunk_size == 0:
+                        progress(_label(model), count)
+            manifest["models"].append({"model": _label(model), "file": filename, "count": count})
+            if progress:
+                progress(_label(model), count)
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def read_manifest(in_dir: str) -> dict:
+    path = os.path.join(in_dir, MANIFEST)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Нет {MANIFEST} в {in_dir}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия выгрузки: {manifest.get('version')}")
+    return manifest
+
+
+def _read_chunks(path: str, chunk_size: int) -> Iterator[list[dict]]:
+    chunk = []
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                chunk.append(json.loads(line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+@contextmanager
+def _keep_auto_dates(models):
+    """Выключить auto_now/auto_now_add на время загрузки: даты берутся из выгрузки."""
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _objects(model, rows: list[dict]) -> list:
+    fields = {f.attname: f for f in model._meta.concrete_fields}
+    objs = []
+    for row in rows:
+        values = {}
+        for attname, value in row.items():
+            field = fields.get(attname)
+            if field is None:
+                continue  # поле удалено в этой версии схемы
+            if value is not None and not field.is_relation:
+                value = field.to_python(value)
+            values[attname] = value
+        objs.append(model(**values))
+    return objs
+
+
+def load(in_dir: str, chunk_size: int = CHUNK_SIZE,
+         progress: Optional[Callable[[str, int, int], None]] = None) -> dict:
+    """
+    Загрузить выгрузку из in_dir. progress(model, загружено, всего) — после каждой пачки.
+    Возвращает {метка модели: строк}.
+    """
+    from . import category_tree, facets
+    from .listing import refresh_all
+
+    manifest = read_manifest(in_dir)
+    entries = [(apps.get_model(e["model"]), e) for e in manifest["models"]]
+    # Связи с невыгруженными моделями (группы и права пользователя в старых выгрузках) не загружаются
+    dumped = {model for model, _ in entries}
+    entries = [
+        (model, e) for model, e in entries
+        if not model._meta.auto_created or all(f.related_model in dumped for f in model._meta.concrete_fields if f.is_relation)
+    ]
+    models = [model for model, _ in entries]
+    loaded = {}
+    with _keep_auto_dates(models), transaction.atomic():
+        for model, entry in entries:
+            pk_name = model._meta.pk.name
+            update_fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+            count = 0
+            for rows in _read_chunks(os.path.join(in_dir, entry["file"]), chunk_size):
+                model._base_manager.bulk_create(
+                    _objects(model, rows),
+                    update_conflicts=True,
+                    unique_fields=[pk_name],
+                    update_fields=update_fields,
+                )
+                count += len(rows)
+                if progress:
+                    progress(entry["model"], count, entry["count"])
+            loaded[entry["model"]] = count
+        # pk заданы явно — последовательности нужно сдвинуть за максимум
+        sql = connection.ops.sequence_reset_sql(no_style(), models)
+        if sql:
+            with connection.cursor() as cursor:
+                for statement in sql:
+                    cursor.execute(statement)
+    # Витрина каталога — производная таблица, не выгружается
+    refresh_all()
+    category_tree.invalidate()
+    category_tree.invalidate_attributes()
+    facets.invalidate()
+    return loaded
@@ -0,0 +1,375 @@
+"""
+Фасетный фильтр каталога: значения характеристик вариантов, бренд, цена, наличие.
+
+Индекс строится один раз на процесс из витрины ProductListing, вариантов и связей вариант → значение
+характеристики (пять запросов) и хранится как битовые карты вариантов: у каждого варианта — свой бит,
+варианты товара идут подряд, товары — в порядке каталога (товар без вариантов занимает один пустой бит).
+У каждого значения характеристики, наличия и цены биты — свои у каждого варианта; бренд, категория
+и «новинка» ставят биты всем вариантам товара. Фильтр — AND/OR битовых карт вариантов без запросов к БД,
+затем уцелевшие варианты сводятся к товарам: товар подходит, если ОДИН его вариант подходит под всё
+сразу (размер M и красный цвет — это вариант M-красный, а не M-синий и L-красный; «в наличии» —
+остаток именно у этого варианта). Количества по значениям — число таких товаров.
+
+Внутри одной характеристики значения объединяются по ИЛИ, между характеристиками, брендом,
+ценой и наличием — по И. Количество у значения считается без учёта выбора в его же характеристике.
+Обновление витрины (catalog.listing) правит в индексе этого процесса только остатки, если у товаров
+не поменялось ничего другого, иначе индекс пересобирается; изменения характеристик вариантов
+сбрасывают его целиком (catalog.signals). В остальных воркерах — по CATALOG_FACETS_TTL.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+from .models import (
+    Brand, Product, ProductAttribute, ProductAttributeValue, ProductListing, ProductVariant, ProductVariantAttribute,
+)
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TTL = 300  # сек.
+
+# Номера установленных битов для каждого байта (0..255)
+_BYTE_BITS = [tuple(i for i in range(8) if b >> i & 1) for b in range(256)]
+
+
+def _bitmap(positions: Iterable[int], size: int) -> int:
+    """Битовая карта из номеров позиций (через bytearray — без пересоздания большого int на каждый бит)."""
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _positions(bitmap: int) -> list[int]:
+    """Номера установленных битов по возрастанию."""
+    result = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index << 3
+            result.extend(base + i for i in _BYTE_BITS[byte])
+    return result
+
+
+def _decimal(raw) -> Optional[Decimal]:
+    try:
+        value = Decimal(str(raw).replace(",", ".").strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return value if value.is_finite() and value >= 0 else None
+
+
+def _ids(values) -> set[int]:
+    result = set()
+    for v in values:
+        try:
+            result.add(int(v))
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+def parse_selection(params) -> dict:
+    """
+    Выбор покупателя из GET: a=<id значения> (несколько), brand=<id> (несколько),
+    price_min, price_max, in_stock=1.
+    """
+    return {
+        "values": _ids(params.getlist("a")),
+        "brands": _ids(params.getlist("brand")),
+        "price_min": _decimal(params.get("price_min")) if params.get("price_min") else None,
+        "price_max": _decimal(params.get("price_max")) if params.get("price_max") else None,
+        "in_stock": params.get("in_stock") == "1",
+    }
+
+
+def is_active(selection: dict) -> bool:
+    return bool(
+        selection["values"] or selection["brands"] or selection["in_stock"]
+        or selection["price_min"] is not None or selection["price_max"] is not None
+    )
+
+
+class FacetIndex:
+    """Битовые карты вариантов витрины по значениям характеристик, наличию, цене, брендам, категориям и флагам."""
+
+    def __init__(self, products, variants, brands, variant_values, attributes, values):
+        """
+        products — (pk, sort_order, name, is_new, category_id, brand_id) в порядке каталога;
+        variants — (pk, product_id, price, stock) в порядке pk; brands — {id: name};
+        variant_values — (variant_id, value_id); attributes — {id: (name, code)};
+        values — {value_id: (attribute_id, value)}.
+        """
+        self.pks = [row[0] for row in products]
+        self.pos = {pk: i for i, pk in enumerate(self.pks)}
+        # Что сверяется при обновлении витрины: если поменялось — индекс пересобирается
+        self.meta = {row[0]: tuple(row[1:]) for row in products}
+
+        by_product: dict[int, list] = {}
+        for row in variants:
+            if row[1] in self.pos:
+                by_product.setdefault(row[1], []).append(row)
+        # Биты вариантов: товар i занимает [starts[i], starts[i + 1])
+        self.starts = []
+        self.owner: list[int] = []
+        self.slot_variant: list[Optional[int]] = []
+        self.slot_price: list[Optional[Decimal]] = []
+        stock_slots = []
+        for i, pk in enumerate(self.pks):
+            self.starts.append(len(self.owner))
+            for variant_pk, _, price, stock in by_product.get(pk) or [(None, pk, None, 0)]:
+                if stock and stock > 0:
+                    stock_slots.append(len(self.owner))
+                self.owner.append(i)
+                self.slot_variant.append(variant_pk)
+                self.slot_price.append(price)
+        self.starts.append(len(self.owner))
+        self.size = size = len(self.owner)
+        self.all = (1 << size) - 1
+        self.slot = {vpk: i for i, vpk in enumerate(self.slot_variant) if vpk is not None}
+        # Товары с одним битом считаются bit_count(), остальные — сведением битов к товарам
+        self.single = _bitmap((self.starts[i] for i in range(len(self.pks)) if self.starts[i + 1] - self.starts[i] == 1), size)
+
+        self.in_stock = _bitmap(stock_slots, size)
+        self.is_new = self._spread(i for i, row in enumerate(products) if row[3])
+
+        by_category: dict[int, list[int]] = {}
+        by_brand: dict[int, list[int]] = {}
+        for i, row in enumerate(products):
+            by_category.setdefault(row[4], []).append(i)
+            if row[5] is not None:
+                by_brand.setdefault(row[5], []).append(i)
+        self.by_category = {cid: self._spread(p) for cid, p in by_category.items()}
+        self.by_brand = {bid: self._spread(p) for bid, p in by_brand.items()}
+        self.brand_names = {bid: brands.get(bid, "") for bid in self.by_brand}
+        priced = sorted((price, i) for i, price in enumerate(self.slot_price) if price is not None)
+        self.prices = [p for p, _ in priced]
+        self.price_positions = [i for _, i in priced]
+
+        by_value: dict[int, list[int]] = {}
+        for variant_id, value_id in variant_values:
+            i = self.slot.get(variant_id)
+            if i is not None and value_id in values:
+                by_value.setdefault(value_id, []).append(i)
+        self.by_value = {vid: _bitmap(p, size) for vid, p in by_value.items()}
+        self.value_attr = {vid: values[vid][0] for vid in self.by_value}
+        self.value_names = {vid: values[vid][1] for vid in self.by_value}
+        self.attributes = attributes
+        # Значения каждой характеристики по алфавиту
+        self.attr_values: dict[int, list[int]] = {}
+        for vid in sorted(self.by_value, key=lambda v: self.value_names[v].lower()):
+            self.attr_values.setdefault(self.value_attr[vid], []).append(vid)
+
+    def __len__(self):
+        return len(self.pks)
+
+    def _spread(self, product_positions: Iterable[int]) -> int:
+        """Битовая карта всех вариантов товаров с номерами product_positions."""
+        starts = self.starts
+        return _bitmap((j for i in product_positions for j in range(starts[i], starts[i + 1])), self.size)
+
+    def count(self, bitmap: int) -> int:
+        """Число товаров, у которых установлен хотя бы один бит варианта."""
+        count = (bitmap & self.single).bit_count()
+        rest = bitmap & ~self.single
+        if rest:
+            owner = self.owner
+            count += len({owner[i] for i in _positions(rest)})
+        return count
+
+    def bitmap_for_pks(self, pks: Iterable[int]) -> int:
+        return self._spread(self.pos[pk] for pk in pks if pk in self.pos)
+
+    def category_bitmap(self, category_ids: Iterable[int]) -> int:
+        result = 0
+        for cid in category_ids:
+            result |= self.by_category.get(cid, 0)
+        return result
+
+    def price_bitmap(self, price_min: Optional[Decimal], price_max: Optional[Decimal]) -> int:
+        lo = bisect_left(self.prices, price_min) if price_min is not None else 0
+        hi = bisect_right(self.prices, price_max) if price_max is not None else len(self.prices)
+        return _bitmap(self.price_positions[lo:hi], self.size)
+
+    def pks_for(self, bitmap: int) -> list[int]:
+        """pk товаров битовой карты в порядке каталога."""
+        pks, owner = self.pks, self.owner
+        result = []
+        last = None
+        for i in _positions(bitmap):
+            if owner[i] != last:
+                last = owner[i]
+                result.append(pks[last])
+        return result
+
+    def update_stock(self, product_id: int, meta: Optional[tuple], variants: list) -> bool:
+        """
+        Поправить наличие вариантов товара на месте. meta — как в products (None — товара нет на витрине),
+        variants — (pk, price, stock) в порядке pk. False — изменилось что-то кроме остатков, нужна пересборка.
+        """
+        i = self.pos.get(product_id)
+        if i is None or meta is None:
+            return i is None and meta is None
+        if self.meta[product_id] != meta:
+            return False
+        start, end = self.starts[i], self.starts[i + 1]
+        if [(pk, price) for pk, price, _ in variants] != list(zip(self.slot_variant[start:end], self.slot_price[start:end])):
+            # Пустой бит товара без вариантов сравнивается со списком из одного (None, None)
+            if variants or self.slot_variant[start] is not None:
+                return False
+        in_stock = self.in_stock
+        for offset, (_, _, stock) in enumerate(variants):
+            bit = 1 << (start + offset)
+            in_stock = in_stock | bit if stock > 0 else in_stock & ~bit
+        self.in_stock = in_stock
+        return True
+
+    def search(self, selection: dict, base: Optional[int] = None, attribute_ids: Optional[set] = None) -> dict:
+        """
+        Фильтр и количества. base — битовая карта вариантов до фасетов (категория, поиск, NEW: bitmap_for_pks,
+        category_bitmap, is_new); attribute_ids — какие характеристики показывать (по умолчанию все, у которых
+        есть значения). Возвращает {"bitmap" (варианты, товары — pks_for), "total", "attributes", "brands",
+        "in_stock_count", "price_min", "price_max"}; все количества — в товарах.
+        """
+        base = self.all if base is None else base & self.all
+
+        selected_by_attr: dict[int, int] = {}
+        for vid in selection["values"]:
+            attr_id = self.value_attr.get(vid)
+            if attr_id is not None:
+                selected_by_attr[attr_id] = selected_by_attr.get(attr_id, 0) | self.by_value[vid]
+        brand_mask = self.all
+        if selection["brands"]:
+            brand_mask = 0
+            for bid in selection["brands"]:
+                brand_mask |= self.by_brand.get(bid, 0)
+        price_mask = self.all
+        if selection["price_min"] is not None or selection["price_max"] is not None:
+            price_mask = self.price_bitmap(selection["price_min"], selection["price_max"])
+        stock_mask = self.in_stock if selection["in_stock"] else self.all
+
+        common = base & brand_mask & price_mask & stock_mask
+        attrs_mask = self.all
+        for bitmap in selected_by_attr.values():
+            attrs_mask &= bitmap
+        result = common & attrs_mask
+
+        def others(skip_attr) -> int:
+            mask = self.all
+            for attr_id, bitmap in selected_by_attr.items():
+                if attr_id != skip_attr:
+                    mask &= bitmap
+            return mask
+
+        attributes = []
+        for attr_id, value_ids in self.attr_values.items():
+            if attribute_ids is not None and attr_id not in attribute_ids:
+                continue
+            mask = common & others(attr_id)
+            out = []
+            for vid in value_ids:
+                count = self.count(mask & self.by_value[vid])
+                selected = vid in selection["values"]
+                if count or selected:
+                    out.append({"id": vid, "value": self.value_names[vid], "count": count, "selected": selected})
+            if out:
+                name, code = self.attributes.get(attr_id, ("", ""))
+                attributes.append({"id": attr_id, "name": name, "code": code, "values": out})
+        attributes.sort(key=lambda a: a["name"].lower())
+
+        brand_base = base & price_mask & stock_mask & attrs_mask
+        brands = []
+        for bid, bitmap in self.by_brand.items():
+            count = self.count(brand_base & bitmap)
+            selected = bid in selection["brands"]
+            if count or selected:
+                brands.append({"id": bid, "name": self.brand_names[bid], "count": count, "selected": selected})
+        brands.sort(key=lambda b: b["name"].lower())
+
+        if base == self.all:
+            base_prices = self.prices
+        else:
+            base_prices = sorted(p for p in map(self.slot_price.__getitem__, _positions(base)) if p is not None)
+        return {
+            "bitmap": result,
+            "total": self.count(result),
+            "attributes": attributes,
+            "brands": brands,
+            "in_stock_count": self.count(base & brand_mask & price_mask & attrs_mask & self.in_stock),
+            "price_min": base_prices[0] if base_prices else None,
+            "price_max": base_prices[-1] if base_prices else None,
+        }
+
+
+def build_index() -> FacetIndex:
+    products = list(
+        ProductListing.objects.filter(is_active=True).exclude(slug="")
+        .order_by("sort_order", "name", "pk")
+        .values_list("pk", "sort_order", "name", "is_new", "category_id")
+    )
+    brand_ids = dict(
+        Product.objects.filter(pk__in=[row[0] for row in products], brand__isnull=False)
+        .values_list("pk", "brand_id")
+    ) if products else {}
+    products = [row + (brand_ids.get(row[0]),) for row in products]
+    brands = dict(Brand.objects.filter(pk__in=set(brand_ids.values())).values_list("pk", "name"))
+    variants = ProductVariant.objects.order_by("pk").values_list("pk", "product_id", "price", "stock")
+    variant_values = ProductVariantAttribute.objects.values_list("variant_id", "attribute_value_id").distinct()
+    attributes = {pk: (name, code) for pk, name, code in ProductAttribute.objects.values_list("pk", "name", "code")}
+    values = {pk: (attr_id, value) for pk, attr_id, value in ProductAttributeValue.objects.values_list("pk", "attribute_id", "value")}
+    return FacetIndex(products, variants.iterator(), brands, variant_values.iterator(), attributes, values)
+
+
+_index: Optional[FacetIndex] = None
+_index_loaded_at: float = 0
+_index_lock = threading.Lock()
+
+
+def _ttl() -> float:
+    return float(getattr(settings, "CATALOG_FACETS_TTL", _DEFAULT_TTL))
+
+
+def get_index() -> FacetIndex:
+    global _index, _index_loaded_at
+    index = _index
+    if index is not None and time.time() - _index_loaded_at < _ttl():
+        return index
+    with _index_lock:
+        if _index is None or time.time() - _index_loaded_at >= _ttl():
+            t0 = time.perf_counter()
+            _index = build_index()
+            _index_loaded_at = time.time()
+            logger.info("Catalog facets: индекс собран, товаров %s за %.0f мс", len(_index), (time.perf_counter() - t0) * 1000)
+        return _index
+
+
+def invalidate() -> None:
+    """Пересобрать индекс при следующем запросе (вызывается при обновлении витрины и характеристик)."""
+    global _index, _index_loaded_at
+    with _index_lock:
+        _index = None
+        _index_loaded_at = 0
+
+
+def update_products(entries: dict) -> None:
+    """
+    Индекс процесса после пересборки строк витрины (catalog.listing): entries — {product_id: (meta, variants)}
+    или {product_id: None} для товаров не на витрине. Если поменялись только остатки (оформление заказа),
+    биты наличия правятся на месте; иначе индекс пересобирается при следующем запросе.
+    """
+    global _index, _index_loaded_at
+    with _index_lock:
+        index = _index
+        if index is None:
+            return
+        for product_id, entry in entries.items():
+            meta, variants = entry if entry is not None else (None, [])
+            if not index.update_stock(product_id, meta, variants):
+                _index = None
+                _index_loaded_at = 0
+                return
@@ -0,0 +1,115 @@
+"""
+Витрина карточек товаров (ProductListing) — денормализованная таблица для каталога,
+избранного и блоков «Похожие» / «Вы смотрели».
+
+Строка собирается из Product, корневой Category, вариантов (по умолчанию, минимальная цена,
+наличие) и первого фото. Обновляется сигналами catalog.signals после коммита транзакции;
+изменения в обход сигналов (queryset.update, импорт SQL) — manage.py refresh_product_listing.
+"""
+import logging
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import facets
+from .models import Category, Product, ProductListing
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_UPDATE_FIELDS = [
+    "name", "slug", "category", "root_category_slug", "default_variant_id", "price", "pv",
+    "min_price", "variants_count", "main_image", "in_stock", "is_new", "is_active", "sort_order",
+    "updated_at",
+]
+
+
+def build_rows(product_ids: Optional[Iterable[int]] = None) -> list[ProductListing]:
+    """Строки витрины для товаров (все товары, если product_ids не передан)."""
+    return _build(product_ids)[0]
+
+
+def _build(product_ids: Optional[Iterable[int]] = None) -> tuple[list[ProductListing], dict]:
+    """Строки витрины и данные для индекса фасетов: {product_id: (meta, variants) или None} (см. facets.update_products)."""
+    qs = Product.objects.select_related("category").prefetch_related("variants", "media").order_by("pk")
+    if product_ids is not None:
+        qs = qs.filter(pk__in=list(product_ids))
+    products = list(qs)
+    tree_ids = {p.category.tree_id for p in products}
+    roots = dict(
+        Category.objects.filter(tree_id__in=tree_ids, parent__isnull=True).values_list("tree_id", "slug")
+    ) if tree_ids else {}
+    now = timezone.now()
+    rows = []
+    facet_entries = {}
+    for p in products:
+        variants = sorted(p.variants.all(), key=lambda v: v.pk)
+        facet_entries[p.pk] = (
+            ((p.sort_order, p.name, p.is_new, p.category_id, p.brand_id), [(v.pk, v.price, v.stock) for v in variants])
+            if p.is_active and p.slug else None
+        )
+        default = next((v for v in variants if v.is_default), variants[0] if variants else None)
+        image = next((m for m in p.media.all() if m.media_type == "image"), None)
+        rows.append(ProductListing(
+            product_id=p.pk,
+            name=p.name,
+            slug=p.slug or "",
+            category_id=p.category_id,
+            root_category_slug=roots.get(p.category.tree_id) or "",
+            default_variant_id=default.pk if default else None,
+            price=default.price if default else None,
+            pv=default.pv if default else None,
+            min_price=min(v.price for v in variants) if variants else None,
+            variants_count=len(variants),
+            main_image=image.file.name if image else "",
+            in_stock=any(v.stock > 0 for v in variants),
+            is_new=p.is_new,
+            is_active=p.is_active,
+            sort_order=p.sort_order,
+            updated_at=now,
+        ))
+    return rows, facet_entries
+
+
+def refresh_products(product_ids: Iterable[int]) -> int:
+    """Пересобрать строки витрины для товаров. Возвращает число записанных строк."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return 0
+    rows, facet_entries = _build(product_ids)
+    ProductListing.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=_UPDATE_FIELDS,
+    )
+    # Удалённые товары тоже сверяются с индексом: если они в нём есть — пересборка
+    facets.update_products({pk: facet_entries.get(pk) for pk in product_ids})
+    return len(rows)
+
+
+def refresh_all(batch_size: int = BATCH_SIZE) -> int:
+    """Полная пересборка витрины пачками; строки удалённых товаров удаляются каскадом."""
+    ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+    total = 0
+    for i in range(0, len(ids), batch_size):
+        total += refresh_products(ids[i:i + batch_size])
+    return total
+
+
+def refresh_category_tree(tree_id: int) -> None:
+    """Пересобрать витрину товаров дерева категорий (изменился slug корня или структура дерева)."""
+    refresh_products(Product.objects.filter(category__tree_id=tree_id).values_list("pk", flat=True))
+
+
+def schedule_refresh(product_id: int) -> None:
+    """Обновить строку товара после коммита текущей транзакции (или сразу вне транзакции)."""
+    def run():
+        try:
+            refresh_products([product_id])
+        except Exception as e:
+            logger.warning("ProductListing: не удалось обновить товар %s: %s", product_id, e)
+
+    transaction.on_commit(run)
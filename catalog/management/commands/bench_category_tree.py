@@ -0,0 +1,139 @@
+"""
+Бенчмарк выборки товаров поддерева категорий на глубоком дереве.
+
+Во временной транзакции (откатывается в конце) строится дерево --depth уровней по --branching
+потомков и --products товаров в случайных категориях. Для категорий на каждом уровне
+самой длинной ветки сравниваются:
+1) прежний способ: id потомков запросом get_descendants() и category_id IN (...);
+2) один диапазон tree_id/lft/rght (category_tree.subtree_q);
+3) множество id потомков из снимка дерева (category_tree.descendant_ids): первый вызов и из кэша.
+
+Использование:
+  python manage.py bench_category_tree
+  python manage.py bench_category_tree --depth 10 --branching 3 --products 20000
+"""
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from catalog import category_tree
+from catalog.listing import refresh_products
+from catalog.models import Category, Product, ProductListing
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк выборки товаров поддерева категорий (MPTT-диапазон против IN по потомкам)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depth", type=int, default=8, help="Глубина дерева")
+        parser.add_argument("--branching", type=int, default=3, help="Потомков у каждой категории")
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого замера")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        depth, branching = options["depth"], options["branching"]
+        if depth < 1 or branching < 1:
+            raise CommandError("--depth и --branching должны быть положительными.")
+        nodes = sum(branching ** level for level in range(depth))
+        if nodes > 200000:
+            raise CommandError(f"Слишком большое дерево: {nodes} категорий.")
+        try:
+            with transaction.atomic():
+                self._run(depth, branching, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+        category_tree.invalidate()
+        self.stdout.write("Тестовые данные удалены (транзакция откатена).")
+
+    def _build_tree(self, depth, branching):
+        tag = uuid.uuid4().hex[:8]
+        tree_id = (Category.objects.aggregate(m=Max("tree_id"))["m"] or 0) + 1
+        counter = 0
+
+        def make(parent):
+            # lft/rght/level проставит partial_rebuild
+            nonlocal counter
+            counter += 1
+            return Category(
+                name=f"bench {tag} {counter}", slug=f"bench-{tag}-{counter}", parent=parent,
+                tree_id=tree_id, lft=0, rght=0, level=0,
+            )
+
+        with Category.objects.disable_mptt_updates():
+            root = make(None)
+            root.save()
+            levels = [[root]]
+            for _ in range(depth - 1):
+                children = Category.objects.bulk_create(
+                    [make(parent) for parent in levels[-1] for _ in range(branching)], batch_size=1000
+                )
+                levels.append(children)
+        Category.objects.partial_rebuild(tree_id)
+        category_tree.invalidate()
+        all_ids = [c.pk for level in levels for c in level]
+        # Ветка от корня до самого глубокого уровня (первые потомки)
+        path = list(
+            Category.objects.filter(pk__in=[level[0].pk for level in levels]).order_by("level")
+        )
+        return all_ids, path
+
+    def _timed(self, func, repeat):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - t0) * 1000 / repeat, result
+
+    def _run(self, depth, branching, options):
+        rng = random.Random(options["seed"])
+        t0 = time.perf_counter()
+        category_ids, path = self._build_tree(depth, branching)
+        tag = uuid.uuid4().hex[:8]
+        products = Product.objects.bulk_create(
+            [
+                Product(category_id=rng.choice(category_ids), name=f"bench {i}", slug=f"bench-{tag}-{i}")
+                for i in range(options["products"])
+            ],
+            batch_size=1000,
+        )
+        ids = [p.pk for p in products]
+        for i in range(0, len(ids), 1000):
+            refresh_products(ids[i:i + 1000])
+        self.stdout.write(
+            f"Категорий: {len(category_ids)}, товаров: {len(ids)}, подготовка {time.perf_counter() - t0:.1f} с"
+        )
+        self.stdout.write("уровень | товаров | IN по потомкам, мс | диапазон, мс | id потомков: первый / кэш, мкс")
+
+        repeat = max(1, options["repeat"])
+        listing = ProductListing.objects.filter(is_active=True)
+        for cat in path:
+            def by_descendants():
+                desc = list(cat.get_descendants(include_self=True).values_list("pk", flat=True))
+                return list(listing.filter(category_id__in=desc).values_list("pk", flat=True))
+
+            def by_range():
+                return list(listing.filter(category_tree.subtree_q(cat)).values_list("pk", flat=True))
+
+            old_ms, old = self._timed(by_descendants, repeat)
+            new_ms, new = self._timed(by_range, repeat)
+            if set(old) != set(new):
+                self.stdout.write(self.style.ERROR(f"Уровень {cat.level}: результаты различаются"))
+
+            category_tree.invalidate()
+            snapshot = category_tree.get_snapshot()
+            t1 = time.perf_counter()
+            snapshot.descendant_ids(cat.pk)
+            cold_us = (time.perf_counter() - t1) * 1e6
+            warm_ms, _ = self._timed(lambda: category_tree.descendant_ids(cat), repeat)
+            self.stdout.write(
+                f"{cat.level:7} | {len(new):7} | {old_ms:18.2f} | {new_ms:12.2f} | {cold_us:.0f} / {warm_ms * 1000:.1f}"
+            )
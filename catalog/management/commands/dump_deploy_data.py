@@ -1,65 +1,55 @@
 """
-Выгрузка контента для переноса на другой сервер (без заказов и пользователей).
+Выгрузка контента для переноса на другой сервер (без заказов).
 
-Создаёт JSON-фикстуру: каталог (бренды, категории, атрибуты, товары, варианты, медиа),
-справочник городов и пользователей (users.User, UserAddress). Заказы и корзины не включаются.
+Создаёт папку с JSONL-файлами по моделям и manifest.json (catalog/deploy_dump.py): каталог
+(бренды, категории, атрибуты, товары, варианты, медиа), справочник городов и пользователей
+(users.User, UserAddress). Заказы и корзины не включаются. Файлы пишутся потоково, память
+не зависит от размера базы.
 
 Использование:
   python manage.py dump_deploy_data
-  python manage.py dump_deploy_data -o deploy_data/fixture.json
+  python manage.py dump_deploy_data -o deploy_data/dump --compress
 
 На новом месте:
   python manage.py migrate
-  python manage.py loaddata deploy_data/fixture.json
+  python manage.py load_deploy_data deploy_data/dump
 """
-import os
-from django.core.management import call_command
-from django.core.management.base import BaseCommand
+import time
 
+from django.core.management.base import BaseCommand
 
-# Порядок важен: от зависимостей к зависимым
-DEPLOY_DATA_APPS = [
-    "catalog.ProductAttribute",
-    "catalog.ProductAttributeValue",
-    "catalog.Brand",
-    "catalog.Category",
-    "catalog.CategoryAttribute",
-    "catalog.Product",
-    "catalog.ProductVariant",
-    "catalog.ProductVariantAttribute",
-    "catalog.ProductMedia",
-    "orders.City",
-    "users.User",
-    "users.UserAddress",
-]
+from catalog.deploy_dump import CHUNK_SIZE, dump
 
 
 class Command(BaseCommand):
-    help = "Выгрузить каталог и города в JSON для переноса (без заказов и пользователей)"
+    help = "Выгрузить каталог, города и пользователей в JSONL для переноса (без заказов)"
 
     def add_arguments(self, parser):
         parser.add_argument(
             "-o", "--output",
-            default="deploy_data/fixture.json",
-            help="Путь к выходному JSON-файлу (по умолчанию deploy_data/fixture.json)",
+            default="deploy_data/dump",
+            help="Папка выгрузки (по умолчанию deploy_data/dump)",
         )
+        parser.add_argument("--compress", action="store_true", help="Сжимать файлы gzip (.jsonl.gz)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
 
     def handle(self, *args, **options):
-        out_path = options["output"]
-        out_dir = os.path.dirname(out_path)
-        if out_dir and not os.path.isdir(out_dir):
-            os.makedirs(out_dir, exist_ok=True)
-            self.stdout.write(f"Создана папка: {out_dir}")
-
-        with open(out_path, "w", encoding="utf-8") as f:
-            call_command(
-                "dumpdata",
-                *DEPLOY_DATA_APPS,
-                indent=2,
-                stdout=f,
-            )
-
-        self.stdout.write(self.style.SUCCESS(f"Фикстура записана: {out_path}"))
-        self.stdout.write("На новом месте: migrate → loaddata " + out_path)
-        if out_path.startswith("deploy_data/"):
+        out_dir = options["output"]
+        t0 = time.perf_counter()
+
+        def progress(label, count):
+            self.stdout.write(f"  {label}: {count}", ending="\r")
+            self.stdout.flush()
+
+        tty = self.stdout.isatty()
+
+        manifest = dump(out_dir, compress=options["compress"], chunk_size=max(1, options["chunk_size"]), progress=progress if tty else None)
+        if tty:
+            self.stdout.write("")
+        for entry in manifest["models"]:
+            self.stdout.write(f"  {entry['model']}: {entry['count']} → {entry['file']}")
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(f"Выгрузка записана: {out_dir} ({elapsed:.1f} с)"))
+        self.stdout.write("На новом месте: migrate → load_deploy_data " + out_dir)
+        if out_dir.startswith("deploy_data/"):
             self.stdout.write("Медиа-файлы (изображения товаров) скопируйте в MEDIA_ROOT вручную или архивом.")
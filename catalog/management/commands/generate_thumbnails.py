@@ -0,0 +1,42 @@
+"""
+Уменьшенные копии всех фото товаров (catalog.thumbnails) — после переноса медиа, смены
+THUMBNAIL_FORMAT / THUMBNAIL_QUALITY или добавления исполнения. Ресайз в пуле процессов.
+
+Использование:
+  python manage.py generate_thumbnails
+  python manage.py generate_thumbnails --workers 4 --product 12
+  python manage.py generate_thumbnails --force   # пересоздать существующие
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import thumbnails
+from catalog.models import ProductMedia
+
+
+class Command(BaseCommand):
+    help = "Создать уменьшенные копии фото товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=0, help="Процессов (по умолчанию — число ядер)")
+        parser.add_argument("--product", type=int, action="append", default=[], help="ID товара (можно несколько)")
+        parser.add_argument("--force", action="store_true", help="Пересоздать уже существующие копии")
+
+    def handle(self, *args, **options):
+        if not thumbnails.enabled():
+            raise CommandError("Копии выключены (THUMBNAILS_ENABLED) или не установлен Pillow.")
+        qs = ProductMedia.objects.filter(media_type=ProductMedia.MediaType.IMAGE).exclude(file="")
+        if options["product"]:
+            qs = qs.filter(product_id__in=options["product"])
+        names = sorted(set(qs.values_list("file", flat=True)))
+        t0 = time.perf_counter()
+        created = 0
+        for i, (_, count) in enumerate(
+            thumbnails.generate_many(names, workers=max(0, options["workers"]), force=options["force"]), 1
+        ):
+            created += count
+            if i % 100 == 0:
+                self.stdout.write(f"  {i}/{len(names)} фото, создано файлов: {created}")
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(f"Фото: {len(names)}, создано копий: {created} за {elapsed:.1f} с"))
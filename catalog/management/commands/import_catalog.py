@@ -0,0 +1,44 @@
+"""
+Пакетный импорт каталога из CSV/XLSX (формат колонок — в catalog/catalog_import.py).
+
+Повторный импорт того же файла обновляет товары (по article) и варианты (по sku), не создавая дублей.
+
+Использование:
+  python manage.py import_catalog catalog.xlsx
+  python manage.py import_catalog catalog.csv --chunk-size 1000
+  python manage.py import_catalog catalog.csv --dry-run
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.catalog_import import CHUNK_SIZE, CatalogImportError, import_catalog
+
+
+class Command(BaseCommand):
+    help = "Импорт товаров, вариантов и характеристик из CSV/XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл .csv или .xlsx")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Строк в одной транзакции")
+        parser.add_argument("--dry-run", action="store_true", help="Проверить файл без сохранения")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"Файл не найден: {path}")
+        try:
+            stats = import_catalog(path, chunk_size=options["chunk_size"], dry_run=options["dry_run"])
+        except CatalogImportError as e:
+            raise CommandError(str(e))
+
+        for error in stats["errors"]:
+            self.stdout.write(self.style.WARNING(error))
+        if stats["skipped"] > len(stats["errors"]):
+            self.stdout.write(self.style.WARNING(f"… и ещё {stats['skipped'] - len(stats['errors'])} ошибок"))
+        prefix = "Проверка (без сохранения)" if options["dry_run"] else "Импорт завершён"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: строк {stats['rows']}, товаров {stats['products']}, вариантов {stats['variants']}, "
+            f"пропущено {stats['skipped']}, новых категорий {stats['categories_created']}; "
+            f"{stats['seconds']:.1f} с, {stats['rows_per_sec']:.0f} строк/с"
+        ))
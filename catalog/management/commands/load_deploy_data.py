@@ -0,0 +1,47 @@
+"""
+Загрузка выгрузки dump_deploy_data на новом сервере.
+
+Пачки bulk_create в одной транзакции, без save() и сигналов: пользователи не попадают в очередь
+выгрузки, даты создания и изменения сохраняются. Строки с тем же pk перезаписываются (как loaddata).
+В конце пересобирается витрина каталога.
+
+Использование:
+  python manage.py migrate
+  python manage.py load_deploy_data deploy_data/dump
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.deploy_dump import CHUNK_SIZE, load, read_manifest
+
+
+class Command(BaseCommand):
+    help = "Загрузить выгрузку dump_deploy_data (JSONL) пачками bulk_create"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="deploy_data/dump", help="Папка выгрузки")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        in_dir = options["path"]
+        try:
+            read_manifest(in_dir)
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+        t0 = time.perf_counter()
+
+        def progress(label, done, total):
+            rate = done / max(time.perf_counter() - t0, 1e-6)
+            self.stdout.write(f"  {label}: {done}/{total} ({rate:.0f} строк/с всего)", ending="\r")
+            self.stdout.flush()
+
+        tty = self.stdout.isatty()
+
+        loaded = load(in_dir, chunk_size=max(1, options["chunk_size"]), progress=progress if tty else None)
+        if tty:
+            self.stdout.write("")
+        for label, count in loaded.items():
+            self.stdout.write(f"  {label}: {count}")
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(f"Загружено {sum(loaded.values())} строк за {elapsed:.1f} с"))
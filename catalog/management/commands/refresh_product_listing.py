@@ -0,0 +1,32 @@
+"""
+Пересборка витрины карточек товаров (ProductListing).
+
+Сигналы поддерживают витрину сами; команда нужна после массовых изменений в обход ORM-сигналов
+(queryset.update, загрузка дампа) и для проверки. По cron можно запускать раз в сутки.
+
+Использование:
+  python manage.py refresh_product_listing
+  python manage.py refresh_product_listing --product 12 --product 15
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.listing import BATCH_SIZE, refresh_all, refresh_products
+
+
+class Command(BaseCommand):
+    help = "Пересобрать витрину карточек товаров (ProductListing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, action="append", default=[], help="ID товара (можно несколько)")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        if options["product"]:
+            count = refresh_products(options["product"])
+        else:
+            count = refresh_all(max(1, options["batch_size"]))
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(f"Витрина обновлена: {count} товаров за {elapsed:.1f} с"))
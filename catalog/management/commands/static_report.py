@@ -0,0 +1,99 @@
+"""
+Размеры статики: исходный размер, gzip и brotli по каждому файлу и итоги по типам.
+
+После collectstatic с STATIC_MANIFEST=True берёт собранные файлы из STATIC_ROOT (хэшированные
+имена, готовые .gz/.br); иначе — исходники из STATICFILES_DIRS и приложений, gzip считается на лету.
+
+Использование:
+  python manage.py static_report
+  python manage.py static_report --limit 50 --prefix css/
+"""
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+
+from store.storage import COMPRESSIBLE_EXTENSIONS
+
+
+def _size(path):
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def _kb(n):
+    return "—" if n is None else f"{n / 1024:.1f}"
+
+
+class Command(BaseCommand):
+    help = "Отчёт о размерах статики (исходный / gzip / brotli)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Сколько самых больших файлов показать")
+        parser.add_argument("--prefix", default="", help="Только файлы с этим префиксом пути, например css/")
+
+    def _collected(self):
+        """(имя, имя с хэшем, размер, gz, br) из STATIC_ROOT по манифесту или None, если сборки нет."""
+        manifest_path = os.path.join(settings.STATIC_ROOT, "staticfiles.json")
+        if not getattr(settings, "STATIC_MANIFEST", False) or not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, encoding="utf-8") as f:
+            paths = json.load(f).get("paths", {})
+        rows = []
+        for name, hashed in paths.items():
+            path = os.path.join(settings.STATIC_ROOT, hashed)
+            size = _size(path)
+            if size is not None:
+                rows.append((name, hashed, size, _size(path + ".gz"), _size(path + ".br")))
+        return rows
+
+    def _sources(self):
+        rows = []
+        seen = set()
+        for finder in finders.get_finders():
+            for name, storage in finder.list([]):
+                if name in seen:
+                    continue
+                seen.add(name)
+                path = storage.path(name)
+                size = os.path.getsize(path)
+                gz = None
+                if name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                    with open(path, "rb") as f:
+                        gz = len(gzip.compress(f.read(), compresslevel=9))
+                rows.append((name, name, size, gz, None))
+        return rows
+
+    def handle(self, *args, **options):
+        rows = self._collected()
+        if rows is None:
+            self.stdout.write("Сборки с манифестом нет — исходники, gzip посчитан на лету (STATIC_MANIFEST=True + collectstatic для продакшена).")
+            rows = self._sources()
+        else:
+            self.stdout.write(f"Собранная статика: {settings.STATIC_ROOT}")
+        prefix = options["prefix"]
+        rows = [r for r in rows if r[0].startswith(prefix)]
+
+        totals = {}
+        for name, _, size, gz, br in rows:
+            ext = os.path.splitext(name)[1].lower() or "(нет)"
+            t = totals.setdefault(ext, [0, 0, 0, 0])
+            t[0] += 1
+            t[1] += size
+            t[2] += gz if gz is not None else size
+            t[3] += br if br is not None else (gz if gz is not None else size)
+
+        self.stdout.write(f"{'файл':60} {'КБ':>9} {'gzip':>9} {'br':>9}")
+        for name, hashed, size, gz, br in sorted(rows, key=lambda r: -r[2])[: max(0, options["limit"])]:
+            shown = hashed if len(hashed) <= 60 else "…" + hashed[-59:]
+            self.stdout.write(f"{shown:60} {_kb(size):>9} {_kb(gz):>9} {_kb(br):>9}")
+        self.stdout.write("")
+        self.stdout.write(f"{'тип':10} {'файлов':>7} {'КБ':>10} {'по сети, КБ':>12}")
+        for ext, (count, size, gz, br) in sorted(totals.items(), key=lambda kv: -kv[1][1]):
+            self.stdout.write(f"{ext:10} {count:7} {size / 1024:10.1f} {br / 1024:12.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Итого: {len(rows)} файлов, {sum(t[1] for t in totals.values()) / 1024:.1f} КБ, "
+            f"по сети (лучшее сжатие) {sum(t[3] for t in totals.values()) / 1024:.1f} КБ"
+        ))
@@ -0,0 +1,41 @@
+# Витрина карточек товаров (ProductListing) и её первичное заполнение
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_populate_productvariant_pv'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='catalog.product', verbose_name='Товар')),
+                ('name', models.CharField(max_length=500, verbose_name='Название')),
+                ('slug', models.SlugField(blank=True, max_length=500, verbose_name='URL')),
+                ('root_category_slug', models.CharField(blank=True, max_length=200, verbose_name='Корневая категория')),
+                ('default_variant_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Вариант по умолчанию')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Цена')),
+                ('pv', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='PV')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Мин. цена')),
+                ('variants_count', models.PositiveIntegerField(default=0, verbose_name='Вариантов')),
+                ('main_image', models.CharField(blank=True, max_length=255, verbose_name='Главное фото')),
+                ('in_stock', models.BooleanField(default=False, verbose_name='В наличии')),
+                ('is_new', models.BooleanField(default=False, verbose_name='Новинка')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('sort_order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('updated_at', models.DateTimeField(verbose_name='Обновлено')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Карточка товара (витрина)',
+                'verbose_name_plural': 'Карточки товаров (витрина)',
+                'ordering': ['sort_order', 'name'],
+                'indexes': [models.Index(fields=['is_active', 'sort_order', 'name'], name='catalog_listing_active_idx')],
+            },
+        ),
+    ]
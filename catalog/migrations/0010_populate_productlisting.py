@@ -0,0 +1,51 @@
+# Первичное заполнение витрины карточек товаров (дальше её поддерживает catalog.listing)
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def populate_listing(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Category = apps.get_model("catalog", "Category")
+    ProductListing = apps.get_model("catalog", "ProductListing")
+
+    roots = dict(Category.objects.filter(parent__isnull=True).values_list("tree_id", "slug"))
+    now = timezone.now()
+    rows = []
+    for p in Product.objects.select_related("category").prefetch_related("variants", "media").iterator(chunk_size=500):
+        variants = sorted(p.variants.all(), key=lambda v: v.pk)
+        default = next((v for v in variants if v.is_default), variants[0] if variants else None)
+        image = next((m for m in sorted(p.media.all(), key=lambda m: (m.sort_order, m.pk)) if m.media_type == "image"), None)
+        rows.append(ProductListing(
+            product_id=p.pk,
+            name=p.name,
+            slug=p.slug or "",
+            category_id=p.category_id,
+            root_category_slug=roots.get(p.category.tree_id) or "",
+            default_variant_id=default.pk if default else None,
+            price=default.price if default else None,
+            pv=default.pv if default else None,
+            min_price=min(v.price for v in variants) if variants else None,
+            variants_count=len(variants),
+            main_image=image.file.name if image else "",
+            in_stock=any(v.stock > 0 for v in variants),
+            is_new=p.is_new,
+            is_active=p.is_active,
+            sort_order=p.sort_order,
+            updated_at=now,
+        ))
+    ProductListing.objects.bulk_create(rows, batch_size=500)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0009_productlisting"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_listing, noop),
+    ]
@@ -0,0 +1,23 @@
+# Составной индекс для выборки поддерева категорий одним диапазоном (tree_id, lft, rght).
+# Второй индекс (tree_id, lft) — стандартный индекс django-mptt (MPTTModelBase добавляет его
+# в Meta.indexes). Он покрывает тот же диапазон, поэтому catalog_category_tree_range удалён в 0013.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_populate_productlisting'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tree_id', 'lft', 'rght'], name='catalog_category_tree_range'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tree_id', 'lft'], name='catalog_category_tree_id_lc185'),
+        ),
+    ]
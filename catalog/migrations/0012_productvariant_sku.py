@@ -0,0 +1,18 @@
+# SKU варианта — ключ для импорта каталога
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_category_tree_range_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Артикул варианта — ключ для импорта каталога (import_catalog).', max_length=100, null=True, unique=True, verbose_name='SKU'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Индекс (tree_id, lft, rght) дублирует индекс django-mptt (tree_id, lft): условие поддерева
+# tree_id = X AND lft BETWEEN ... не использует rght
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_productvariant_sku'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='category',
+            name='catalog_category_tree_range',
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.utils.text import slugify
 from mptt.models import MPTTModel, TreeForeignKey
 
+from .slugs import save_with_unique_slug
+
 
 class Brand(models.Model):
     name = models.CharField("Название", max_length=200)
@@ -17,7 +19,7 @@ class Brand(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            return save_with_unique_slug(self, slugify(self.name) or "brand", super().save, *args, **kwargs)
         super().save(*args, **kwargs)
 
 
@@ -46,6 +48,11 @@ class Category(MPTTModel):
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
         ordering = ["tree_id", "lft"]
+        indexes = [
+            # Поддерево — один диапазон: tree_id = X AND lft BETWEEN lft_корня AND rght_корня.
+            # Стандартный индекс django-mptt под его именем: объявлен явно, чтобы mptt не добавлял второй
+            models.Index(fields=["tree_id", "lft"], name="catalog_category_tree_id_lc185"),
+        ]
 
     class MPTTMeta:
         order_insertion_by = ["sort_order", "name"]
@@ -55,23 +62,18 @@ class Category(MPTTModel):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base = slugify(self.name) or "category"
-            slug = base
-            counter = 1
-            while Category.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base}-{counter}"
-                counter += 1
-            self.slug = slug
+            return save_with_unique_slug(self, slugify(self.name) or "category", super().save, *args, **kwargs)
         super().save(*args, **kwargs)
 
     def get_attribute_ids_with_parents(self):
-        ids = set(self.attributes.values_list("id", flat=True))
-        for ancestor in self.get_ancestors():
-            ids.update(ancestor.attributes.values_list("id", flat=True))
-        return ids
+        from .category_tree import attribute_ids_with_parents
+
+        return attribute_ids_with_parents(self)
 
     def get_self_and_parents(self):
-        return list(self.get_ancestors()) + [self]
+        if not hasattr(self, "_self_and_parents"):
+            self._self_and_parents = list(self.get_ancestors()) + [self]
+        return list(self._self_and_parents)
 
 
 class CategoryAttribute(models.Model):
@@ -173,13 +175,7 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base = (slugify(self.name) or "product")[:200]
-            slug = base
-            counter = 1
-            while Product.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base}-{counter}"
-                counter += 1
-            self.slug = slug
+            return save_with_unique_slug(self, (slugify(self.name) or "product")[:200], super().save, *args, **kwargs)
         super().save(*args, **kwargs)
 
 
@@ -190,6 +186,14 @@ class ProductVariant(models.Model):
         related_name="variants",
         verbose_name="Товар",
     )
+    sku = models.CharField(
+        "SKU",
+        max_length=100,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Артикул варианта — ключ для импорта каталога (import_catalog).",
+    )
     price = models.DecimalField(
         "Цена",
         max_digits=12,
@@ -284,6 +288,58 @@ class ProductMedia(models.Model):
         ordering = ["sort_order", "id"]
 
 
+class ProductListing(models.Model):
+    """
+    Витрина карточек товаров (read model): всё, что нужно карточке, в одной строке без JOIN.
+    Поддерживается catalog.listing (сигналы товара, вариантов, фото и категорий);
+    полная пересборка — manage.py refresh_product_listing.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="listing",
+        verbose_name="Товар",
+    )
+    name = models.CharField("Название", max_length=500)
+    slug = models.SlugField("URL", max_length=500, blank=True)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Категория",
+    )
+    root_category_slug = models.CharField("Корневая категория", max_length=200, blank=True)
+    default_variant_id = models.PositiveIntegerField("Вариант по умолчанию", null=True, blank=True)
+    price = models.DecimalField("Цена", max_digits=12, decimal_places=2, null=True, blank=True)
+    pv = models.DecimalField("PV", max_digits=12, decimal_places=2, null=True, blank=True)
+    min_price = models.DecimalField("Мин. цена", max_digits=12, decimal_places=2, null=True, blank=True)
+    variants_count = models.PositiveIntegerField("Вариантов", default=0)
+    main_image = models.CharField("Главное фото", max_length=255, blank=True)
+    in_stock = models.BooleanField("В наличии", default=False)
+    is_new = models.BooleanField("Новинка", default=False)
+    is_active = models.BooleanField("Активен", default=True)
+    sort_order = models.PositiveIntegerField("Порядок", default=0)
+    updated_at = models.DateTimeField("Обновлено")
+
+    class Meta:
+        verbose_name = "Карточка товара (витрина)"
+        verbose_name_plural = "Карточки товаров (витрина)"
+        ordering = ["sort_order", "name"]
+        indexes = [
+            models.Index(fields=["is_active", "sort_order", "name"], name="catalog_listing_active_idx"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def main_image_url(self):
+        if not self.main_image:
+            return ""
+        return ProductMedia._meta.get_field("file").storage.url(self.main_image)
+
+
 class CartStorage(models.Model):
     """Корзина в БД — надёжное сохранение вместо сессии."""
     session_key = models.CharField(max_length=40, db_index=True, unique=True)
@@ -0,0 +1,98 @@
+"""
+Сигналы: изменения вариантов (в т.ч. остатков и характеристик) и фото товара обновляют
+Product.updated_at — от него зависят ключи кэша карточки товара (templates/catalog/_product_card*.html)
+и матрицы вариантов (catalog.variant_matrix).
+Те же изменения, а также сохранение товара и категорий, обновляют витрину карточек (catalog.listing);
+изменения характеристик вариантов сбрасывают индекс фасетов (catalog.facets),
+изменения категорий — снимок дерева, а изменения категорий и их атрибутов — кэш
+атрибутов с учётом предков (catalog.category_tree).
+Загрузка фото сразу создаёт его маленькие копии для карточки и корзины (catalog.thumbnails),
+удаление — удаляет копии.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import category_tree, facets, listing, thumbnails
+from .models import Category, CategoryAttribute, Product, ProductMedia, ProductVariant, ProductVariantAttribute
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductMedia)
+@receiver(post_delete, sender=ProductMedia)
+def touch_product(sender, instance, **kwargs):
+    if instance.product_id:
+        Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+        listing.schedule_refresh(instance.product_id)
+
+
+@receiver(post_save, sender=ProductMedia)
+def media_post_save(sender, instance, **kwargs):
+    if instance.media_type == ProductMedia.MediaType.IMAGE and instance.file and thumbnails.enabled():
+        # Крупные исполнения создаются при первом запросе или командой generate_thumbnails
+        widths = thumbnails.RENDITIONS["card"] + thumbnails.RENDITIONS["cart"]
+        name = instance.file.name
+        transaction.on_commit(lambda: thumbnails.generate_safe(name, widths))
+
+
+@receiver(post_delete, sender=ProductMedia)
+def media_post_delete(sender, instance, **kwargs):
+    name = instance.file.name if instance.file else ""
+    # Тот же файл может быть у другой записи (копия варианта)
+    if name and not ProductMedia.objects.filter(file=name).exists():
+        transaction.on_commit(lambda: thumbnails.delete(name))
+
+
+@receiver(post_save, sender=Product)
+def product_post_save(sender, instance, **kwargs):
+    listing.schedule_refresh(instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def category_post_delete(sender, instance, **kwargs):
+    category_tree.invalidate()
+    category_tree.invalidate_attributes()
+
+
+@receiver(post_save, sender=Category)
+def category_post_save(sender, instance, created, **kwargs):
+    category_tree.invalidate()
+    category_tree.invalidate_attributes()
+    # Новая категория пуста; у существующей мог смениться slug корня или место в дереве
+    if not created:
+        tree_id = instance.tree_id
+        transaction.on_commit(lambda: listing.refresh_category_tree(tree_id))
+
+
+@receiver(post_save, sender=ProductVariantAttribute)
+@receiver(post_delete, sender=ProductVariantAttribute)
+def touch_product_by_variant_attribute(sender, instance, **kwargs):
+    Product.objects.filter(variants__pk=instance.variant_id).update(updated_at=timezone.now())
+    facets.invalidate()
+
+
+@receiver(m2m_changed, sender=ProductVariant.attribute_values.through)
+def touch_product_by_attribute_values(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance — ProductAttributeValue, pk_set — варианты (при clear не передаётся)
+        qs = Product.objects.filter(variants__pk__in=pk_set or ())
+    else:
+        qs = Product.objects.filter(pk=instance.product_id)
+    qs.update(updated_at=timezone.now())
+    facets.invalidate()
+
+
+@receiver(post_save, sender=CategoryAttribute)
+@receiver(post_delete, sender=CategoryAttribute)
+def category_attribute_changed(sender, instance, **kwargs):
+    category_tree.invalidate_attributes()
+
+
+@receiver(m2m_changed, sender=Category.attributes.through)
+def category_attributes_m2m_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        category_tree.invalidate_attributes()
@@ -0,0 +1,82 @@
+"""
+Уникальные slug для товаров, категорий и брендов.
+
+Свободный slug ищется одним агрегирующим запросом по строкам «base» и «base-…» (slug__startswith
+использует индекс _like на PostgreSQL): занят ли сам base и наибольший числовой суффикс N в «base-N»
+(регулярное выражение и Max считает база, в Python строки не читаются). Следующий slug — base-(N+1);
+пропуски после удалённых записей не переиспользуются. Параллельные вставки с одинаковым base ловятся
+уникальным индексом: save_with_unique_slug повторяет сохранение со следующим slug. Для пакетного
+импорта — SlugAllocator: один запрос на base, затем выдача из памяти.
+"""
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Cast, Substr
+
+SAVE_ATTEMPTS = 5
+# Больше цифр в суффиксе не влезает в bigint — такие slug суффиксом не считаются
+_MAX_SUFFIX_DIGITS = 18
+
+
+def _slug_state(model, base: str, exclude_pk=None) -> tuple[bool, int]:
+    """Занят ли сам base и наибольший N среди занятых «base-N» (0, если таких нет)."""
+    qs = model._default_manager.filter(models.Q(slug=base) | models.Q(slug__startswith=base + "-"))
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    suffix = models.Q(slug__regex=rf"^{re.escape(base)}-[0-9]{{1,{_MAX_SUFFIX_DIGITS}}}$")
+    state = qs.aggregate(
+        base_taken=models.Count("pk", filter=models.Q(slug=base)),
+        max_suffix=models.Max(Cast(Substr("slug", len(base) + 2), models.BigIntegerField()), filter=suffix),
+    )
+    return bool(state["base_taken"]), state["max_suffix"] or 0
+
+
+def next_free_slug(model, base: str, exclude_pk=None) -> str:
+    """base, если свободен, иначе base-(N+1), где N — наибольший занятый суффикс (один запрос)."""
+    base_taken, max_suffix = _slug_state(model, base, exclude_pk)
+    if not base_taken:
+        return base
+    return f"{base}-{max_suffix + 1}"
+
+
+def save_with_unique_slug(instance, base: str, save, *args, **kwargs):
+    """
+    Проставляет instance.slug = next_free_slug(...) и вызывает save(*args, **kwargs).
+    Если тот же slug параллельно занял другой процесс — берёт следующий (до SAVE_ATTEMPTS раз).
+    """
+    model = type(instance)
+    for attempt in range(SAVE_ATTEMPTS):
+        instance.slug = next_free_slug(model, base, exclude_pk=instance.pk)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            taken = model._default_manager.filter(slug=instance.slug).exclude(pk=instance.pk).exists()
+            if not taken or attempt == SAVE_ATTEMPTS - 1:
+                raise
+
+
+class SlugAllocator:
+    """
+    Выдача уникальных slug для пакетной вставки (bulk_create): занятые slug каждого base
+    читаются один раз, выданные запоминаются. Конкурентные вставки всё равно проверит уникальный индекс.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._bases: dict[str, tuple[bool, int]] = {}
+        self._issued: set[str] = set()
+
+    def allocate(self, base: str) -> str:
+        base_taken, n = self._bases.get(base) or _slug_state(self.model, base)
+        if not base_taken and base not in self._issued:
+            slug = base
+        else:
+            n += 1
+            # «base-N» мог быть выдан раньше как base другого товара
+            while f"{base}-{n}" in self._issued:
+                n += 1
+            slug = f"{base}-{n}"
+        self._bases[base] = (True, n)
+        self._issued.add(slug)
+        return slug
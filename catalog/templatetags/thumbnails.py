@@ -0,0 +1,24 @@
+"""
+Уменьшенные копии фото в шаблонах:
+
+  {% load thumbnails %}
+  <img src="{% thumb_url product.main_image 'card' %}" srcset="{% thumb_srcset product.main_image 'card' %}"
+       sizes="(max-width: 600px) 50vw, 320px">
+
+Первый аргумент — имя файла в хранилище (ProductMedia.file.name, ProductListing.main_image).
+"""
+from django import template
+
+from catalog import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumb_url(name, rendition, width=None):
+    return thumbnails.thumbnail_url(str(name or ""), rendition, width)
+
+
+@register.simple_tag
+def thumb_srcset(name, rendition):
+    return thumbnails.srcset(str(name or ""), rendition)
@@ -1,3 +1,548 @@
-from django.test import TestCase
+"""
+Число SQL-запросов горячих страниц витрины не растёт с числом товаров, вариантов и строк корзины.
+Импорт каталога из CSV: пачки, slug, характеристики, дерево категорий, повторный импорт.
+Фасеты, матрица вариантов и её кэш, обновление витрины карточек после коммита, перенос данных
+(dump_deploy_data → load_deploy_data), уменьшенные копии фото.
 
-# Create your tests here.
+python manage.py test --settings=store.test_settings
+"""
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from orders.models import City, DeliveryMethod
+from store.testing import QueryCountMixin, add_variants, cart_for, seed_catalog
+from users.models import UserAddress, UserSyncQueue
+
+from . import deploy_dump, facets, listing, thumbnails, variant_matrix
+from .catalog_import import import_catalog
+from .models import (
+    Brand,
+    Category,
+    CategoryAttribute,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    ProductListing,
+    ProductMedia,
+    ProductVariant,
+)
+from .slugs import SlugAllocator, next_free_slug
+
+
+def _set_cart(client, cart):
+    session = client.session
+    session["cart"] = cart
+    session.save()
+
+
+# Кэши карточек и матрицы вариантов выключены: иначе запросы в цикле прячутся за попаданием в кэш
+@override_settings(CATALOG_CARD_CACHE_TTL=0, CATALOG_VARIANT_MATRIX_TTL=0)
+class CatalogQueryCountTests(QueryCountMixin, TestCase):
+    def test_product_list(self):
+        seed_catalog(3)
+        url = reverse("catalog:product_list")
+        self.assertQueryCountFlat(3, lambda: self.client.get(url), lambda: seed_catalog(30))
+
+    def test_product_list_category(self):
+        seed_catalog(3)
+        url = reverse("catalog:product_list_category", args=["futbolki"])
+        self.assertQueryCountFlat(4, lambda: self.client.get(url), lambda: seed_catalog(30))
+
+    def test_product_detail(self):
+        product = seed_catalog(10)[0]
+        url = reverse("catalog:product_detail", args=[product.slug])
+        self.assertQueryCountFlat(10, lambda: self.client.get(url), lambda: add_variants(product, 20))
+
+    def test_cart_view(self):
+        products = seed_catalog(30)
+        lines = [p.variants.first() for p in products[:2]]
+        _set_cart(self.client, cart_for(lines))
+
+        def grow():
+            lines.extend(p.variants.first() for p in products[2:])
+            _set_cart(self.client, cart_for(lines))
+
+        url = reverse("catalog:cart")
+        self.assertQueryCountFlat(9, lambda: self.client.get(url), grow)
+
+    def test_checkout_view(self):
+        for i, code in enumerate(("cdek_courier", "cdek_pvz", "fivepost_pvz", "russianpost")):
+            DeliveryMethod.objects.get_or_create(code=code, defaults={"name": code, "sort_order": i})
+        user = get_user_model().objects.create_user(email="buyer@example.com", password="x")
+        user.addresses.create(city="Москва", address="ул. Тверская, 1", is_default=True)
+        self.client.force_login(user)
+        products = seed_catalog(30)
+        lines = [p.variants.first() for p in products[:2]]
+        _set_cart(self.client, cart_for(lines))
+
+        def grow():
+            lines.extend(p.variants.last() for p in products[2:])
+            _set_cart(self.client, cart_for(lines))
+
+        url = reverse("catalog:checkout")
+        self.assertQueryCountFlat(12, lambda: self.client.get(url), grow)
+
+
+class CatalogImportTests(TestCase):
+    HEADER = "article;name;sku;price;stock;category;attr:size"
+    ROWS = [
+        "T1;Futbolka;T1-S;1000;5;Одежда / Футболки;S",
+        "T1;Futbolka;T1-M;1000;5;Одежда / Футболки;M",
+        "T1;Futbolka;T1-L;1100;0;Одежда / Футболки;L",
+        "T2;Futbolka;T2-1;700;3;Одежда / Футболки;",
+        "C1;Кепка;C1-1;500;1;Одежда / Головные уборы;",
+    ]
+
+    def _import(self, lines, chunk_size=2):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, path)
+        return import_catalog(path, chunk_size=chunk_size)
+
+    def _sizes(self, sku):
+        return set(ProductVariant.objects.get(sku=sku).attribute_values.values_list("value", flat=True))
+
+    def test_import(self):
+        # chunk_size=2: варианты T1 попадают в разные пачки
+        stats = self._import([self.HEADER] + self.ROWS)
+
+        self.assertEqual((stats["rows"], stats["products"], stats["variants"], stats["skipped"]), (5, 3, 5, 0))
+        self.assertEqual(stats["categories_created"], 3)
+        t1, t2, c1 = (Product.objects.get(article=a) for a in ("T1", "T2", "C1"))
+        self.assertEqual(t1.variants.count(), 3)
+        self.assertEqual(t1.product_type, Product.ProductType.VARIABLE)
+        self.assertEqual(t2.product_type, Product.ProductType.SIMPLE)
+        # Одинаковые названия — разные slug; кириллица без транслитерации — «product»
+        self.assertEqual((t1.slug, t2.slug, c1.slug), ("futbolka", "futbolka-1", "product"))
+        self.assertEqual(self._sizes("T1-M"), {"M"})
+        self.assertEqual(self._sizes("T2-1"), set())
+
+        # Дерево пересобрано один раз в конце: lft/rght корректны
+        root = Category.objects.get(name="Одежда", parent=None)
+        self.assertEqual(
+            sorted(c.name for c in root.get_descendants()), ["Головные уборы", "Футболки"],
+        )
+        self.assertEqual(t1.category.get_root(), root)
+        self.assertTrue(ProductListing.objects.filter(product=t1).exists())
+
+    def test_reimport_updates_by_sku(self):
+        self._import([self.HEADER] + self.ROWS)
+        stats = self._import([self.HEADER, "T1;Futbolka;T1-S;900;7;Одежда / Футболки;XL"])
+
+        self.assertEqual((stats["products"], stats["variants"], stats["categories_created"]), (1, 1, 0))
+        variant = ProductVariant.objects.get(sku="T1-S")
+        self.assertEqual((variant.price, variant.stock), (900, 7))
+        self.assertEqual(self._sizes("T1-S"), {"XL"})
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Product.objects.get(article="T1").slug, "futbolka")
+
+    def test_price_only_reimport_keeps_attributes_and_type(self):
+        self._import([self.HEADER] + self.ROWS)
+        self._import(["article;name;sku;price", "T1;Futbolka;T1-M;1200"])
+
+        t1 = Product.objects.get(article="T1")
+        self.assertEqual(t1.product_type, Product.ProductType.VARIABLE)
+        self.assertEqual(self._sizes("T1-M"), {"M"})
+        variant = ProductVariant.objects.get(sku="T1-M")
+        self.assertEqual((variant.price, variant.stock), (1200, 5))
+        self.assertEqual(t1.category.name, "Футболки")
+
+    def test_invalid_rows_are_skipped(self):
+        stats = self._import([self.HEADER, "T9;;T9-1;100;1;Одежда;", "T8;Noname;T8-1;;1;Одежда;", self.ROWS[3]])
+
+        self.assertEqual((stats["rows"], stats["skipped"], stats["variants"]), (3, 2, 1))
+        self.assertEqual(len(stats["errors"]), 2)
+
+
+class SlugTests(TestCase):
+    def setUp(self):
+        for slug in ["nike", "nike-2", "nike-10", "nike-shoes", "nike-1x", "nikes-99", "adidas-3"]:
+            Brand.objects.create(name=slug, slug=slug)
+
+    def test_next_free_slug_takes_max_suffix(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(next_free_slug(Brand, "nike"), "nike-11")
+        self.assertEqual(next_free_slug(Brand, "adidas"), "adidas")
+        self.assertEqual(next_free_slug(Brand, "puma"), "puma")
+
+    def test_save_assigns_unique_slug(self):
+        self.assertEqual(Brand.objects.create(name="Nike").slug, "nike-11")
+
+    def test_allocator_reads_each_base_once(self):
+        allocator = SlugAllocator(Brand)
+        with self.assertNumQueries(2):
+            slugs = [allocator.allocate("nike"), allocator.allocate("nike"), allocator.allocate("adidas"), allocator.allocate("adidas")]
+        self.assertEqual(slugs, ["nike-11", "nike-12", "adidas", "adidas-4"])
+
+
+class FacetTests(TestCase):
+    # Товар: [(размер, цвет, цена, остаток), ...]
+    CATALOG = {
+        "A": [("M", "blue", 100, 5), ("L", "red", 300, 5)],
+        "B": [("M", "red", 150, 0), ("XL", "blue", 250, 3)],
+        "C": [("XL", "red", 400, 0)],
+        "D": [],
+    }
+
+    def setUp(self):
+        category = Category.objects.create(name="Футболки", slug="futbolki")
+        self.values = {}
+        for code, labels in (("size", ["M", "L", "XL"]), ("color", ["red", "blue"])):
+            attribute = ProductAttribute.objects.create(code=code, name=code)
+            for label in labels:
+                self.values[label] = ProductAttributeValue.objects.create(attribute=attribute, value=label)
+        self.products = {}
+        for name, variants in self.CATALOG.items():
+            product = Product.objects.create(category=category, name=name, slug=name.lower(), article=name)
+            self.products[name] = product
+            for size, color, price, stock in variants:
+                variant = ProductVariant.objects.create(product=product, sku=f"{name}-{size}", price=price, stock=stock)
+                variant.attribute_values.add(self.values[size], self.values[color])
+        listing.refresh_all()
+        facets.invalidate()
+        self.addCleanup(facets.invalidate)
+
+    def search(self, *values, **params):
+        query = QueryDict(mutable=True)
+        query.setlist("a", [str(self.values[v].pk) for v in values])
+        query.update(params)
+        index = facets.get_index()
+        result = index.search(facets.parse_selection(query))
+        names = {p.pk: n for n, p in self.products.items()}
+        return [names[pk] for pk in index.pks_for(result["bitmap"])], result
+
+    def counts(self, result, code):
+        attr = next(a for a in result["attributes"] if a["code"] == code)
+        return {v["value"]: v["count"] for v in attr["values"]}
+
+    def test_no_selection(self):
+        found, result = self.search()
+        self.assertEqual(found, ["A", "B", "C", "D"])
+        self.assertEqual((result["total"], result["in_stock_count"]), (4, 2))
+        self.assertEqual((result["price_min"], result["price_max"]), (100, 400))
+
+    def test_attributes_must_match_one_variant(self):
+        # У A есть M и есть красный, но не M-красный
+        self.assertEqual(self.search("M", "red")[0], ["B"])
+        self.assertEqual(self.search("M", "XL", "red")[0], ["B", "C"])
+        found, result = self.search("red")
+        self.assertEqual(found, ["A", "B", "C"])
+        self.assertEqual(self.counts(result, "size"), {"M": 1, "L": 1, "XL": 1})
+        self.assertEqual(self.counts(result, "color"), {"red": 3, "blue": 2})
+
+    def test_attribute_and_stock_match_one_variant(self):
+        # XL у C распродан, у B — в наличии; M-красный у B распродан
+        found, result = self.search("XL", in_stock="1")
+        self.assertEqual((found, result["total"]), (["B"], 1))
+        self.assertEqual(self.search("M", "red", in_stock="1")[0], [])
+        _, result = self.search("red", in_stock="1")
+        self.assertEqual(self.counts(result, "size"), {"L": 1})
+        self.assertEqual(self.search("M")[1]["in_stock_count"], 1)
+
+    def test_attribute_and_price_match_one_variant(self):
+        self.assertEqual(self.search("red", price_max="200")[0], ["B"])
+        self.assertEqual(self.search("blue", price_min="200")[0], ["B"])
+
+    def test_stock_change_patches_index(self):
+        index = facets.get_index()
+        variant = ProductVariant.objects.get(sku="B-XL")
+        variant.stock = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        self.assertIs(facets.get_index(), index)
+        self.assertEqual(self.search("XL", in_stock="1")[0], [])
+
+        variant.stock = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        self.assertEqual(self.search("XL", in_stock="1")[0], ["B"])
+
+    def test_other_changes_rebuild_index(self):
+        index = facets.get_index()
+        variant = ProductVariant.objects.get(sku="B-M")
+        variant.price = 500
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        self.assertIsNot(facets.get_index(), index)
+        self.assertEqual(self.search("red", price_max="200")[0], [])
+
+        index = facets.get_index()
+        product = self.products["C"]
+        product.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertIsNot(facets.get_index(), index)
+        self.assertEqual(self.search("XL")[0], ["B"])
+
+
+class VariantMatrixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        category = Category.objects.create(name="Футболки", slug="futbolki")
+        size = ProductAttribute.objects.create(code="size", name="Размер")
+        color = ProductAttribute.objects.create(code="color", name="Цвет")
+        self.product = Product.objects.create(category=category, name="Футболка", slug="futbolka", article="F1")
+        self.variants = {}
+        for sku, size_value, color_value, stock, is_default in (
+            ("F1-M-blue", "M", "синий", 0, True),
+            ("F1-L-red", "L", "красный", 5, False),
+            ("F1-L-blue", "L", "синий", 2, False),
+        ):
+            variant = ProductVariant.objects.create(
+                product=self.product, sku=sku, price=1000, stock=stock, is_default=is_default,
+            )
+            variant.attribute_values.add(
+                ProductAttributeValue.objects.get_or_create(attribute=size, value=size_value)[0],
+                ProductAttributeValue.objects.get_or_create(attribute=color, value=color_value)[0],
+            )
+            self.variants[sku] = variant
+        self.product.refresh_from_db()
+
+    def values(self, matrix, name):
+        attr = next(a for a in matrix["by_attr"] if a["name"] == name)
+        return {v["value"]: (v["has_stock"], v["is_default"]) for v in attr["values"]}
+
+    def test_contents(self):
+        matrix = variant_matrix.build_matrix(self.product)
+        pks = [self.variants[sku].pk for sku in ("F1-M-blue", "F1-L-red", "F1-L-blue")]
+        self.assertEqual([v.pk for v in matrix["variants"]], pks)
+        self.assertEqual([v.label for v in matrix["variants"]], ["M, синий", "L, красный", "L, синий"])
+        self.assertTrue(str(matrix["variants"][0]).startswith("Футболка — "))
+        # Вариант по умолчанию распродан — выбран первый в наличии
+        self.assertEqual((matrix["default_id"], matrix["default_label"]), (pks[1], "L, красный"))
+        self.assertEqual(self.values(matrix, "Размер"), {"M": (False, False), "L": (True, True)})
+        self.assertEqual(self.values(matrix, "Цвет"), {"синий": (True, False), "красный": (True, True)})
+
+        variant_matrix.apply_matrix(self.product, matrix)
+        self.assertEqual(self.product.default_variant.pk, pks[1])
+        self.assertEqual(len(self.product.variants_list), 3)
+
+    def test_cached_matrix_is_reused(self):
+        matrix = variant_matrix.get_matrix(self.product)
+        with self.assertNumQueries(0):
+            cached = variant_matrix.get_matrix(self.product)
+        self.assertEqual([(v.pk, v.stock) for v in cached["variants"]], [(v.pk, v.stock) for v in matrix["variants"]])
+
+        with self.settings(CATALOG_VARIANT_MATRIX_TTL=0), self.assertNumQueries(3):
+            variant_matrix.get_matrix(self.product)
+
+    def test_variant_change_invalidates_matrix(self):
+        variant_matrix.get_matrix(self.product)
+        variant = self.variants["F1-M-blue"]
+        variant.stock = 3
+        variant.save()
+        self.product.refresh_from_db()
+        with self.assertNumQueries(3):
+            matrix = variant_matrix.get_matrix(self.product)
+        self.assertEqual(matrix["default_id"], variant.pk)
+
+        # Новые характеристики варианта — тоже новый updated_at
+        variant.attribute_values.remove(*variant.attribute_values.filter(attribute__code="color"))
+        self.product.refresh_from_db()
+        matrix = variant_matrix.get_matrix(self.product)
+        self.assertEqual(matrix["variants"][0].label, "M")
+
+
+class ListingTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Футболки", slug="futbolki")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(category=self.category, name="Футболка", slug="futbolka", article="F1")
+            self.default = ProductVariant.objects.create(product=self.product, sku="F1-M", price=500, stock=0, is_default=True)
+            ProductVariant.objects.create(product=self.product, sku="F1-L", price=300, stock=0)
+        facets.invalidate()
+        self.addCleanup(facets.invalidate)
+
+    def row(self):
+        return ProductListing.objects.get(product=self.product)
+
+    def test_initial_row(self):
+        row = self.row()
+        self.assertEqual((row.name, row.slug, row.root_category_slug), ("Футболка", "futbolka", "futbolki"))
+        self.assertEqual((row.default_variant_id, row.price, row.min_price), (self.default.pk, 500, 300))
+        self.assertEqual((row.variants_count, row.in_stock, row.is_active), (2, False, True))
+
+    def test_variant_added_and_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = ProductVariant.objects.create(product=self.product, sku="F1-XL", price=200, stock=1)
+        row = self.row()
+        self.assertEqual((row.variants_count, row.min_price, row.in_stock), (3, 200, True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.delete()
+        row = self.row()
+        self.assertEqual((row.variants_count, row.min_price, row.in_stock), (2, 300, False))
+
+    def test_stock_and_price_change_after_commit(self):
+        self.default.price = 700
+        self.default.stock = 4
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.default.save()
+            # До коммита витрина не меняется
+            self.assertEqual((self.row().price, self.row().in_stock), (500, False))
+        for callback in callbacks:
+            callback()
+        row = self.row()
+        self.assertEqual((row.price, row.min_price, row.in_stock), (700, 300, True))
+
+    def test_deactivation(self):
+        self.product.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertFalse(self.row().is_active)
+        index = facets.get_index()
+        self.assertEqual(index.pks_for(index.search(facets.parse_selection(QueryDict()))["bitmap"]), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertFalse(ProductListing.objects.exists())
+
+
+class DeployDumpTests(TestCase):
+    def setUp(self):
+        seed_catalog(3)
+        brand = Brand.objects.create(name="Nike", slug="nike")
+        Product.objects.filter(slug="tovar-0").update(brand=brand)
+        CategoryAttribute.objects.create(
+            category=Category.objects.get(slug="futbolki"), attribute=ProductAttribute.objects.get(code="size"),
+        )
+        City.objects.bulk_create(City(name=name) for name in ("Москва", "Новосибирск"))
+        User = get_user_model()
+        first = User.objects.create_user(email="first@example.com", password="x")
+        second = User.objects.create_user(email="second@example.com", password="x", referred_by=first)
+        # Ссылка на пользователя с большим pk: при загрузке по порядку pk он ещё не создан
+        User.objects.filter(pk=first.pk).update(referred_by=second)
+        UserAddress.objects.create(user=second, city="Москва", address="ул. Ленина, 1")
+        Product.objects.update(
+            created_at="2020-01-02T03:04:05.123456+00:00", updated_at="2021-02-03T04:05:06.654321+00:00",
+        )
+        UserSyncQueue.objects.all().delete()
+        self.models = [apps.get_model(label) for label in deploy_dump.DEPLOY_DATA_MODELS]
+
+    def state(self):
+        return {
+            "counts": {model._meta.label: model._base_manager.count() for model in self.models},
+            "categories": list(
+                Category.objects.order_by("pk").values_list("pk", "parent_id", "tree_id", "lft", "rght", "level")
+            ),
+            "users": list(
+                get_user_model().objects.order_by("pk").values_list("pk", "email", "password", "referred_by_id")
+            ),
+            "products": list(Product.objects.order_by("pk").values_list("pk", "created_at", "updated_at")),
+        }
+
+    def test_round_trip(self):
+        expected = self.state()
+        self.assertTrue(all(expected["counts"].values()), expected["counts"])
+        with tempfile.TemporaryDirectory() as out_dir:
+            call_command("dump_deploy_data", "-o", out_dir, "--compress", "--chunk-size", "2", stdout=StringIO())
+            for model in reversed(self.models):
+                model._base_manager.all().delete()
+            UserSyncQueue.objects.all().delete()
+            self.assertFalse(any(self.state()["counts"].values()))
+
+            call_command("load_deploy_data", out_dir, "--chunk-size", "2", stdout=StringIO())
+        self.assertEqual(self.state(), expected)
+        self.assertFalse(UserSyncQueue.objects.exists())
+        self.assertEqual(ProductListing.objects.count(), Product.objects.count())
+
+        # Последовательности pk сдвинуты за загруженные строки
+        max_city = max(City.objects.values_list("pk", flat=True))
+        self.assertGreater(City.objects.create(name="Омск").pk, max_city)
+        max_user = max(get_user_model().objects.values_list("pk", flat=True))
+        self.assertGreater(get_user_model().objects.create_user(email="new@example.com").pk, max_user)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, THUMBNAILS_ENABLED=True, THUMBNAIL_FORMAT="webp")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        thumbnails._known.clear()
+        self.addCleanup(thumbnails._known.clear)
+
+        self.storage = ProductMedia._meta.get_field("file").storage
+        image = BytesIO()
+        Image.new("RGB", (1000, 500), "red").save(image, "JPEG")
+        self.photo = self.storage.save("products/photo.jpg", ContentFile(image.getvalue()))
+        self.broken = self.storage.save("products/broken.jpg", ContentFile(b"not an image"))
+        self.video = self.storage.save("products/clip.mp4", ContentFile(b"\x00\x00\x00\x18ftypmp42"))
+        product = seed_catalog(1)[0]
+        ProductMedia.objects.bulk_create([
+            ProductMedia(product=product, file=self.photo),
+            ProductMedia(product=product, file=self.broken),
+            ProductMedia(product=product, file=self.video, media_type=ProductMedia.MediaType.VIDEO),
+        ])
+
+    def thumb(self, name, rendition="card", width=320):
+        return self.client.get(reverse("catalog:thumbnail", args=[rendition, width, name]))
+
+    def test_thumb_name_is_stable(self):
+        name = thumbnails.thumb_name(self.photo, 320)
+        self.assertRegex(name, r"^thumbs/products/photo\.320w\.[0-9a-f]{8}\.webp$")
+        self.assertEqual(thumbnails.thumb_name(self.photo, 320), name)
+        self.assertNotEqual(thumbnails.thumb_name(self.photo, 640), name)
+        with self.settings(THUMBNAIL_QUALITY=60):
+            self.assertNotEqual(thumbnails.thumb_name(self.photo, 320), name)
+        with self.settings(THUMBNAIL_FORMAT="jpeg"):
+            self.assertRegex(thumbnails.thumb_name(self.photo, 320), r"\.320w\.[0-9a-f]{8}\.jpg$")
+
+    def test_srcset(self):
+        view_url = reverse("catalog:thumbnail", args=["card", 320, self.photo])
+        self.assertEqual(
+            thumbnails.srcset(self.photo, "card"),
+            f"{view_url} 320w, {reverse('catalog:thumbnail', args=['card', 640, self.photo])} 640w",
+        )
+        thumbnails.generate(self.photo, [320, 640])
+        self.assertEqual(
+            thumbnails.srcset(self.photo, "card"),
+            f"/media/{thumbnails.thumb_name(self.photo, 320)} 320w, /media/{thumbnails.thumb_name(self.photo, 640)} 640w",
+        )
+        self.assertEqual(thumbnails.srcset(self.photo, "huge"), "")
+        with self.settings(THUMBNAILS_ENABLED=False):
+            self.assertEqual(thumbnails.srcset(self.photo, "card"), "")
+            self.assertEqual(thumbnails.thumbnail_url(self.photo, "card"), f"/media/{self.photo}")
+
+    def test_view_creates_thumbnail(self):
+        response = self.thumb(self.photo)
+        self.assertRedirects(response, f"/media/{thumbnails.thumb_name(self.photo, 320)}", fetch_redirect_response=False)
+        self.assertIn("public", response["Cache-Control"])
+        with self.storage.open(thumbnails.thumb_name(self.photo, 320)) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+
+    def test_view_not_found(self):
+        self.assertEqual(self.thumb(self.photo, rendition="huge").status_code, 404)
+        self.assertEqual(self.thumb(self.photo, width=321).status_code, 404)
+        self.assertEqual(self.thumb("products/missing.jpg").status_code, 404)
+
+    def test_undecodable_file_falls_back_to_original(self):
+        with self.assertLogs("catalog.thumbnails", "WARNING"):
+            response = self.thumb(self.broken)
+        self.assertRedirects(response, f"/media/{self.broken}", fetch_redirect_response=False)
+        self.assertFalse(response.has_header("Cache-Control"))
+
+        # Неудача запомнена: файл не декодируется на каждый запрос
+        with mock.patch.object(thumbnails, "generate") as generate:
+            response = self.thumb(self.broken, width=640)
+            self.assertRedirects(response, f"/media/{self.broken}", fetch_redirect_response=False)
+            response = self.thumb(self.video)
+            self.assertRedirects(response, f"/media/{self.video}", fetch_redirect_response=False)
+        generate.assert_not_called()
@@ -0,0 +1,219 @@
+"""
+Уменьшенные копии фото товаров (карточка, корзина, страница товара, зум).
+
+Для каждого исполнения (RENDITIONS) — несколько ширин для srcset. Имя файла детерминировано:
+thumbs/<путь оригинала без расширения>.<ширина>w.<хэш параметров>.<webp|jpg> — смена качества
+или формата даёт новые имена, старые кэши браузера и nginx не мешают.
+
+Копия создаётся после загрузки фото (сигнал), командой generate_thumbnails (пул процессов)
+или при первом запросе: пока файла нет, thumbnail_url ведёт на вью catalog:thumbnail, которая
+создаёт копию и перенаправляет на неё (редирект кэшируется на срок кэша карточек). Если Pillow
+не установлен или файл не открывается как изображение — отдаётся оригинал; неудача запоминается
+в кэше Django на THUMBNAIL_RETRY_AFTER секунд, чтобы вью не декодировала файл на каждый запрос.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+from io import BytesIO
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+# Исполнение → ширины, px (первая — для src, все — для srcset)
+RENDITIONS = {
+    "cart": (96, 192),
+    "card": (320, 640),
+    "detail": (720, 1080, 1440),
+    "zoom": (1600, 2400),
+}
+THUMBS_DIR = "thumbs"
+_VERSION = 1  # менять при изменении алгоритма ресайза
+_DEFAULT_RETRY_AFTER = 3600  # сек.
+
+_known: set[str] = set()
+_known_lock = threading.Lock()
+_pillow: Optional[bool] = None
+
+
+def _storage():
+    from .models import ProductMedia
+
+    return ProductMedia._meta.get_field("file").storage
+
+
+def _format() -> str:
+    return "jpeg" if str(getattr(settings, "THUMBNAIL_FORMAT", "webp")).lower() in ("jpeg", "jpg") else "webp"
+
+
+def _quality() -> int:
+    return int(getattr(settings, "THUMBNAIL_QUALITY", 80))
+
+
+def enabled() -> bool:
+    """Копии включены (THUMBNAILS_ENABLED) и Pillow установлен."""
+    global _pillow
+    if _pillow is None:
+        _pillow = importlib.util.find_spec("PIL") is not None
+        if not _pillow:
+            logger.warning("Thumbnails: Pillow не установлен, отдаются оригиналы фото")
+    return _pillow and getattr(settings, "THUMBNAILS_ENABLED", True)
+
+
+def is_valid(rendition: str, width: int) -> bool:
+    return width in RENDITIONS.get(rendition, ())
+
+
+def thumb_name(name: str, width: int) -> str:
+    """Путь копии в хранилище медиа для оригинала name и ширины width."""
+    fmt, quality = _format(), _quality()
+    digest = hashlib.md5(f"{name}|{width}|{fmt}|{quality}|{_VERSION}".encode()).hexdigest()[:8]
+    stem = os.path.splitext(name)[0]
+    return f"{THUMBS_DIR}/{stem}.{width}w.{digest}.{'jpg' if fmt == 'jpeg' else 'webp'}"
+
+
+def render(data: bytes, width: int) -> bytes:
+    """Уменьшить изображение до ширины width (без увеличения), вернуть байты в THUMBNAIL_FORMAT."""
+    from PIL import Image, ImageOps
+
+    fmt = _format()
+    with Image.open(BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, width * 3), Image.Resampling.LANCZOS)
+        if fmt == "jpeg" or img.mode not in ("RGB", "RGBA"):
+            has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+            img = img.convert("RGBA" if has_alpha and fmt == "webp" else "RGB")
+        out = BytesIO()
+        if fmt == "jpeg":
+            img.save(out, "JPEG", quality=_quality(), optimize=True, progressive=True)
+        else:
+            img.save(out, "WEBP", quality=_quality(), method=4)
+    return out.getvalue()
+
+
+def generate(name: str, widths: Optional[Iterable[int]] = None, force: bool = False) -> list[str]:
+    """
+    Создать копии оригинала name (по умолчанию — все ширины всех исполнений).
+    Возвращает пути созданных файлов; уже существующие пропускаются.
+    """
+    storage = _storage()
+    if widths is None:
+        widths = sorted({w for ws in RENDITIONS.values() for w in ws})
+    todo = [(w, thumb_name(name, w)) for w in widths]
+    if not force:
+        todo = [(w, t) for w, t in todo if not storage.exists(t)]
+    if not todo:
+        return []
+    with storage.open(name, "rb") as f:
+        data = f.read()
+    created = []
+    for width, target in todo:
+        content = render(data, width)
+        if force and storage.exists(target):
+            storage.delete(target)
+        saved = storage.save(target, ContentFile(content))
+        if saved != target:
+            # Параллельно создал другой процесс — оставляем его файл
+            storage.delete(saved)
+        created.append(target)
+        with _known_lock:
+            _known.add(target)
+    return created
+
+
+def _failed_key(name: str) -> str:
+    return f"thumb_failed:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def failed(name: str) -> bool:
+    """Копии name недавно не удалось создать (см. generate_safe) — повторять не нужно."""
+    return cache.get(_failed_key(name)) is not None
+
+
+def generate_safe(name: str, widths: Optional[Iterable[int]] = None, force: bool = False) -> list[str]:
+    """generate() без исключений (сигналы, вью, пул процессов): ошибки в лог, файл — в failed()."""
+    try:
+        return generate(name, widths, force)
+    except Exception:
+        logger.warning("Thumbnails: не удалось создать копии %s", name, exc_info=True)
+        retry_after = int(getattr(settings, "THUMBNAIL_RETRY_AFTER", _DEFAULT_RETRY_AFTER))
+        if retry_after > 0:
+            cache.set(_failed_key(name), 1, retry_after)
+        return []
+
+
+def exists(name: str, width: int) -> bool:
+    target = thumb_name(name, width)
+    if target in _known:
+        return True
+    if _storage().exists(target):
+        with _known_lock:
+            _known.add(target)
+        return True
+    return False
+
+
+def thumbnail_url(name: str, rendition: str, width: Optional[int] = None) -> str:
+    """URL копии; пока копии нет — URL вью, которая создаст её при первом запросе."""
+    if not name:
+        return ""
+    widths = RENDITIONS.get(rendition)
+    if not widths or not enabled():
+        return _storage().url(name)
+    width = width or widths[0]
+    if exists(name, width):
+        return _storage().url(thumb_name(name, width))
+    return reverse("catalog:thumbnail", args=[rendition, width, name])
+
+
+def srcset(name: str, rendition: str) -> str:
+    """Значение srcset: «url 320w, url 640w»."""
+    if not name or rendition not in RENDITIONS or not enabled():
+        return ""
+    return ", ".join(f"{thumbnail_url(name, rendition, w)} {w}w" for w in RENDITIONS[rendition])
+
+
+def delete(name: str) -> None:
+    """Удалить все копии оригинала name (при удалении фото)."""
+    storage = _storage()
+    for width in sorted({w for ws in RENDITIONS.values() for w in ws}):
+        target = thumb_name(name, width)
+        with _known_lock:
+            _known.discard(target)
+        if storage.exists(target):
+            storage.delete(target)
+
+
+def _pool_init():
+    import django
+
+    django.setup()
+
+
+def generate_many(names: Iterable[str], workers: int = 0, force: bool = False):
+    """
+    Создать копии для многих оригиналов в пуле процессов (Pillow упирается в CPU).
+    Отдаёт (name, число созданных файлов) по мере готовности.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    from django.db import connections
+
+    names = list(names)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for name in names:
+            yield name, len(generate_safe(name, force=force))
+        return
+    # Соединения с БД не должны наследоваться дочерними процессами
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_pool_init) as pool:
+        for name, created in zip(names, pool.map(partial(generate_safe, force=force), names, chunksize=8)):
+            yield name, len(created)
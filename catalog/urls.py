@@ -19,4 +19,5 @@ urlpatterns = [
     path("favorites/", views.favorites_view, name="favorites"),
     path("favorites/toggle/<int:product_id>/", views.favorites_toggle, name="favorites_toggle"),
     path("policy/", views.policy_view, name="policy"),
+    path("thumb/<slug:rendition>/<int:width>/<path:name>", views.product_thumbnail, name="thumbnail"),
 ]
@@ -0,0 +1,124 @@
+"""
+Матрица вариантов товара для страницы товара и быстрого просмотра.
+
+Считается один раз на товар (три запроса: варианты, значения характеристик и атрибуты) и хранится в кэше Django
+по ключу (товар, updated_at). Изменение варианта, его остатка или характеристик обновляет
+Product.updated_at (catalog.signals), поэтому устаревшая матрица больше не читается.
+В матрице только данные товара; корзина посетителя добавляется в представлении.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ProductVariant
+
+_DEFAULT_TTL = 3600  # сек.
+
+
+class VariantOption:
+    """Вариант для шаблона: поля ProductVariant, нужные странице, и готовые подписи."""
+
+    __slots__ = ("pk", "price", "pv", "stock", "label", "title")
+
+    def __init__(self, pk, price, pv, stock, label, title):
+        self.pk = pk
+        self.price = price
+        self.pv = pv
+        self.stock = stock
+        self.label = label  # «M, Розовый» — значения характеристик по имени атрибута
+        self.title = title  # как ProductVariant.__str__
+
+    def __str__(self):
+        return self.title
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "CATALOG_VARIANT_MATRIX_TTL", _DEFAULT_TTL))
+
+
+def _cache_key(product) -> str:
+    version = product.updated_at.timestamp() if product.updated_at else 0
+    return f"variant_matrix:{product.pk}:{version}"
+
+
+def build_matrix(product) -> dict:
+    """
+    Матрица вариантов:
+    variants — VariantOption по возрастанию pk; default_id — вариант по умолчанию (в наличии, если есть);
+    by_attr — [{"name", "values": [{"value", "variant_ids", "is_default", "has_stock"}]}] для выбора
+    характеристик; default_label — подпись варианта по умолчанию.
+    """
+    rows = list(
+        ProductVariant.objects.filter(product_id=product.pk)
+        .prefetch_related("attribute_values__attribute")
+        .order_by("pk")
+    )
+    variants = []
+    attrs = {}
+    for v in rows:
+        values = list(v.attribute_values.all())
+        for av in values:
+            attrs.setdefault(av.attribute.name, {}).setdefault(av.value, []).append(v.pk)
+        by_name = sorted(values, key=lambda av: av.attribute.name)
+        label = ", ".join(av.value for av in by_name)
+        title = product.name
+        if values:
+            title += " — " + ", ".join(f"{av.attribute.name}: {av.value}" for av in values)
+        variants.append(VariantOption(v.pk, v.price, v.pv, v.stock, label, title))
+
+    defaults = {v.pk for v in rows if v.is_default}
+    def_v = next((v for v in variants if v.pk in defaults), variants[0] if variants else None)
+    if def_v and def_v.stock < 1:
+        def_v = next((v for v in variants if v.stock > 0), def_v)
+
+    variant_stock = {v.pk: v.stock for v in variants}
+    def_values = {}
+    if def_v:
+        for av in next(v for v in rows if v.pk == def_v.pk).attribute_values.all():
+            def_values.setdefault(av.attribute.name, av.value)
+    by_attr = []
+    for name, vals in attrs.items():
+        def_val = def_values.get(name)
+        fallback_default = next(
+            (val for val, ids in vals.items() if any(variant_stock.get(i, 0) > 0 for i in ids)),
+            def_val,
+        )
+        if def_val not in vals or not any(variant_stock.get(i, 0) > 0 for i in vals.get(def_val, [])):
+            def_val = fallback_default
+        out_vals = []
+        for val, ids in vals.items():
+            has_stock = any(variant_stock.get(i, 0) > 0 for i in ids)
+            out_vals.append({
+                "value": val,
+                "variant_ids": ",".join(str(i) for i in ids),
+                "is_default": def_val == val and has_stock,
+                "has_stock": has_stock,
+            })
+        by_attr.append({"name": name, "values": out_vals})
+
+    return {
+        "variants": variants,
+        "default_id": def_v.pk if def_v else None,
+        "default_label": (def_v.label or def_v.title) if def_v else "",
+        "by_attr": by_attr,
+    }
+
+
+def get_matrix(product) -> dict:
+    """Матрица вариантов из кэша или build_matrix(); product — объект Product с актуальным updated_at."""
+    ttl = _ttl()
+    if ttl <= 0:
+        return build_matrix(product)
+    key = _cache_key(product)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_matrix(product)
+        cache.set(key, matrix, ttl)
+    return matrix
+
+
+def apply_matrix(product, matrix: dict) -> None:
+    """Проставляет товару variants_list, default_variant, variants_by_attr, default_variant_label."""
+    product.variants_list = matrix["variants"]
+    product.default_variant = next((v for v in matrix["variants"] if v.pk == matrix["default_id"]), None)
+    product.variants_by_attr = matrix["by_attr"]
+    product.default_variant_label = matrix["default_label"]
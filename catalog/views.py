@@ -1,45 +1,66 @@
 import uuid
 from decimal import Decimal
 
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
 
-from .models import Category, Product, ProductVariant
+from .models import Category, Product, ProductListing, ProductMedia, ProductVariant
 from .cart_storage import get_cart, set_cart
 from . import cart_logic as cl
+from . import category_tree, facets, thumbnails
+from .variant_matrix import apply_matrix, get_matrix
 from .cart_log import log
+from orders.http_cache import api_cache
 
 
-def _cart_build_item(cart_key, item):
+def _cart_products(cart):
     """
-    По ключу и item {p, v, q} строит данные для шаблона.
+    Товары корзины одним набором запросов (не на каждую строку): варианты с характеристиками
+    и фото. Возвращает {product_id: Product}; неактивные и удалённые товары отсутствуют.
+    """
+    from django.db.models import Prefetch
+
+    ids = {item.get("p") for item in cart.values() if item.get("p")}
+    if not ids:
+        return {}
+    products = Product.objects.filter(pk__in=ids, is_active=True).prefetch_related(
+        Prefetch(
+            "variants",
+            queryset=ProductVariant.objects.order_by("pk").prefetch_related("attribute_values__attribute"),
+        ),
+        Prefetch("media", queryset=ProductMedia.objects.filter(media_type="image"), to_attr="cart_images"),
+    )
+    return {p.pk: p for p in products}
+
+
+def _cart_build_item(cart_key, item, products):
+    """
+    По ключу и item {p, v, q} строит данные для шаблона; products — результат _cart_products().
     Возвращает dict или None.
     """
     product_id = item.get("p")
     variant_id = item.get("v")
     qty = max(1, int(item.get("q", 1)))
-    if not product_id:
+    product = products.get(product_id) if product_id else None
+    if product is None:
         return None
-    try:
-        product = Product.objects.prefetch_related(
-            "variants", "media", "variants__attribute_values__attribute"
-        ).get(pk=product_id, is_active=True)
-    except Product.DoesNotExist:
-        return None
-    variants = list(product.variants.prefetch_related("attribute_values__attribute").all())
+    variants = list(product.variants.all())
     has_variants = len(variants) > 1
 
     if variant_id is None:
-        variant = product.variants.first()
+        variant = variants[0] if variants else None
     else:
         try:
-            variant = ProductVariant.objects.select_related("product").prefetch_related(
-                "product__media", "attribute_values__attribute"
-            ).get(pk=variant_id, product=product)
-        except (ProductVariant.DoesNotExist, ValueError):
+            variant_id = int(variant_id)
+        except (TypeError, ValueError):
+            return None
+        variant = next((v for v in variants if v.pk == variant_id), None)
+        if variant is None:
             return None
     if not variant or variant.stock < qty:
         return None
@@ -47,9 +68,9 @@ def _cart_build_item(cart_key, item):
     line_total = variant.price * qty
     pv = getattr(variant, "pv", Decimal("0")) or Decimal("0")
     line_pv = pv * qty
-    img = product.media.filter(media_type="image").first()
+    img = product.cart_images[0] if product.cart_images else None
     variants_flat = [
-        {"pk": v.pk, "label": ", ".join(f"{av.attribute.name}: {av.value}" for av in v.attribute_values.select_related("attribute").all())}
+        {"pk": v.pk, "label": ", ".join(f"{av.attribute.name}: {av.value}" for av in v.attribute_values.all())}
         for v in variants if v.stock > 0
     ]
 
@@ -85,6 +106,26 @@ def _variant_cart_qty(cart, product_id, variant_id):
     return n
 
 
+def _listing():
+    """Карточки товаров из витрины ProductListing (одна таблица, без JOIN)."""
+    return ProductListing.objects.filter(is_active=True).exclude(slug="")
+
+
+def _card_state(cart, favorites_ids, *product_lists):
+    """Корзина и избранное посетителя для карточек на странице (JSON для _card_state.html)."""
+    ids = {p.pk for products in product_lists for p in products}
+    cart_qty = {}
+    for pid in ids:
+        qty = _product_cart_qty(cart, pid)
+        if qty > 0:
+            cart_qty[str(pid)] = qty
+    return {"cart": cart_qty, "favorites": sorted(pid for pid in ids if pid in favorites_ids)}
+
+
+def _card_cache_ttl():
+    return getattr(settings, "CATALOG_CARD_CACHE_TTL", 3600)
+
+
 def product_list(request, category_slug=None):
     from django.db.models import Count, Subquery, OuterRef
     from django.http import HttpResponseRedirect
@@ -94,9 +135,7 @@ def product_list(request, category_slug=None):
     if not q and "q" in request.GET:
         return HttpResponseRedirect(reverse("catalog:product_list"))
 
-    products = Product.objects.filter(
-        is_active=True
-    ).exclude(slug__isnull=True).exclude(slug="").select_related("category", "brand")
+    products = _listing()
 
     product_count_subq = Product.objects.filter(
         is_active=True,
@@ -118,38 +157,43 @@ def product_list(request, category_slug=None):
         products = products.filter(is_new=True)
     if category_slug:
         cat = get_object_or_404(Category, slug=category_slug, is_active=True)
+        products = products.filter(category_tree.subtree_q(cat))
     else:
         cat = None
 
-    new_count = Product.objects.filter(is_active=True, is_new=True).exclude(slug__isnull=True).exclude(slug="").count() if not q else 0
-    products = products.prefetch_related("variants", "media")
+    new_count = _listing().filter(is_new=True).count() if not q else 0
+
+    # Фасеты: количества и фильтр по битовым картам индекса, из БД — только карточки результата
+    facet_index = facets.get_index()
+    selection = facets.parse_selection(request.GET)
+    base = None
+    attribute_ids = None
+    if q:
+        base = facet_index.bitmap_for_pks(products.values_list("pk", flat=True))
+    else:
+        if filter_new:
+            base = facet_index.is_new
+        if cat is not None:
+            in_cat = facet_index.category_bitmap(category_tree.descendant_ids(cat))
+            base = in_cat if base is None else base & in_cat
+    if cat is not None:
+        attribute_ids = cat.get_attribute_ids_with_parents() or None
+    facet_result = facet_index.search(selection, base=base, attribute_ids=attribute_ids)
+    if facets.is_active(selection):
+        pks = facet_index.pks_for(facet_result["bitmap"])
+        by_pk = {p.pk: p for p in _listing().filter(pk__in=pks)}
+        products = [by_pk[pk] for pk in pks if pk in by_pk]
+    else:
+        products = list(products)
     cart = get_cart(request)
     favorites_ids = set(_get_favorites(request))
-    for p in products:
-        p.root_category_slug = p.category.get_root().slug if p.category else ""
-        p.default_variant = p.variants.filter(is_default=True).first() or p.variants.first()
-        p.main_image = p.media.filter(media_type="image").first()
-        p.variants_list = list(p.variants.all())
-        p.cart_qty = _product_cart_qty(cart, p.pk)
-        p.is_in_favorites = p.pk in favorites_ids
 
     recent_ids = _get_recent_viewed(request, limit=6)
     recent_products = []
     if recent_ids:
-        recent_products = list(
-            Product.objects.filter(pk__in=recent_ids, is_active=True)
-            .exclude(slug__isnull=True).exclude(slug="")
-            .select_related("category", "brand").prefetch_related("variants", "media")
-        )
+        recent_products = list(_listing().filter(pk__in=recent_ids))
         order_map = {pid: i for i, pid in enumerate(recent_ids)}
         recent_products.sort(key=lambda p: order_map.get(p.pk, 999))
-        for p in recent_products:
-            p.root_category_slug = p.category.get_root().slug if p.category else ""
-            p.default_variant = p.variants.filter(is_default=True).first() or p.variants.first()
-            p.main_image = p.media.filter(media_type="image").first()
-            p.variants_list = list(p.variants.all())
-            p.cart_qty = _product_cart_qty(cart, p.pk)
-            p.is_in_favorites = p.pk in favorites_ids
 
     return render(request, "catalog/product_list.html", {
         "products": products,
@@ -158,103 +202,46 @@ def product_list(request, category_slug=None):
         "recent_products": recent_products,
         "filter_new": filter_new,
         "new_count": new_count,
+        "facets": facet_result,
+        "facet_selection": selection,
+        "facets_active": facets.is_active(selection),
+        "card_state": _card_state(cart, favorites_ids, products, recent_products),
+        "card_cache_ttl": _card_cache_ttl(),
     })
 
 
 def product_detail(request, slug):
     import json
     product = get_object_or_404(Product, slug=slug, is_active=True)
-    variants = list(product.variants.prefetch_related("attribute_values__attribute").all())
-    product.variants_list = variants
-    def_v = product.variants.filter(is_default=True).first() or product.variants.first()
-    if def_v and def_v.stock < 1:
-        def_v = next((v for v in variants if v.stock > 0), def_v)
-    product.default_variant = def_v
+    apply_matrix(product, get_matrix(product))
     product.images_list = product.media.filter(media_type="image").order_by("sort_order")
-
-    variant_stock = {v.pk: v.stock for v in variants}
-    attrs = {}
-    for v in variants:
-        for av in v.attribute_values.all():
-            attr_name = av.attribute.name
-            if attr_name not in attrs:
-                attrs[attr_name] = {}
-            if av.value not in attrs[attr_name]:
-                attrs[attr_name][av.value] = []
-            attrs[attr_name][av.value].append(v.pk)
-    product.variants_by_attr = []
-    for name, vals in attrs.items():
-        def_val = None
-        if def_v:
-            for av in def_v.attribute_values.all():
-                if av.attribute.name == name:
-                    def_val = av.value
-                    break
-        fallback_default = next(
-            (val for val, ids in vals.items() if any(variant_stock.get(i, 0) > 0 for i in ids)),
-            def_val,
-        )
-        if def_val not in vals or not any(variant_stock.get(i, 0) > 0 for i in vals.get(def_val, [])):
-            def_val = fallback_default
-        out_vals = []
-        for val, ids in vals.items():
-            has_stock = any(variant_stock.get(i, 0) > 0 for i in ids)
-            out_vals.append({
-                "value": val,
-                "variant_ids": ",".join(str(i) for i in ids),
-                "is_default": def_val == val and has_stock,
-                "has_stock": has_stock,
-            })
-        product.variants_by_attr.append({"name": name, "values": out_vals})
     cart = get_cart(request)
     product.variants_json = json.dumps({
         str(v.pk): {
             "price": str(v.price),
-            "pv": str(getattr(v, "pv", 0) or 0),
-            "label": ", ".join(av.value for av in v.attribute_values.select_related("attribute").order_by("attribute__name")) or str(v),
+            "pv": str(v.pv or 0),
+            "label": v.label or v.title,
             "cart_qty": _variant_cart_qty(cart, product.pk, v.pk),
         }
-        for v in variants
+        for v in product.variants_list
     })
     def_v = product.default_variant
     product.initial_variant_cart_qty = _variant_cart_qty(cart, product.pk, def_v.pk) if def_v else 0
-    product.default_variant_label = (
-        ", ".join(av.value for av in def_v.attribute_values.select_related("attribute").order_by("attribute__name"))
-        if def_v and def_v.attribute_values.exists() else (str(def_v) if def_v else "")
-    )
     product.is_in_favorites = product.pk in _get_favorites(request)
     _add_recent_viewed(request, product.pk)
     recent_ids = _get_recent_viewed(request, exclude=product.pk, limit=4)
-    recent_products = list(
-        Product.objects.filter(pk__in=recent_ids, is_active=True)
-        .exclude(slug__isnull=True).exclude(slug="")
-        .select_related("category", "brand").prefetch_related("variants", "media")
-    )
+    recent_products = list(_listing().filter(pk__in=recent_ids))
     order_map = {pid: i for i, pid in enumerate(recent_ids)}
     recent_products.sort(key=lambda p: order_map.get(p.pk, 999))
-    for p in recent_products:
-        p.root_category_slug = p.category.get_root().slug if p.category else ""
-        p.default_variant = p.variants.filter(is_default=True).first() or p.variants.first()
-        p.main_image = p.media.filter(media_type="image").first()
-        p.variants_list = list(p.variants.all())
-        p.cart_qty = _product_cart_qty(get_cart(request), p.pk)
-        p.is_in_favorites = p.pk in _get_favorites(request)
     related_products = []
     if product.category_id:
-        rq = Product.objects.filter(category=product.category, is_active=True).exclude(pk=product.pk).exclude(slug__isnull=True).exclude(slug="")
-        related_products = list(rq.select_related("category", "brand").prefetch_related("variants", "media")[:6])
-        rc, rf = get_cart(request), _get_favorites(request)
-        for p in related_products:
-            p.root_category_slug = p.category.get_root().slug if p.category else ""
-            p.default_variant = p.variants.filter(is_default=True).first() or p.variants.first()
-            p.main_image = p.media.filter(media_type="image").first()
-            p.variants_list = list(p.variants.all())
-            p.cart_qty = _product_cart_qty(rc, p.pk)
-            p.is_in_favorites = p.pk in rf
+        related_products = list(_listing().filter(category_id=product.category_id).exclude(pk=product.pk)[:6])
     return render(request, "catalog/product_detail.html", {
         "product": product,
         "recent_products": recent_products,
         "related_products": related_products,
+        "card_state": _card_state(cart, set(_get_favorites(request)), recent_products, related_products),
+        "card_cache_ttl": _card_cache_ttl(),
     })
 
 
@@ -262,49 +249,9 @@ def product_quick_view(request, slug):
     """Возвращает HTML фрагмент для модального окна быстрого просмотра."""
     import json
     product = get_object_or_404(Product, slug=slug, is_active=True)
-    variants = list(product.variants.prefetch_related("attribute_values__attribute").all())
-    product.variants_list = variants
-    def_v = product.variants.filter(is_default=True).first() or product.variants.first()
-    if def_v and def_v.stock < 1:
-        def_v = next((v for v in variants if v.stock > 0), def_v)
-    product.default_variant = def_v
+    apply_matrix(product, get_matrix(product))
     product.images_list = product.media.filter(media_type="image").order_by("sort_order")
-
-    variant_stock = {v.pk: v.stock for v in variants}
-    attrs = {}
-    for v in variants:
-        for av in v.attribute_values.all():
-            attr_name = av.attribute.name
-            if attr_name not in attrs:
-                attrs[attr_name] = {}
-            if av.value not in attrs[attr_name]:
-                attrs[attr_name][av.value] = []
-            attrs[attr_name][av.value].append(v.pk)
-    product.variants_by_attr = []
-    for name, vals in attrs.items():
-        def_val = None
-        if def_v:
-            for av in def_v.attribute_values.all():
-                if av.attribute.name == name:
-                    def_val = av.value
-                    break
-        fallback_default = next(
-            (val for val, ids in vals.items() if any(variant_stock.get(i, 0) > 0 for i in ids)),
-            def_val,
-        )
-        if def_val not in vals or not any(variant_stock.get(i, 0) > 0 for i in vals.get(def_val, [])):
-            def_val = fallback_default
-        out_vals = []
-        for val, ids in vals.items():
-            has_stock = any(variant_stock.get(i, 0) > 0 for i in ids)
-            out_vals.append({
-                "value": val,
-                "variant_ids": ",".join(str(i) for i in ids),
-                "is_default": def_val == val and has_stock,
-                "has_stock": has_stock,
-            })
-        product.variants_by_attr.append({"name": name, "values": out_vals})
-    product.variants_json = json.dumps({str(v.pk): {"price": str(v.price)} for v in variants})
+    product.variants_json = json.dumps({str(v.pk): {"price": str(v.price)} for v in product.variants_list})
     cart = get_cart(request)
     product.cart_qty = _product_cart_qty(cart, product.pk)
     return render(request, "catalog/product_quick_view.html", {"product": product})
@@ -315,8 +262,9 @@ def _cart_items_list(cart):
     items = []
     total = Decimal("0")
     total_pv = Decimal("0")
+    products = _cart_products(cart)
     for key, item in cart.items():
-        data = _cart_build_item(key, item)
+        data = _cart_build_item(key, item, products)
         if data is None:
             continue
         items.append(data)
@@ -325,13 +273,10 @@ def _cart_items_list(cart):
     return items, total, total_pv
 
 
-def _cart_weight_grams(cart):
-    """Суммарный вес корзины в граммах (для калькулятора СДЭК). По умолчанию 500 г на позицию."""
+def _cart_weight_grams(items):
+    """Суммарный вес позиций _cart_items_list() в граммах (для калькулятора СДЭК). По умолчанию 500 г на позицию."""
     total = 0
-    for key, item in cart.items():
-        data = _cart_build_item(key, item)
-        if data is None:
-            continue
+    for data in items:
         v = data["variant"]
         qty = data["qty"]
         w = getattr(v, "weight_g", None)
@@ -590,8 +535,7 @@ def checkout_view(request):
             checkout_delivery_city = default_addr.city or ""
             checkout_delivery_address = default_addr.address or ""
 
-    cart = get_cart(request)
-    cart_weight_grams = _cart_weight_grams(cart)
+    cart_weight_grams = _cart_weight_grams(items)
     return render(request, "catalog/checkout.html", {
         "cart_items": items,
         "total": total,
@@ -670,12 +614,11 @@ def _checkout_post(request, items, total, delivery_methods):
         user_addresses = []
         if request.user.is_authenticated:
             user_addresses = list(request.user.addresses.all())
-        cart = get_cart(request)
         return render(request, "catalog/checkout.html", {
             "cart_items": items,
             "total": total,
             "total_pv": sum((i.get("line_pv") or Decimal("0")) for i in items),
-            "cart_weight_grams": _cart_weight_grams(cart),
+            "cart_weight_grams": _cart_weight_grams(items),
             "delivery_methods": delivery_methods,
             "checkout_name": name,
             "checkout_email": email,
@@ -775,6 +718,29 @@ def policy_view(request):
     return render(request, "catalog/policy.html")
 
 
+def product_thumbnail(request, rendition, width, name):
+    """
+    Первый запрос уменьшенной копии фото: создаёт её и перенаправляет на файл в медиа.
+    Дальше шаблоны ссылаются на файл напрямую (catalog.thumbnails.thumbnail_url), но карточки из кэша
+    фрагментов ещё до CATALOG_CARD_CACHE_TTL ведут сюда — поэтому редирект на готовую копию кэшируется
+    браузером и nginx на тот же срок. Редирект на оригинал (копии нет) не кэшируется.
+    Видео и файлы, которые недавно не удалось уменьшить (thumbnails.failed), не декодируются снова.
+    """
+    media_type = ProductMedia.objects.filter(file=name).values_list("media_type", flat=True).first()
+    if not thumbnails.is_valid(rendition, width) or media_type is None:
+        raise Http404
+    storage = ProductMedia._meta.get_field("file").storage
+    if media_type != ProductMedia.MediaType.IMAGE:
+        return redirect(storage.url(name))
+    if thumbnails.enabled() and not thumbnails.exists(name, width) and not thumbnails.failed(name):
+        thumbnails.generate_safe(name, [width])
+    if thumbnails.enabled() and thumbnails.exists(name, width):
+        response = redirect(storage.url(thumbnails.thumb_name(name, width)))
+        patch_cache_control(response, public=True, max_age=max(0, _card_cache_ttl()))
+        return response
+    return redirect(storage.url(name))
+
+
 def _get_favorites(request):
     """Получить список ID товаров в избранном."""
     ids = request.session.get("favorites", [])
@@ -817,18 +783,11 @@ def _add_recent_viewed(request, product_id):
 def favorites_view(request):
     """Страница избранного."""
     ids = _get_favorites(request)
-    products = Product.objects.filter(
-        pk__in=ids, is_active=True
-    ).exclude(slug__isnull=True).exclude(slug="").select_related("category", "brand").prefetch_related("variants", "media")
-    products = list(products)
+    products = list(_listing().filter(pk__in=ids))
     order = {pid: i for i, pid in enumerate(ids)}
     products.sort(key=lambda p: order.get(p.pk, 999))
     cart = get_cart(request)
     for p in products:
-        p.root_category_slug = p.category.get_root().slug if p.category else ""
-        p.default_variant = p.variants.filter(is_default=True).first() or p.variants.first()
-        p.main_image = p.media.filter(media_type="image").first()
-        p.variants_list = list(p.variants.all())
         p.cart_qty = _product_cart_qty(cart, p.pk)
         p.is_in_favorites = True
     return render(request, "catalog/favorites.html", {"products": products})
@@ -860,15 +819,10 @@ def favorites_toggle(request, product_id):
     next_url = request.GET.get("next") or request.META.get("HTTP_REFERER") or reverse("catalog:product_list")
     return redirect(next_url)
 
+@api_cache("cities")
 def cities_autocomplete(request):
     """Подсказки городов для поля «Город» на чекауте. GET ?q=мо → JSON список названий."""
-    from orders.models import City
+    from orders.city_suggest import suggest_cities
 
-    q = (request.GET.get("q") or "").strip()[:80]
-    if not q:
-        return JsonResponse([], safe=False)
-    cities = list(
-        City.objects.filter(name__icontains=q).values_list("name", flat=True).order_by("name")[:20]
-    )
-    return JsonResponse(cities, safe=False)
+    return JsonResponse(suggest_cities(request.GET.get("q") or ""), safe=False)
 
@@ -0,0 +1,71 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from unfold.admin import ModelAdmin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ("id", "title", "status", "progress_display", "created_by", "created_at", "finished_at", "download_link")
+    list_filter = ("status", "kind")
+    ordering = ("-created_at",)
+    date_hierarchy = "created_at"
+    readonly_fields = (
+        "title", "kind", "params", "status", "progress_display", "download_link", "created_by",
+        "created_at", "started_at", "finished_at", "worker", "error_message",
+    )
+    fields = readonly_fields
+    change_form_template = "admin/jobs/job/change_form.html"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        # Страница задачи — только просмотр прогресса и скачивание
+        return False
+
+    @admin.display(description="Прогресс")
+    def progress_display(self, obj):
+        if obj.total:
+            return f"{obj.progress}% ({obj.processed} из {obj.total})"
+        return f"{obj.progress}%"
+
+    @admin.display(description="Файл")
+    def download_link(self, obj):
+        if obj.status != Job.Status.DONE or not obj.file:
+            return "—"
+        url = reverse("admin:jobs_job_download", args=[obj.pk])
+        return format_html('<a href="{}" class="text-primary-600">Скачать</a>', url)
+
+    def get_urls(self):
+        urls = super().get_urls()
+        extra = [
+            path("<int:pk>/status/", self.admin_site.admin_view(self.status_view), name="jobs_job_status"),
+            path("<int:pk>/download/", self.admin_site.admin_view(self.download_view), name="jobs_job_download"),
+        ]
+        return extra + urls
+
+    def status_view(self, request, pk):
+        """JSON для опроса страницы задачи, пока она выполняется."""
+        job = get_object_or_404(Job, pk=pk)
+        return JsonResponse({
+            "status": job.status,
+            "status_display": job.get_status_display(),
+            "progress": job.progress,
+            "processed": job.processed,
+            "total": job.total,
+            "finished": job.is_finished,
+        })
+
+    def download_view(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        if not self.has_view_permission(request, job):
+            raise Http404
+        if job.status != Job.Status.DONE or not job.file:
+            raise Http404("Файл ещё не готов")
+        filename = job.file.name.rsplit("/", 1)[-1]
+        return FileResponse(job.file.open("rb"), as_attachment=True, filename=filename)
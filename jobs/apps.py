@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    name = "jobs"
+    verbose_name = "Фоновые задачи"
+
+    def ready(self):
+        # Обработчики задач регистрируются в модулях <app>/jobs.py
+        from django.utils.module_loading import autodiscover_modules
+
+        autodiscover_modules("jobs")
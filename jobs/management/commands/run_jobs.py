@@ -0,0 +1,51 @@
+"""
+Воркер фоновых задач (выгрузки из админки).
+
+Запускается отдельным процессом рядом с gunicorn (systemd-служба, см. README).
+Несколько воркеров можно запускать одновременно — задача достаётся одному.
+
+Использование:
+  python manage.py run_jobs
+  python manage.py run_jobs --once      # выполнить очередь и выйти (cron)
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import fail_stale, purge_old, run_pending, worker_name
+
+MAINTENANCE_INTERVAL = 3600  # сек.: зависшие и старые задачи
+
+
+class Command(BaseCommand):
+    help = "Выполнять фоновые задачи из очереди"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Выполнить задачи из очереди и выйти")
+        parser.add_argument(
+            "--sleep", type=float, default=None,
+            help="Пауза между проверками пустой очереди, сек. (по умолчанию JOBS_POLL_INTERVAL)",
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        sleep = options["sleep"] if options["sleep"] is not None else float(getattr(settings, "JOBS_POLL_INTERVAL", 2))
+        maintained_at = 0.0
+        self.stdout.write(f"Воркер {worker} запущен")
+        try:
+            while True:
+                if time.monotonic() - maintained_at >= MAINTENANCE_INTERVAL:
+                    stale, purged = fail_stale(), purge_old()
+                    if stale or purged:
+                        self.stdout.write(f"Зависших задач: {stale}, удалено старых: {purged}")
+                    maintained_at = time.monotonic()
+                done = run_pending(worker)
+                if done:
+                    self.stdout.write(f"Выполнено задач: {done}")
+                if options["once"]:
+                    break
+                if not done:
+                    time.sleep(max(0.1, sleep))
+        except KeyboardInterrupt:
+            self.stdout.write("Воркер остановлен")
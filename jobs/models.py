@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+
+def job_storage():
+    """Файлы результатов лежат вне MEDIA_ROOT: выгрузки с персональными данными отдаются только через админку."""
+    return FileSystemStorage(location=getattr(settings, "JOBS_FILES_ROOT", settings.BASE_DIR / "private" / "jobs"))
+
+
+class Job(models.Model):
+    """
+    Фоновая задача (выгрузка для админки). Создаётся кнопкой в админке,
+    выполняется командой run_jobs; результат — файл для скачивания.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Готово"
+        FAILED = "failed", "Ошибка"
+
+    kind = models.CharField("Тип", max_length=100, db_index=True)
+    title = models.CharField("Название", max_length=200)
+    params = models.JSONField("Параметры", default=dict, blank=True)
+    status = models.CharField(
+        "Статус",
+        max_length=10,
+        choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    progress = models.PositiveSmallIntegerField("Прогресс, %", default=0)
+    processed = models.PositiveIntegerField("Обработано", default=0)
+    total = models.PositiveIntegerField("Всего", default=0)
+    file = models.FileField("Файл", upload_to="%Y/%m/", storage=job_storage, blank=True)
+    error_message = models.TextField("Ошибка", blank=True)
+    worker = models.CharField("Воркер", max_length=100, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="Запустил",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField("Создано", auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField("Начато", null=True, blank=True)
+    finished_at = models.DateTimeField("Завершено", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ["-created_at"]
+        indexes = [
+            # Выбор следующей задачи воркером
+            models.Index(fields=["status", "created_at"], name="jobs_job_status_created"),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED)
@@ -0,0 +1,67 @@
+"""
+Реестр типов фоновых задач и постановка в очередь.
+
+Обработчик регистрируется в <app>/jobs.py:
+
+    @register("orders.sync_queue_excel", "Выгрузка очереди заказов в Excel")
+    def sync_queue_excel(job, progress):
+        ...
+        return filename, fileobj            # или (filename, fileobj, on_saved)
+
+progress(done, total) сообщает прогресс; возвращённый файл сохраняется в Job.file.
+on_saved() вызывается после сохранения файла, в одной транзакции с отметкой «готово»: так
+обработчик меняет данные (например, помечает выгруженное) только когда файл уже есть.
+Если обработчик ничего не возвращает, задача завершается без файла.
+"""
+from typing import Callable, NamedTuple, Optional
+
+from django.db import transaction
+
+from .models import Job
+
+
+class JobType(NamedTuple):
+    kind: str
+    title: str
+    handler: Callable
+
+
+_types: dict[str, JobType] = {}
+
+
+def register(kind: str, title: str):
+    def decorator(handler):
+        _types[kind] = JobType(kind, title, handler)
+        return handler
+    return decorator
+
+
+def get_type(kind: str) -> Optional[JobType]:
+    return _types.get(kind)
+
+
+def enqueue(kind: str, params: Optional[dict] = None, user=None, unique: bool = True) -> Job:
+    """
+    Поставить задачу в очередь. unique — если такая же задача (тип и параметры) ещё в очереди
+    или выполняется, вернуть её: повторное нажатие кнопки не запускает вторую выгрузку.
+    """
+    job_type = _types.get(kind)
+    if job_type is None:
+        raise ValueError(f"Неизвестный тип задачи: {kind}")
+    params = params or {}
+    with transaction.atomic():
+        if unique:
+            active = (
+                Job.objects.select_for_update()
+                .filter(kind=kind, params=params, status__in=[Job.Status.QUEUED, Job.Status.RUNNING])
+                .order_by("created_at")
+                .first()
+            )
+            if active is not None:
+                return active
+        return Job.objects.create(
+            kind=kind,
+            title=job_type.title,
+            params=params,
+            created_by=user if user is not None and user.is_authenticated else None,
+        )
@@ -0,0 +1,134 @@
+"""
+Очередь фоновых задач: постановка без дублей, захват воркером, выполнение, зависшие задачи.
+
+python manage.py test --settings=store.test_settings
+"""
+import io
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from orders.models import OrderSyncQueue
+
+from .models import Job
+from .registry import enqueue, register
+from .worker import claim_next, fail_stale, run_job
+
+calls = []
+
+
+@register("tests.file", "Тестовая выгрузка")
+def _file_job(job, progress):
+    progress(1, 1)
+    return "result.txt", io.BytesIO(b"data"), lambda: calls.append(job.pk)
+
+
+@register("tests.broken", "Тестовая ошибка")
+def _broken_job(job, progress):
+    raise RuntimeError("сломалось")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        files_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, files_root, ignore_errors=True)
+        # Хранилище Job.file создаётся при загрузке моделей — JOBS_FILES_ROOT тут уже не поменять
+        storage = mock.patch.object(Job._meta.get_field("file"), "storage", FileSystemStorage(location=files_root))
+        storage.start()
+        self.addCleanup(storage.stop)
+
+    def test_enqueue_returns_active_job(self):
+        first = enqueue("tests.file", {"a": 1})
+        self.assertEqual(enqueue("tests.file", {"a": 1}), first)
+        self.assertNotEqual(enqueue("tests.file", {"a": 2}), first)
+        self.assertNotEqual(enqueue("tests.file", {"a": 1}, unique=False), first)
+
+        Job.objects.filter(pk=first.pk).update(status=Job.Status.DONE)
+        self.assertNotEqual(enqueue("tests.file", {"a": 1}).pk, first.pk)
+
+    def test_enqueue_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            enqueue("tests.missing")
+
+    def test_claim_next_takes_oldest_queued(self):
+        first = enqueue("tests.file", unique=False)
+        second = enqueue("tests.file", unique=False)
+
+        job = claim_next("w1")
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.worker), (Job.Status.RUNNING, "w1"))
+        self.assertIsNotNone(job.started_at)
+        self.assertEqual(claim_next("w2").pk, second.pk)
+        self.assertIsNone(claim_next("w3"))
+
+    def test_run_job_saves_file_then_calls_on_saved(self):
+        enqueue("tests.file")
+        job = claim_next("w")
+        run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (Job.Status.DONE, 100))
+        self.assertEqual(job.file.read(), b"data")
+        self.assertEqual(calls, [job.pk])
+
+    def test_run_job_failure(self):
+        enqueue("tests.broken")
+        job = claim_next("w")
+        with self.assertLogs("jobs.worker", "ERROR"):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn("сломалось", job.error_message)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_file_save_failure_skips_on_saved(self):
+        enqueue("tests.file")
+        job = claim_next("w")
+        with mock.patch.object(FileSystemStorage, "save", side_effect=OSError("диск")), \
+                self.assertLogs("jobs.worker", "ERROR"):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(calls, [])
+
+    def test_queue_export_marks_rows_after_file_is_stored(self):
+        rows = OrderSyncQueue.objects.bulk_create([
+            OrderSyncQueue(action=OrderSyncQueue.Action.CREATE, order_uuid=uuid.uuid4()) for _ in range(3)
+        ])
+        pending = OrderSyncQueue.objects.filter(status=OrderSyncQueue.Status.PENDING)
+
+        enqueue("orders.sync_queue_excel")
+        with mock.patch.object(FileSystemStorage, "save", side_effect=OSError("диск")), \
+                self.assertLogs("jobs.worker", "ERROR"):
+            run_job(claim_next("w"))
+        self.assertEqual(pending.count(), len(rows))
+
+        enqueue("orders.sync_queue_excel")
+        job = claim_next("w")
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertTrue(job.file)
+        self.assertEqual(pending.count(), 0)
+
+    @override_settings(JOBS_STALE_AFTER=60)
+    def test_fail_stale(self):
+        enqueue("tests.file", unique=False)
+        enqueue("tests.file", unique=False)
+        stale, fresh = claim_next("w"), claim_next("w")
+        Job.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(seconds=120))
+
+        self.assertEqual(fail_stale(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, Job.Status.FAILED)
+        self.assertEqual(fresh.status, Job.Status.RUNNING)
@@ -0,0 +1,21 @@
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import redirect
+from django.urls import reverse
+
+from .registry import enqueue
+
+
+def enqueue_view(kind: str):
+    """
+    Вью для кнопки в админке: ставит задачу kind в очередь и открывает её страницу
+    (прогресс и ссылка на файл). Если такая задача уже выполняется — открывает её.
+    """
+
+    @staff_member_required
+    def view(request):
+        job = enqueue(kind, user=request.user)
+        messages.info(request, f"«{job.title}»: задача №{job.pk} в очереди, файл появится на этой странице.")
+        return redirect(reverse("admin:jobs_job_change", args=[job.pk]))
+
+    return view
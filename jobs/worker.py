@@ -0,0 +1,137 @@
+"""
+Выполнение фоновых задач (команда run_jobs).
+
+Задача забирается из очереди select_for_update(skip_locked=True): несколько воркеров не возьмут
+одну и ту же задачу. Прогресс пишется в Job не чаще раза в PROGRESS_INTERVAL сек.
+Задачи, зависшие в статусе «выполняется» дольше JOBS_STALE_AFTER (воркер убит), помечаются ошибкой;
+завершённые старше JOBS_KEEP_DAYS удаляются вместе с файлами.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_type
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 1.0  # сек.
+_RESULT_FIELDS = ["status", "progress", "processed", "total", "file", "error_message", "finished_at"]
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next(worker: str) -> Optional[Job]:
+    """Следующая задача из очереди, уже помеченная как выполняемая этим воркером."""
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.QUEUED)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.Status.RUNNING
+        job.started_at = timezone.now()
+        job.worker = worker
+        job.save(update_fields=["status", "started_at", "worker"])
+    return job
+
+
+def _progress_reporter(job: Job):
+    last = 0.0
+
+    def progress(done: int, total: int) -> None:
+        nonlocal last
+        now = time.monotonic()
+        if now - last < PROGRESS_INTERVAL and done < total:
+            return
+        last = now
+        percent = min(100, int(done * 100 / total)) if total else 0
+        Job.objects.filter(pk=job.pk).update(processed=done, total=total, progress=percent)
+
+    return progress
+
+
+def run_job(job: Job) -> None:
+    """Выполнить задачу и записать результат (файл или ошибку)."""
+    job_type = get_type(job.kind)
+    t0 = time.perf_counter()
+    try:
+        if job_type is None:
+            raise ValueError(f"Неизвестный тип задачи: {job.kind}")
+        result = job_type.handler(job, _progress_reporter(job))
+        job.refresh_from_db(fields=["processed", "total"])
+        on_saved = None
+        if result:
+            filename, fileobj, *rest = result
+            on_saved = rest[0] if rest else None
+            with fileobj:
+                job.file.save(filename, File(fileobj), save=False)
+        job.status = Job.Status.DONE
+        job.progress = 100
+        job.error_message = ""
+        job.finished_at = timezone.now()
+        # Изменения обработчика (on_saved) и «готово» — вместе и только после сохранения файла
+        with transaction.atomic():
+            if on_saved is not None:
+                on_saved()
+            job.save(update_fields=_RESULT_FIELDS)
+        logger.info("Job %s %s: готово за %.1f с", job.pk, job.kind, time.perf_counter() - t0)
+    except Exception:
+        logger.exception("Job %s %s: ошибка", job.pk, job.kind)
+        if job.file:
+            job.file.delete(save=False)
+        job.status = Job.Status.FAILED
+        job.error_message = traceback.format_exc()[-5000:]
+        job.finished_at = timezone.now()
+        job.save(update_fields=_RESULT_FIELDS)
+
+
+def fail_stale() -> int:
+    """Задачи, которые «выполняются» дольше JOBS_STALE_AFTER сек. — воркер умер, помечаем ошибкой."""
+    stale_after = int(getattr(settings, "JOBS_STALE_AFTER", 3600))
+    return Job.objects.filter(
+        status=Job.Status.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=stale_after)
+    ).update(status=Job.Status.FAILED, error_message="Воркер остановился во время выполнения", finished_at=timezone.now())
+
+
+def purge_old() -> int:
+    """Удалить завершённые задачи старше JOBS_KEEP_DAYS дней вместе с файлами."""
+    keep_days = int(getattr(settings, "JOBS_KEEP_DAYS", 7))
+    old = Job.objects.filter(
+        status__in=[Job.Status.DONE, Job.Status.FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=keep_days),
+    )
+    count = 0
+    for job in old.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def run_pending(worker: str, limit: Optional[int] = None) -> int:
+    """Выполнить задачи из очереди, пока она не опустеет (или limit задач). Возвращает число выполненных."""
+    done = 0
+    while limit is None or done < limit:
+        close_old_connections()
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
@@ -1,9 +1,9 @@
 from django.contrib import admin
-from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import path
 from unfold.admin import ModelAdmin, TabularInline
 
-from .export_excel import export_pending_to_excel
+from jobs.views import enqueue_view
+
 from .models import City, DeliveryMethod, Order, OrderItem, OrderSyncQueue
 
 
@@ -78,7 +78,7 @@ class OrderSyncQueueAdmin(ModelAdmin):
         extra = [
             path(
                 "export-excel/",
-                staff_member_required(export_pending_to_excel),
+                enqueue_view("orders.sync_queue_excel"),
                 name="orders_ordersyncqueue_export_excel",
             ),
         ]
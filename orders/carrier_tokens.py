@@ -0,0 +1,145 @@
+"""
+Общий кэш токенов API перевозчиков (OAuth СДЭК, JWT 5post) для всех воркеров gunicorn.
+
+Уровни: память процесса → таблица CarrierToken → запрос нового токена у перевозчика.
+Обновляет токен один воркер: строка CarrierToken блокируется select_for_update, остальные
+ждут блокировку и забирают уже полученный токен (single-flight), без повторного OAuth.
+Если БД недоступна — токен запрашивается и хранится в процессе, как раньше.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .models import CarrierToken
+
+logger = logging.getLogger(__name__)
+
+# Токен, которому осталось жить меньше EXPIRY_MARGIN секунд, считаем просроченным
+EXPIRY_MARGIN = 30
+
+# fetch() → (token, expires_in в секундах) или None при ошибке
+TokenFetcher = Callable[[], Optional[tuple[str, int]]]
+
+_memo: dict[str, tuple[str, float]] = {}
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _local_lock(carrier: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(carrier, threading.Lock())
+
+
+def _memo_get(carrier: str) -> Optional[str]:
+    entry = _memo.get(carrier)
+    if entry and time.time() < entry[1]:
+        return entry[0]
+    return None
+
+
+def _remember(carrier: str, token: str, expires_at) -> None:
+    _memo[carrier] = (token, expires_at.timestamp() - EXPIRY_MARGIN)
+
+
+def _is_valid(row: Optional[CarrierToken]) -> bool:
+    return bool(
+        row is not None
+        and row.token
+        and row.expires_at
+        and row.expires_at > timezone.now() + timedelta(seconds=EXPIRY_MARGIN)
+    )
+
+
+def forget(carrier: str) -> None:
+    """Сбросить токен в памяти процесса (следующий запрос прочитает общий кэш)."""
+    _memo.pop(carrier, None)
+
+
+def store_token(carrier: str, token: str, expires_in: int) -> None:
+    """Сохранить токен, полученный в обход get_token (например, ручное обновление), для всех воркеров."""
+    expires_at = timezone.now() + timedelta(seconds=expires_in)
+    _remember(carrier, token, expires_at)
+    try:
+        CarrierToken.objects.update_or_create(
+            carrier=carrier,
+            defaults={"token": token, "expires_at": expires_at},
+        )
+    except DatabaseError as e:
+        logger.warning("Carrier token %s: не удалось сохранить в БД: %s", carrier, e)
+
+
+def _fetch_local(carrier: str, fetch: TokenFetcher) -> Optional[str]:
+    result = fetch()
+    if not result:
+        forget(carrier)
+        return None
+    token, expires_in = result
+    _remember(carrier, token, timezone.now() + timedelta(seconds=expires_in))
+    return token
+
+
+def _get_shared(carrier: str, fetch: TokenFetcher, force: bool, failed_token: Optional[str]) -> Optional[str]:
+    started = timezone.now()
+    row = CarrierToken.objects.filter(carrier=carrier).first()
+    if _is_valid(row) and not force and row.token != failed_token:
+        _remember(carrier, row.token, row.expires_at)
+        return row.token
+
+    if row is None:
+        try:
+            with transaction.atomic():
+                CarrierToken.objects.create(carrier=carrier)
+        except IntegrityError:
+            pass  # строку уже создал другой воркер
+
+    with transaction.atomic():
+        row = CarrierToken.objects.select_for_update().get(carrier=carrier)
+        # Пока ждали блокировку, токен мог обновить другой воркер — берём его
+        if _is_valid(row) and (
+            row.updated_at >= started or (not force and row.token != failed_token)
+        ):
+            _remember(carrier, row.token, row.expires_at)
+            return row.token
+
+        result = fetch()
+        if not result:
+            forget(carrier)
+            return None
+        token, expires_in = result
+        row.token = token
+        row.expires_at = timezone.now() + timedelta(seconds=expires_in)
+        row.save(update_fields=["token", "expires_at", "updated_at"])
+    _remember(carrier, row.token, row.expires_at)
+    logger.info("Carrier token %s: получен новый токен", carrier)
+    return token
+
+
+def get_token(
+    carrier: str,
+    fetch: TokenFetcher,
+    force: bool = False,
+    failed_token: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Токен перевозчика из общего кэша; при отсутствии или истечении — один запрос fetch() на все воркеры.
+    failed_token — токен, отклонённый API (401/403): он будет заменён, но если другой воркер
+    уже получил новый, вернётся новый без повторного запроса.
+    force — запросить новый токен, даже если текущий ещё действует.
+    """
+    token = _memo_get(carrier)
+    if token and not force and token != failed_token:
+        return token
+    with _local_lock(carrier):
+        token = _memo_get(carrier)
+        if token and not force and token != failed_token:
+            return token
+        try:
+            return _get_shared(carrier, fetch, force, failed_token)
+        except DatabaseError as e:
+            logger.warning("Carrier token %s: общий кэш недоступен (%s), токен только для процесса", carrier, e)
+            return _fetch_local(carrier, fetch)
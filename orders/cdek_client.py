@@ -5,7 +5,6 @@
 """
 import json
 import logging
-import time
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -13,6 +12,12 @@ from typing import Optional
 
 from django.conf import settings
 
+from store import perf
+
+from . import carrier_tokens
+from .circuit_breaker import LastGoodCache, get_breaker, http_probe, is_breaker_failure, note_fallback
+from .http_deadline import cut_by_deadline, http_timeout
+
 logger = logging.getLogger(__name__)
 
 # Базовые URL СДЭК API v2
@@ -20,8 +25,13 @@ CDEK_API_URL = "https://api.cdek.ru"
 CDEK_API_URL_TEST = "https://api.edu.cdek.ru"  # тестовый стенд (integration.edu.cdek.ru может отдавать 403)
 CDEK_OAUTH_PATH = "/v2/oauth/token"
 
-_cdek_token: Optional[str] = None
-_cdek_token_expire: float = 0
+
+def _probe() -> bool:
+    return http_probe(f"{_base_url()}{CDEK_OAUTH_PATH}")
+
+
+_breaker = get_breaker("cdek", probe=_probe)
+_last_good = LastGoodCache()
 
 
 def _base_url() -> str:
@@ -39,20 +49,13 @@ def _get_credentials() -> tuple[str, str]:
     return account, secure
 
 
-def get_token(force: bool = False) -> Optional[str]:
+def _fetch_token() -> Optional[tuple[str, int]]:
     """
-    Получить OAuth-токен СДЭК (кэш ~6 мин).
+    Запрос нового OAuth-токена СДЭК.
     POST /v2/oauth/token, grant_type=client_credentials, client_id=account, client_secret=secure.
+    Возвращает (access_token, expires_in) или None.
     """
-    global _cdek_token, _cdek_token_expire
-    if not force and _cdek_token and time.time() < _cdek_token_expire:
-        return _cdek_token
-
     account, secure = _get_credentials()
-    if not account or not secure:
-        logger.warning("CDEK: учётные данные не заданы (CDEK_ACCOUNT, CDEK_SECURE)")
-        return None
-
     base = _base_url()
     url = f"{base}{CDEK_OAUTH_PATH}"
     data = urllib.parse.urlencode({
@@ -71,36 +74,77 @@ def get_token(force: bool = False) -> Optional[str]:
             "User-Agent": "HardcodeStore/1.0",
         },
     )
+    if not _breaker.allow():
+        logger.info("CDEK OAuth: предохранитель открыт, запрос пропущен")
+        return None
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
+        with perf.span("http"), urllib.request.urlopen(req, timeout=http_timeout(15)) as resp:
             body = json.loads(resp.read().decode())
-            _cdek_token = body.get("access_token")
-            expires_in = int(body.get("expires_in", 3599)) - 10
-            _cdek_token_expire = time.time() + expires_in
-            return _cdek_token
-    except (TimeoutError, OSError) as e:
-        logger.warning("CDEK OAuth timeout: %s", e)
-        _cdek_token = None
-        _cdek_token_expire = 0
-        return None
+            _breaker.record_success()
+            token = body.get("access_token")
+            if not token:
+                logger.warning("CDEK OAuth: ответ без access_token")
+                return None
+            return token, int(body.get("expires_in", 3599)) - 10
     except urllib.error.HTTPError as e:
         err_body = e.read().decode(errors="replace")[:500]
         logger.warning("CDEK OAuth error %s: %s", e.code, err_body)
-        _cdek_token = None
-        _cdek_token_expire = 0
+        if is_breaker_failure(e):
+            _breaker.record_failure(f"OAuth HTTP {e.code}")
+        return None
+    except (TimeoutError, OSError) as e:
+        logger.warning("CDEK OAuth timeout: %s", e)
+        if not cut_by_deadline(e):
+            _breaker.record_failure(e)
         return None
-    except (urllib.error.URLError, json.JSONDecodeError, KeyError) as e:
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
         logger.warning("CDEK OAuth error: %s", e)
-        _cdek_token = None
-        _cdek_token_expire = 0
         return None
 
 
-def _request(method: str, path: str, body: Optional[dict] = None, timeout: int = 20, _retry: bool = True) -> Optional[dict]:
-    """Выполнить запрос к API с текущим токеном. При 401 — сброс токена и одна повторная попытка."""
-    token = get_token()
-    if not token:
+def get_token(force: bool = False, failed_token: Optional[str] = None) -> Optional[str]:
+    """
+    Получить OAuth-токен СДЭК из общего для всех воркеров кэша (см. carrier_tokens).
+    failed_token — токен, отклонённый API: будет заменён новым (один запрос на все воркеры).
+    """
+    account, secure = _get_credentials()
+    if not account or not secure:
+        logger.warning("CDEK: учётные данные не заданы (CDEK_ACCOUNT, CDEK_SECURE)")
         return None
+    return carrier_tokens.get_token("cdek", _fetch_token, force=force, failed_token=failed_token)
+
+
+def _cache_key(method: str, path: str, body: Optional[dict]) -> Optional[tuple]:
+    """Ключ последнего успешного ответа: только чтение (GET) и калькулятор; создание заказов не кэшируется."""
+    if method != "GET" and not path.startswith("/v2/calculator/"):
+        return None
+    return (method, path, json.dumps(body, sort_keys=True) if body else "")
+
+
+def _fallback(cache_key: Optional[tuple]) -> Optional[dict]:
+    note_fallback()
+    return _last_good.get(cache_key) if cache_key else None
+
+
+def _request(
+    method: str,
+    path: str,
+    body: Optional[dict] = None,
+    timeout: int = 20,
+    _retry: bool = True,
+    _failed_token: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Выполнить запрос к API с текущим токеном. При 401 — замена токена и одна повторная попытка.
+    Таймауты и 5xx считает предохранитель; пока он открыт или при ошибке — последний успешный ответ на тот же запрос.
+    """
+    cache_key = _cache_key(method, path, body)
+    if not _breaker.allow():
+        logger.info("CDEK API %s %s: предохранитель открыт, запрос пропущен", method, path)
+        return _fallback(cache_key)
+    token = get_token(failed_token=_failed_token)
+    if not token:
+        return _fallback(cache_key)
     base = _base_url()
     url = f"{base}{path}"
     headers = {"Accept": "application/json", "Authorization": f"Bearer {token}"}
@@ -112,27 +156,34 @@ def _request(method: str, path: str, body: Optional[dict] = None, timeout: int =
     req = urllib.request.Request(url, data=data, method=method, headers=headers)
     req.add_header("User-Agent", "HardcodeStore/1.0")
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return json.loads(resp.read().decode())
-    except (TimeoutError, OSError) as e:
-        if "timed out" in str(e).lower() or "timeout" in str(type(e).__name__).lower():
-            logger.warning("CDEK API %s %s timeout", method, path)
-        else:
-            logger.warning("CDEK API %s %s error: %s", method, path, e)
-        return None
+        with perf.span("http"), urllib.request.urlopen(req, timeout=http_timeout(timeout)) as resp:
+            result = json.loads(resp.read().decode())
     except urllib.error.HTTPError as e:
         err_body = e.read().decode(errors="replace")[:500]
         logger.warning("CDEK API %s %s error %s: %s", method, path, e.code, err_body)
+        if is_breaker_failure(e):
+            _breaker.record_failure(f"HTTP {e.code}")
+            return _fallback(cache_key)
+        _breaker.record_success()
         if e.code in (401, 403) and _retry:
-            global _cdek_token, _cdek_token_expire
-            _cdek_token = None
-            _cdek_token_expire = 0
             logger.info("CDEK: токен недействителен (%s), запрашиваем новый", e.code)
-            return _request(method, path, body, timeout, _retry=False)
+            return _request(method, path, body, timeout, _retry=False, _failed_token=token)
         return None
-    except (urllib.error.URLError, json.JSONDecodeError) as e:
+    except (TimeoutError, OSError) as e:
+        if "timed out" in str(e).lower() or "timeout" in str(type(e).__name__).lower():
+            logger.warning("CDEK API %s %s timeout", method, path)
+        else:
+            logger.warning("CDEK API %s %s error: %s", method, path, e)
+        if not cut_by_deadline(e):
+            _breaker.record_failure(e)
+        return _fallback(cache_key)
+    except json.JSONDecodeError as e:
         logger.warning("CDEK API %s %s error: %s", method, path, e)
         return None
+    _breaker.record_success()
+    if cache_key:
+        _last_good.set(cache_key, result)
+    return result
 
 
 def get_delivery_cost(
@@ -0,0 +1,194 @@
+"""
+Предохранитель (circuit breaker) для API перевозчиков.
+
+Состояния: closed — запросы идут; open — после CARRIER_BREAKER_FAILURES подряд таймаутов/5xx
+запросы к перевозчику не выполняются, клиенты сразу отдают кэш или None; half_open — через
+CARRIER_BREAKER_RESET секунд фоновый поток проверяет доступность API (probe). Успех — closed,
+ошибка — снова open. Состояние своё в каждом воркере: воркер перестаёт ждать таймауты сам.
+
+Клиент, отдавший вместо ответа API запасные данные (LastGoodCache, просроченный тариф) или пропустивший
+запрос, вызывает note_fallback(): api_cache (orders.http_cache) такой ответ вью не кэширует и помечает
+no-store — иначе браузеры и nginx часами отдавали бы устаревшие цены после восстановления API.
+"""
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_DEFAULT_FAILURES = 5
+_DEFAULT_RESET = 30  # сек.
+
+_fallback = threading.local()
+
+
+def note_fallback() -> None:
+    """Отметить, что в этом потоке клиент ТК отдал запасные данные вместо ответа API."""
+    _fallback.used = True
+
+
+def reset_fallback() -> None:
+    _fallback.used = False
+
+
+def fallback_used() -> bool:
+    """Отдавал ли клиент ТК запасные данные в этом потоке после reset_fallback()."""
+    return getattr(_fallback, "used", False)
+
+
+def is_breaker_failure(exc: BaseException) -> bool:
+    """Ошибка, означающая недоступность API: таймаут, сеть, 5xx. Ответы 4xx — не сбой перевозчика."""
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code >= 500
+    return isinstance(exc, (urllib.error.URLError, TimeoutError, OSError))
+
+
+def http_probe(url: str, timeout: float = 5) -> bool:
+    """Проверка доступности: любой HTTP-ответ, кроме 5xx, за timeout секунд."""
+    req = urllib.request.Request(url, method="GET", headers={"User-Agent": "HardcodeStore/1.0"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout):
+            return True
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (urllib.error.URLError, TimeoutError, OSError):
+        return False
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, probe: Optional[Callable[[], bool]] = None):
+        self.name = name
+        self.probe = probe
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._probe_scheduled = False
+
+    @property
+    def max_failures(self) -> int:
+        return max(1, int(getattr(settings, "CARRIER_BREAKER_FAILURES", _DEFAULT_FAILURES) or _DEFAULT_FAILURES))
+
+    @property
+    def reset_timeout(self) -> float:
+        return max(1.0, float(getattr(settings, "CARRIER_BREAKER_RESET", _DEFAULT_RESET) or _DEFAULT_RESET))
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к API. Без probe в half_open пропускается пробный запрос."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.probe is None and self.state == OPEN and time.time() - (self.opened_at or 0) >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Carrier breaker %s: API снова доступен, closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error: object = "") -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.max_failures):
+                self._open()
+
+    def _open(self) -> None:
+        if self.state != OPEN:
+            logger.warning(
+                "Carrier breaker %s: open после %s ошибок (%s)", self.name, self.failures, self.last_error
+            )
+        self.state = OPEN
+        self.opened_at = time.time()
+        if self.probe is not None and not self._probe_scheduled:
+            self._probe_scheduled = True
+            timer = threading.Timer(self.reset_timeout, self._run_probe)
+            timer.daemon = True
+            timer.start()
+
+    def _run_probe(self) -> None:
+        with self._lock:
+            self._probe_scheduled = False
+            if self.state != OPEN:
+                return
+            self.state = HALF_OPEN
+        try:
+            ok = bool(self.probe())
+        except Exception as e:
+            ok = False
+            self.last_error = f"probe: {type(e).__name__}: {str(e)[:150]}"
+        if ok:
+            self.record_success()
+        else:
+            with self._lock:
+                self._open()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opened_seconds_ago": round(time.time() - self.opened_at) if self.opened_at else None,
+                "last_error": self.last_error or None,
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, probe: Optional[Callable[[], bool]] = None) -> CircuitBreaker:
+    """Предохранитель перевозчика (один на процесс). probe — проверка для half_open в фоне."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, probe)
+        elif probe is not None and breaker.probe is None:
+            breaker.probe = probe
+        return breaker
+
+
+def breakers_snapshot() -> dict:
+    """Состояние всех предохранителей процесса (для диагностики)."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+class LastGoodCache:
+    """Последние успешные ответы API (LRU): отдаются, пока предохранитель открыт или запрос не удался."""
+
+    def __init__(self, max_size: int = 500):
+        self.max_size = max_size
+        self._data: "OrderedDict[object, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
@@ -0,0 +1,152 @@
+"""
+Подсказки городов (orders.City) для автодополнения — общая реализация для /api/cities/ и чекаута.
+
+Справочник загружается в память воркера один раз: отсортированный массив нормализованных названий
+(нижний регистр, ё → е) и триграммы → номера названий. Совпадения с начала названия ищутся бинарным
+поиском (bisect), вхождения внутри названия («петер» → «Санкт-Петербург») — среди названий с самой
+редкой триграммой запроса, без перебора всего справочника; для запросов короче трёх символов — только
+с начала. Сначала совпадения с начала, потом внутри, каждая группа по алфавиту.
+Изменения City в этом процессе сбрасывают индекс сигналом, в остальных воркерах — по CITY_SUGGEST_TTL.
+Если городов больше CITY_SUGGEST_MAX_MEMORY, запросы идут в БД с той же нормализацией
+(триграммный GIN-индекс по REPLACE(UPPER(name), 'Ё', 'Е')).
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Replace, Upper
+
+from .models import City
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+_DEFAULT_TTL = 600  # сек.
+_DEFAULT_MAX_MEMORY = 200000
+GRAM = 3  # вхождения внутри названия ищутся от этой длины запроса
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().replace("ё", "е").split())
+
+
+def _grams(key: str) -> set[str]:
+    return {key[k:k + GRAM] for k in range(len(key) - GRAM + 1)}
+
+
+class CityIndex:
+    """Отсортированный по нормализованному названию массив городов и триграммы названий."""
+
+    def __init__(self, names):
+        pairs = sorted((normalize(n), n) for n in names if n)
+        self.keys = [k for k, _ in pairs]
+        self.names = [n for _, n in pairs]
+        # Номера названий по возрастанию — кандидаты на вхождение перебираются в алфавитном порядке
+        self.grams: dict[str, array] = {}
+        for j, key in enumerate(self.keys):
+            for gram in _grams(key):
+                postings = self.grams.get(gram)
+                if postings is None:
+                    postings = self.grams[gram] = array("I")
+                postings.append(j)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suggest(self, q: str, limit: int = DEFAULT_LIMIT) -> list[str]:
+        q = normalize(q)
+        if not q or limit <= 0:
+            return []
+        keys, names = self.keys, self.names
+        result = []
+        i = bisect_left(keys, q)
+        prefix_end = i
+        while prefix_end < len(keys) and keys[prefix_end].startswith(q):
+            if len(result) < limit:
+                result.append(names[prefix_end])
+            prefix_end += 1
+        if len(result) >= limit or len(q) < GRAM:
+            return result
+        # Вхождения внутри названия — среди названий с самой редкой триграммой запроса;
+        # совпадения с начала (диапазон [i, prefix_end)) уже взяты
+        candidates = min((self.grams.get(gram, ()) for gram in _grams(q)), key=len)
+        for j in candidates:
+            if i <= j < prefix_end:
+                continue
+            if q in keys[j]:
+                result.append(names[j])
+                if len(result) >= limit:
+                    break
+        return result
+
+
+# _TOO_BIG — справочник больше CITY_SUGGEST_MAX_MEMORY: до истечения TTL подсказки из БД без перечитывания
+_TOO_BIG = object()
+_index = None
+_index_loaded_at: float = 0
+_index_lock = threading.Lock()
+
+
+def _ttl() -> float:
+    return float(getattr(settings, "CITY_SUGGEST_TTL", _DEFAULT_TTL))
+
+
+def _get_index() -> Optional[CityIndex]:
+    """Индекс в памяти или None, если справочник слишком большой для памяти."""
+    global _index, _index_loaded_at
+    index = _index
+    if index is None or time.time() - _index_loaded_at >= _ttl():
+        with _index_lock:
+            if _index is None or time.time() - _index_loaded_at >= _ttl():
+                _index = _load_index()
+                _index_loaded_at = time.time()
+            index = _index
+    return None if index is _TOO_BIG else index
+
+
+def _load_index():
+    max_memory = int(getattr(settings, "CITY_SUGGEST_MAX_MEMORY", _DEFAULT_MAX_MEMORY))
+    # Размер — отдельным COUNT: большой справочник не читается в память ради проверки
+    if City.objects.count() > max_memory:
+        logger.info("City suggest: городов больше %s, подсказки из БД", max_memory)
+        return _TOO_BIG
+    return CityIndex(City.objects.values_list("name", flat=True))
+
+
+def invalidate() -> None:
+    """Перечитать справочник при следующем запросе (вызывается сигналами City)."""
+    global _index, _index_loaded_at
+    with _index_lock:
+        _index = None
+        _index_loaded_at = 0
+
+
+def _suggest_db(q: str, limit: int) -> list[str]:
+    # Выражение совпадает с индексом orders_city_name_key_trgm (миграция 0017)
+    q = normalize(q).upper()
+    cities = City.objects.annotate(key=Replace(Upper("name"), Value("Ё"), Value("Е"))).order_by("name")
+    prefix = list(cities.filter(key__startswith=q).values_list("name", flat=True)[:limit])
+    if len(prefix) >= limit or len(q) < GRAM:
+        return prefix
+    infix = (
+        cities.filter(key__contains=q)
+        .exclude(key__startswith=q)
+        .values_list("name", flat=True)[:limit - len(prefix)]
+    )
+    return prefix + list(infix)
+
+
+def suggest_cities(q: str, limit: int = DEFAULT_LIMIT) -> list[str]:
+    """Названия городов для строки q: сначала начинающиеся с q, затем содержащие q."""
+    q = (q or "").strip()[:80]
+    if not q:
+        return []
+    index = _get_index()
+    if index is not None:
+        return index.suggest(q, limit)
+    return _suggest_db(q, limit)
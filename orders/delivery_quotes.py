@@ -0,0 +1,245 @@
+"""
+Параллельный расчёт доставки по всем активным ТК (СДЭК, 5post, Почта России).
+
+Запросы к перевозчикам выполняются одновременно в общем пуле потоков; общий дедлайн
+ограничивает время ответа: что не успело — помечается как timeout, остальное отдаётся сразу.
+Время ответа = самый медленный перевозчик в пределах дедлайна, а не сумма всех.
+Срок передаётся в потоки пула (orders.http_deadline): таймаут HTTP к ТК не дольше остатка дедлайна,
+а не начатые к сроку расчёты отменяются — пул не занят запросами, ответ на которые уже не нужен.
+Таймауты, урезанные сроком, предохранитель перевозчика не считают (http_deadline.cut_by_deadline).
+"""
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+
+from store import perf
+
+from . import http_deadline
+from .cdek_client import get_cities, get_delivery_cost as cdek_get_delivery_cost
+from .fivepost_client import get_delivery_cost as fivepost_get_delivery_cost
+from .models import DeliveryMethod
+from .russianpost_client import get_delivery_cost as russianpost_get_delivery_cost
+
+logger = logging.getLogger(__name__)
+
+# Код способа доставки → перевозчик (cdek_courier, cdek_pvz → cdek и т.д.)
+CARRIER_PREFIXES = (
+    ("cdek_", "cdek"),
+    ("fivepost_", "fivepost"),
+    ("russianpost", "russianpost"),
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Общий пул потоков на процесс (создаётся при первом запросе)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(getattr(settings, "DELIVERY_QUOTES_MAX_WORKERS", 8) or 8)
+                _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="delivery-quote")
+    return _executor
+
+
+def carrier_for_method(code: str) -> Optional[str]:
+    for prefix, carrier in CARRIER_PREFIXES:
+        if (code or "").startswith(prefix):
+            return carrier
+    return None
+
+
+def cdek_tariffs_from_result(result: dict) -> tuple[list, list, list]:
+    """
+    Нормализация ответа /v2/calculator/tarifflist.
+    Возвращает (raw, filtered, tariffs): все тарифы, без исключённых, итоговые без дубликатов по цене.
+    """
+    items = result.get("tariff_codes") or []
+    raw = []
+    for t in items:
+        mode_val = t.get("delivery_mode") or t.get("mode")
+        try:
+            mode_int = int(mode_val) if mode_val is not None else None
+        except (TypeError, ValueError):
+            mode_int = None
+        raw.append({
+            "tariff_code": t.get("tariff_code"),
+            "name": t.get("tariff_name", ""),
+            "delivery_sum": float(t.get("delivery_sum", 0)),
+            "period_min": int(t.get("period_min", 0)),
+            "period_max": int(t.get("period_max", 0)),
+            "delivery_mode": mode_int,
+        })
+
+    # Исключаем невыгодные тарифы (Сборный груз — LTL для юрлиц)
+    exclude_names = ("сборный груз",)
+    filtered = [t for t in raw if not any(
+        ex in (t.get("name") or "").lower() for ex in exclude_names
+    )]
+
+    # Убираем дубликаты по (shortName, period): оставляем только самый дешёвый
+    def _short_name(name: str) -> str:
+        s = (name or "").lower()
+        for p in ("дверь-дверь", "склад-склад", "дверь-склад", "склад-дверь"):
+            s = s.replace(p, "").strip()
+        s = re.sub(r"\s*до\s+\d+\s*$", "", s, flags=re.I).strip()
+        return s or "доставка"
+
+    seen: dict = {}
+    for t in filtered:
+        mode = t.get("delivery_mode")
+        key = (_short_name(t["name"]), t["period_min"], t["period_max"], mode)
+        if key not in seen or t["delivery_sum"] < seen[key]["delivery_sum"]:
+            seen[key] = t
+    tariffs = sorted(seen.values(), key=lambda x: x["delivery_sum"])
+    return raw, filtered, tariffs
+
+
+def _quote_cdek(params: dict) -> dict:
+    city_name = params.get("city") or ""
+    to_code = params.get("city_code")
+    if not to_code:
+        if not city_name:
+            return {"status": "skipped", "error": "Не указан город."}
+        cities = get_cities(country_code="RU", name_filter=city_name)
+        if not cities:
+            return {"status": "error", "error": f"Город «{city_name}» не найден в справочнике СДЭК."}
+        city_name = cities[0].get("city", city_name)
+        to_code = int(cities[0]["code"])
+    from_code = getattr(settings, "CDEK_SENDER_CITY_CODE", None)
+    if from_code is None:
+        from_code = 44
+    result = cdek_get_delivery_cost(
+        from_city_code=from_code,
+        to_city_code=to_code,
+        weight_grams=params["weight"],
+        length_cm=20,
+        width_cm=15,
+        height_cm=10,
+    )
+    if not result:
+        return {"status": "error", "error": "Не удалось рассчитать доставку СДЭК."}
+    _, _, tariffs = cdek_tariffs_from_result(result)
+    return {"status": "ok", "city": city_name or str(to_code), "city_code": to_code, "tariffs": tariffs}
+
+
+def _quote_fivepost(params: dict) -> dict:
+    city_name = params.get("city") or ""
+    if not city_name:
+        return {"status": "skipped", "error": "Не указан город."}
+    result = fivepost_get_delivery_cost(city_name, params["weight"], amount=0, payment_prepaid=True)
+    if not result:
+        return {"status": "error", "error": "Не удалось рассчитать доставку 5post."}
+    return {
+        "status": "ok",
+        "zone": result.get("zone", 1),
+        "price": result.get("price", 0),
+        "delivery_days": result.get("delivery_days", 0),
+    }
+
+
+def _quote_russianpost(params: dict) -> dict:
+    to_index = params.get("to_index")
+    if not to_index:
+        return {"status": "skipped", "error": "Не указан индекс получателя."}
+    from_index = getattr(settings, "RUSSIANPOST_SENDER_INDEX", None)
+    if not from_index:
+        return {"status": "error", "error": "Не настроен RUSSIANPOST_SENDER_INDEX."}
+    weight = max(1, min(params["weight"], 20000))
+    result = russianpost_get_delivery_cost(from_index, to_index, weight, sumoc_rub=params["sumoc"])
+    if not result:
+        return {"status": "error", "error": "Не удалось рассчитать тариф Почты России."}
+    return {
+        "status": "ok",
+        "to_index": to_index,
+        "price": result.get("price", 0),
+        "delivery_days": result.get("delivery_days"),
+        "name": result.get("name", "Почта России"),
+    }
+
+
+QUOTE_FUNCS = {
+    "cdek": _quote_cdek,
+    "fivepost": _quote_fivepost,
+    "russianpost": _quote_russianpost,
+}
+
+
+def _run_quote(carrier: str, params: dict, deadline_at: float) -> dict:
+    """Выполняется в потоке пула: расчёт одного перевозчика до deadline_at (time.monotonic), время и ошибки — в результат."""
+    t0 = time.perf_counter()
+    if deadline_at <= time.monotonic():
+        # Ждал в очереди пула дольше дедлайна: ответ уже отдан без этого перевозчика
+        return {"status": "timeout", "error": "Перевозчик не ответил вовремя.", "time_ms": 0}
+    try:
+        with http_deadline.deadline(deadline_at):
+            result = QUOTE_FUNCS[carrier](params)
+        if result.get("status") == "error" and deadline_at <= time.monotonic():
+            # Запрос прерван сроком расчёта (предохранителю не засчитан) — это не ошибка перевозчика
+            result = {"status": "timeout", "error": "Перевозчик не ответил вовремя."}
+    except Exception as e:
+        logger.warning("Delivery quote %s error: %s", carrier, e)
+        result = {"status": "error", "error": f"{type(e).__name__}: {str(e)[:150]}"}
+    finally:
+        # Поток пула не закрывает соединения с БД сам (в отличие от запроса)
+        connections.close_all()
+    result["time_ms"] = round((time.perf_counter() - t0) * 1000)
+    return result
+
+
+def get_quotes(params: dict, deadline: Optional[float] = None) -> dict:
+    """
+    Расчёт доставки всеми активными ТК параллельно.
+    params: {"city": str, "city_code": int | None, "to_index": int | None, "weight": int, "sumoc": float}.
+    deadline — общий бюджет в секундах (по умолчанию DELIVERY_QUOTES_DEADLINE).
+    Возвращает {"methods": [...], "quotes": {carrier: {...}}, "elapsed_ms": int}.
+    """
+    if deadline is None:
+        deadline = float(getattr(settings, "DELIVERY_QUOTES_DEADLINE", 8.0))
+    t0 = time.perf_counter()
+
+    methods = []
+    carriers = []
+    for dm in DeliveryMethod.objects.filter(is_active=True).order_by("sort_order", "name"):
+        carrier = carrier_for_method(dm.code)
+        if carrier is None:
+            continue
+        methods.append({
+            "id": dm.pk,
+            "code": dm.code,
+            "name": dm.name,
+            "delivery_type": dm.delivery_type,
+            "carrier": carrier,
+        })
+        if carrier not in carriers:
+            carriers.append(carrier)
+
+    executor = _get_executor()
+    remaining = max(0.0, deadline - (time.perf_counter() - t0))
+    deadline_at = time.monotonic() + remaining
+    futures = {executor.submit(_run_quote, carrier, params, deadline_at): carrier for carrier in carriers}
+    # Потоки пула не видят замеры запроса: в HTTP-время идёт ожидание всех ТК
+    with perf.span("http"):
+        done, _ = wait(futures, timeout=remaining)
+
+    quotes = {}
+    for future, carrier in futures.items():
+        if future in done:
+            quotes[carrier] = future.result()
+        else:
+            # Ещё в очереди — не начнётся; уже идёт — HTTP прервётся по таймауту к сроку
+            future.cancel()
+            quotes[carrier] = {"status": "timeout", "error": "Перевозчик не ответил вовремя."}
+    return {
+        "methods": methods,
+        "quotes": quotes,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000),
+    }
@@ -3,8 +3,7 @@
 """
 import json
 
-from django.http import HttpResponse
-from django.utils import timezone
+from store.services.queue_export import export_queue_file
 
 from .models import OrderSyncQueue
 
@@ -20,54 +19,39 @@ PAYLOAD_KEYS = [
     "delivery_method", "delivery_city", "delivery_address",
     "payment_type", "total", "total_pv", "status", "comment", "created_at", "items",
 ]
-
-
-def export_pending_to_excel(request):
-    """Экспорт всех pending записей в Excel, затем пометка как sent."""
-    from openpyxl import Workbook
-    from openpyxl.styles import Font
-    from openpyxl.utils import get_column_letter
-
+WIDTHS = [8, 12, 38, 18, 10, 38, 20, 28, 16, 16, 30, 30, 12, 12, 12, 12, 20, 22, 50]
+
+
+def _row(r):
+    payload = r.payload or {}
+    row = [
+        r.id,
+        r.action,
+        str(r.order_uuid) if r.order_uuid else "",
+        r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else "",
+    ]
+    for k in PAYLOAD_KEYS:
+        v = payload.get(k)
+        if k == "items" and isinstance(v, list):
+            row.append(json.dumps(v, ensure_ascii=False) if v else "")
+        else:
+            row.append(v if v is not None else "")
+    return row
+
+
+def export_pending_to_excel(progress=None):
+    """
+    Экспорт всех pending записей в Excel. Выполняется фоновой задачей (orders.jobs);
+    возвращает (имя файла, файл, mark_sent) — пометку выгруженных как sent воркер делает после сохранения файла.
+    """
     qs = OrderSyncQueue.objects.filter(status=OrderSyncQueue.Status.PENDING).order_by("created_at")
-    rows = list(qs)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Очередь выгрузки заказов"
-
-    ws.append(HEADERS)
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-
-    for r in rows:
-        payload = r.payload or {}
-        row = [
-            r.id,
-            r.action,
-            str(r.order_uuid) if r.order_uuid else "",
-            r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else "",
-        ]
-        for k in PAYLOAD_KEYS:
-            v = payload.get(k)
-            if k == "items" and isinstance(v, list):
-                row.append(json.dumps(v, ensure_ascii=False) if v else "")
-            else:
-                row.append(v if v is not None else "")
-        ws.append(row)
-
-    widths = [8, 12, 38, 18, 10, 38, 20, 28, 16, 16, 30, 30, 12, 12, 12, 12, 20, 22, 50]
-    for i, w in enumerate(widths[: len(HEADERS)], 1):
-        ws.column_dimensions[get_column_letter(i)].width = min(w, 50)
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return export_queue_file(
+        qs,
+        title="Очередь выгрузки заказов",
+        headers=HEADERS,
+        widths=WIDTHS,
+        row=_row,
+        filename_prefix="order_sync_queue",
+        sent_status=OrderSyncQueue.Status.SENT,
+        progress=progress,
     )
-    fname = f"order_sync_queue_{timezone.now().strftime('%Y%m%d_%H%M')}.xlsx"
-    response["Content-Disposition"] = f'attachment; filename="{fname}"'
-
-    wb.save(response)
-
-    now = timezone.now()
-    qs.update(status=OrderSyncQueue.Status.SENT, sent_at=now)
-
-    return response
@@ -5,7 +5,7 @@
 """
 import json
 import logging
-import time
+import math
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -13,6 +13,18 @@ from typing import Optional
 
 from django.conf import settings
 
+from store import perf
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен: без него calculation_tariff_batch считает в цикле
+    np = None
+
+from . import carrier_tokens
+from .circuit_breaker import LastGoodCache, get_breaker, http_probe, is_breaker_failure, note_fallback
+from .fivepost_zones import get_resolver
+from .http_deadline import cut_by_deadline, http_timeout
+
 logger = logging.getLogger(__name__)
 
 # Тарифы по зонам (из SDK TariffsTrait — при индивидуальном договоре можно переопределить)
@@ -33,10 +45,6 @@ FIVEPOST_ZONE_TARIFFS = {
 }
 FIVEPOST_WEIGHT_BASIC_KG = 3  # до этого веса — базовый тариф
 
-_fivepost_jwt: Optional[str] = None
-_fivepost_jwt_expire: float = 0
-
-
 def _base_url() -> str:
     url = getattr(settings, "FIVEPOST_API_URL", None)
     if url:
@@ -46,17 +54,18 @@ def _base_url() -> str:
     return "https://api-omni.x5.ru"
 
 
-def get_jwt(force: bool = False) -> Optional[str]:
-    """Получить JWT 5post (кэш ~50 мин). POST /jwt-generate-claims/rs256/1?apikey=..."""
-    global _fivepost_jwt, _fivepost_jwt_expire
-    if not force and _fivepost_jwt and time.time() < _fivepost_jwt_expire:
-        return _fivepost_jwt
+def _probe() -> bool:
+    return http_probe(f"{_base_url()}/jwt-generate-claims/rs256/1")
 
-    api_key = getattr(settings, "FIVEPOST_API_KEY", None) or ""
-    if not api_key:
-        logger.warning("5post: FIVEPOST_API_KEY не задан")
-        return None
 
+_breaker = get_breaker("fivepost", probe=_probe)
+# Страницы списка ПВЗ: (page, size) → последний успешный ответ
+_pvz_pages = LastGoodCache(max_size=200)
+
+
+def _fetch_jwt() -> Optional[tuple[str, int]]:
+    """Запрос нового JWT 5post. POST /jwt-generate-claims/rs256/1?apikey=... Возвращает (jwt, expires_in) или None."""
+    api_key = getattr(settings, "FIVEPOST_API_KEY", None) or ""
     base = _base_url()
     url = f"{base}/jwt-generate-claims/rs256/1?apikey={urllib.parse.quote(api_key)}"
     data = urllib.parse.urlencode({"subject": "OpenAPI", "audience": "A122019!"}).encode()
@@ -66,50 +75,49 @@ def get_jwt(force: bool = False) -> Optional[str]:
         method="POST",
         headers={"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"},
     )
+    if not _breaker.allow():
+        logger.info("5post JWT: предохранитель открыт, запрос пропущен")
+        return None
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
+        with perf.span("http"), urllib.request.urlopen(req, timeout=http_timeout(15)) as resp:
             body = json.loads(resp.read().decode())
-            _fivepost_jwt = body.get("jwt")
+            _breaker.record_success()
+            jwt = body.get("jwt")
+            if not jwt:
+                logger.warning("5post JWT: ответ без jwt")
+                return None
             # JWT живёт 1 час
-            _fivepost_jwt_expire = time.time() + 3500
-            return _fivepost_jwt
-    except (TimeoutError, OSError) as e:
-        logger.warning("5post JWT timeout: %s", e)
-        _fivepost_jwt = None
-        _fivepost_jwt_expire = 0
-        return None
+            return jwt, 3500
     except urllib.error.HTTPError as e:
         err_body = e.read().decode(errors="replace")[:500]
         logger.warning("5post JWT error %s: %s", e.code, err_body)
-        _fivepost_jwt = None
-        _fivepost_jwt_expire = 0
+        if is_breaker_failure(e):
+            _breaker.record_failure(f"JWT HTTP {e.code}")
+        return None
+    except (TimeoutError, OSError) as e:
+        logger.warning("5post JWT timeout: %s", e)
+        if not cut_by_deadline(e):
+            _breaker.record_failure(e)
         return None
-    except (urllib.error.URLError, json.JSONDecodeError, KeyError) as e:
+    except (json.JSONDecodeError, KeyError) as e:
         logger.warning("5post JWT error: %s", e)
-        _fivepost_jwt = None
-        _fivepost_jwt_expire = 0
         return None
 
 
+def get_jwt(force: bool = False, failed_token: Optional[str] = None) -> Optional[str]:
+    """Получить JWT 5post из общего для всех воркеров кэша (см. carrier_tokens)."""
+    if not getattr(settings, "FIVEPOST_API_KEY", None):
+        logger.warning("5post: FIVEPOST_API_KEY не задан")
+        return None
+    return carrier_tokens.get_token("fivepost", _fetch_jwt, force=force, failed_token=failed_token)
+
+
 def get_zone_for_city(city_name: str) -> int:
-    """Тарифная зона по названию города. Маппинг из настроек FIVEPOST_CITY_ZONE или встроенный по умолчанию."""
-    mapping = getattr(settings, "FIVEPOST_CITY_ZONE", None) or {}
-    key = (city_name or "").strip().lower()
-    if not key:
-        return 1
-    for name, zone in mapping.items():
-        if name == "__default__":
-            continue
-        if name.lower() in key or key in name.lower():
-            try:
-                return int(zone)
-            except (TypeError, ValueError):
-                pass
-    default = mapping.get("__default__", 1)
-    try:
-        return int(default)
-    except (TypeError, ValueError):
-        return 1
+    """
+    Тарифная зона по названию города: таблица FIVEPOST_CITY_ZONE_FILE + FIVEPOST_CITY_ZONE,
+    собранная один раз (см. fivepost_zones). Не найден — зона __default__ (по умолчанию 1).
+    """
+    return get_resolver().resolve(city_name)
 
 
 def calculation_tariff(
@@ -130,7 +138,6 @@ def calculation_tariff(
     t = FIVEPOST_ZONE_TARIFFS[zone]
     weight_kg = weight_grams / 1000.0
     if weight_kg > FIVEPOST_WEIGHT_BASIC_KG:
-        import math
         overload_kg = math.ceil(weight_kg - FIVEPOST_WEIGHT_BASIC_KG)
         price = t["basic_price"] + overload_kg * t["overload_kg_price"]
     else:
@@ -149,6 +156,114 @@ def calculation_tariff(
     }
 
 
+def _zone_tables() -> tuple[list, list, list]:
+    """Тарифы по зонам в виде списков, индекс = номер зоны; неизвестная зона → зона 1 (как в calculation_tariff)."""
+    size = max(FIVEPOST_ZONE_TARIFFS) + 1
+    fallback = FIVEPOST_ZONE_TARIFFS[1]
+    rows = [FIVEPOST_ZONE_TARIFFS.get(z, fallback) for z in range(size)]
+    return (
+        [r["basic_price"] for r in rows],
+        [r["overload_kg_price"] for r in rows],
+        [r["delivery_days"] for r in rows],
+    )
+
+
+def _as_list(value, n: int) -> list:
+    if isinstance(value, (list, tuple)) or (np is not None and isinstance(value, np.ndarray)):
+        if len(value) != n:
+            raise ValueError("Длины массивов не совпадают")
+        return list(value)
+    return [value] * n
+
+
+def _as_array(value, n: int, dtype):
+    arr = np.asarray(value, dtype=dtype)
+    if arr.ndim == 0:
+        return np.full(n, arr, dtype=dtype)
+    if arr.shape != (n,):
+        raise ValueError("Длины массивов не совпадают")
+    return arr
+
+
+def _batch_numpy(zones, weights_grams, amounts, payment_prepaid, return_on_noredeem):
+    z = np.asarray(zones, dtype=np.int64)
+    n = len(z)
+    basic, overload, days = (np.asarray(t) for t in _zone_tables())
+    z = np.where((z >= 0) & (z < len(basic)), z, 1)
+    z = np.where(np.isin(z, list(FIVEPOST_ZONE_TARIFFS)), z, 1)
+    w_kg = _as_array(weights_grams, n, np.float64) / 1000.0
+    amt = _as_array(amounts, n, np.float64)
+    noredeem = _as_array(return_on_noredeem, n, bool)
+    prepaid = _as_array(payment_prepaid, n, bool)
+
+    # Те же операции и в том же порядке, что в calculation_tariff, — результат бит-в-бит
+    price = basic[z].astype(np.float64)
+    over = w_kg > FIVEPOST_WEIGHT_BASIC_KG
+    overload_kg = np.ceil(np.where(over, w_kg - FIVEPOST_WEIGHT_BASIC_KG, 0.0))
+    price = np.where(over, price + overload_kg * overload[z], price)
+    price = np.where(noredeem, price + price * 0.50, price)
+    has_amount = amt > 0
+    price = np.where(has_amount, price + amt * 0.005, price)
+    price = np.where(has_amount & ~prepaid, price + amt * 0.0192, price)
+
+    # Округление до копеек как round(x, 2): rint(x*100)/100 совпадает с ним везде, кроме значений
+    # вблизи половины копейки — их досчитываем round() Python
+    cents = price * 100
+    rounded = np.rint(cents) / 100
+    near_half = np.abs(cents - np.floor(cents) - 0.5) < 1e-6
+    is_float = noredeem | has_amount
+    prices = rounded.tolist()
+    for i in np.flatnonzero(near_half & is_float).tolist():
+        prices[i] = round(float(price[i]), 2)
+    # Без надбавок скалярная функция возвращает int — сохраняем тот же тип
+    for i in np.flatnonzero(~is_float).tolist():
+        prices[i] = int(price[i])
+    return prices, days[z].tolist()
+
+
+def calculation_tariff_batch(
+    zones,
+    weights_grams,
+    amounts=0,
+    payment_prepaid=True,
+    return_on_noredeem=False,
+) -> tuple[list[float], list[int]]:
+    """
+    Пакетный calculation_tariff: массивы зон, весов (г) и оценочных стоимостей за один проход.
+    amounts, payment_prepaid, return_on_noredeem — скаляр (для всех) или массив той же длины.
+    Возвращает (цены, сроки в днях) — совпадают с calculation_tariff поэлементно.
+    С NumPy считается векторно, без него — в цикле по предрасчитанным таблицам зон.
+    """
+    if np is not None:
+        return _batch_numpy(zones, weights_grams, amounts, payment_prepaid, return_on_noredeem)
+
+    zones = [int(z) for z in zones]
+    n = len(zones)
+    weights = _as_list(weights_grams, n)
+    amounts = _as_list(amounts, n)
+    prepaid = _as_list(payment_prepaid, n)
+    noredeem = _as_list(return_on_noredeem, n)
+    basic, overload, days = _zone_tables()
+    zone_idx = [z if z in FIVEPOST_ZONE_TARIFFS else 1 for z in zones]
+    prices = []
+    for i in range(n):
+        zi = zone_idx[i]
+        weight_kg = weights[i] / 1000.0
+        if weight_kg > FIVEPOST_WEIGHT_BASIC_KG:
+            price = basic[zi] + math.ceil(weight_kg - FIVEPOST_WEIGHT_BASIC_KG) * overload[zi]
+        else:
+            price = basic[zi]
+        if noredeem[i]:
+            price += price * 0.50
+        amount = amounts[i]
+        if amount > 0:
+            price += amount * 0.005
+            if not prepaid[i]:
+                price += amount * 0.0192
+        prices.append(round(price, 2))
+    return prices, [days[zi] for zi in zone_idx]
+
+
 def get_delivery_cost(
     city_name: str,
     weight_grams: int,
@@ -165,9 +280,18 @@ def get_delivery_cost(
     return result
 
 
-def _request_post(path: str, body: dict, timeout: int = 20, _retry: bool = True) -> Optional[dict]:
-    """POST с JWT. При 401 — обновление токена и повтор."""
-    token = get_jwt()
+def _request_post(
+    path: str,
+    body: dict,
+    timeout: int = 20,
+    _retry: bool = True,
+    _failed_token: Optional[str] = None,
+) -> Optional[dict]:
+    """POST с JWT. При 401 — обновление токена и повтор. Пока предохранитель открыт — сразу None."""
+    if not _breaker.allow():
+        logger.info("5post API POST %s: предохранитель открыт, запрос пропущен", path)
+        return None
+    token = get_jwt(failed_token=_failed_token)
     if not token:
         return None
     base = _base_url()
@@ -184,25 +308,38 @@ def _request_post(path: str, body: dict, timeout: int = 20, _retry: bool = True)
         },
     )
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return json.loads(resp.read().decode())
+        with perf.span("http"), urllib.request.urlopen(req, timeout=http_timeout(timeout)) as resp:
+            result = json.loads(resp.read().decode())
     except urllib.error.HTTPError as e:
         err_body = e.read().decode(errors="replace")[:500]
         logger.warning("5post API POST %s error %s: %s", path, e.code, err_body)
+        if is_breaker_failure(e):
+            _breaker.record_failure(f"HTTP {e.code}")
+            return None
+        _breaker.record_success()
         if e.code in (401, 403) and _retry:
-            global _fivepost_jwt, _fivepost_jwt_expire
-            _fivepost_jwt = None
-            _fivepost_jwt_expire = 0
-            return _request_post(path, body, timeout, _retry=False)
+            return _request_post(path, body, timeout, _retry=False, _failed_token=token)
         return None
-    except (urllib.error.URLError, json.JSONDecodeError, TimeoutError, OSError) as e:
+    except (urllib.error.URLError, TimeoutError, OSError) as e:
         logger.warning("5post API POST %s error: %s", path, e)
+        if not cut_by_deadline(e):
+            _breaker.record_failure(e)
         return None
+    except json.JSONDecodeError as e:
+        logger.warning("5post API POST %s error: %s", path, e)
+        return None
+    _breaker.record_success()
+    return result
 
 
 def get_pvz_list(page: int = 0, size: int = 500) -> Optional[dict]:
-    """Список ПВЗ (постранично). POST /api/v1/pickuppoints/query."""
-    return _request_post("/api/v1/pickuppoints/query", {"pageNumber": page, "pageSize": size}, timeout=30)
+    """Список ПВЗ (постранично). POST /api/v1/pickuppoints/query. При недоступности API — последняя полученная страница."""
+    resp = _request_post("/api/v1/pickuppoints/query", {"pageNumber": page, "pageSize": size}, timeout=30)
+    if resp:
+        _pvz_pages.set((page, size), resp)
+        return resp
+    note_fallback()
+    return _pvz_pages.get((page, size))
 
 
 def get_pvz_by_city(city_name: str, max_results: int = 50) -> list:
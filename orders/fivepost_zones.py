@@ -0,0 +1,220 @@
+"""
+Определение тарифной зоны 5post по названию города.
+
+Таблица город → зона собирается один раз на процесс из FIVEPOST_CITY_ZONE_FILE (JSON или CSV)
+и FIVEPOST_CITY_ZONE (перекрывает файл). Поиск:
+1) точное совпадение нормализованного названия (словарь);
+2) название из таблицы внутри строки («г. Москва, Россия») — автомат Ахо-Корасик,
+   только целые слова, побеждает самое длинное совпадение («Нижний Новгород», а не «Новгород»);
+3) строка — начало названия из таблицы (ввод «Новосиб»): самое короткое продолжение в боре;
+4) зона __default__.
+"""
+import csv
+import json
+import logging
+import re
+import threading
+from collections import deque
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY = "__default__"
+# Не достраивать названия по слишком короткому вводу («Н» → случайный город)
+MIN_PREFIX_LEN = 3
+
+_CITY_PREFIX_RE = re.compile(r"^(?:г\.|г\s|город\s)\s*")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_city(name: str) -> str:
+    """Нижний регистр, ё → е, без «г.»/«город» в начале, одиночные пробелы."""
+    s = (name or "").strip().lower().replace("ё", "е")
+    s = _CITY_PREFIX_RE.sub("", s)
+    return _SPACES_RE.sub(" ", s).strip()
+
+
+class ZoneResolver:
+    """Скомпилированная таблица город → зона: словарь + бор с суффиксными ссылками (Ахо-Корасик)."""
+
+    def __init__(self, mapping: dict, default: int = 1):
+        self.default = default
+        self.exact: dict[str, int] = {}
+        for name, zone in mapping.items():
+            if name == DEFAULT_KEY:
+                continue
+            key = normalize_city(name)
+            try:
+                zone = int(zone)
+            except (TypeError, ValueError):
+                continue
+            if key:
+                self.exact[key] = zone
+        self._build()
+
+    def _build(self) -> None:
+        # Узел i: goto[i] — переходы, fail[i] — суффиксная ссылка,
+        # out[i] — (длина, зона) названий, оканчивающихся в узле, по убыванию длины,
+        # shortest[i] — самое короткое название в поддереве (для достраивания префикса)
+        goto: list[dict[str, int]] = [{}]
+        terminal: list[Optional[tuple[int, int]]] = [None]
+        for name, zone in self.exact.items():
+            node = 0
+            for ch in name:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    terminal.append(None)
+                node = nxt
+            terminal[node] = (len(name), zone)
+
+        fail = [0] * len(goto)
+        out: list[tuple[tuple[int, int], ...]] = [()] * len(goto)
+        order = []
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0) if goto[f].get(ch) != child else 0
+                queue.append(child)
+        for node in order:
+            own = (terminal[node],) if terminal[node] else ()
+            out[node] = own + out[fail[node]]
+
+        shortest: list[Optional[tuple[int, int]]] = list(terminal)
+        for node in reversed(order):
+            for child in goto[node].values():
+                s = shortest[child]
+                if s is not None and (shortest[node] is None or s[0] < shortest[node][0]):
+                    shortest[node] = s
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        self._shortest = shortest
+
+    def _find_longest(self, text: str) -> Optional[int]:
+        """Самое длинное название таблицы, входящее в text целыми словами (при равенстве — левее)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = None
+        best_zone = None
+        state = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, zone in out[state]:
+                start = i - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (i + 1 == n or not text[i + 1].isalnum()):
+                    rank = (length, -start)
+                    if best is None or rank > best:
+                        best, best_zone = rank, zone
+                    break
+        return best_zone
+
+    def _complete_prefix(self, text: str) -> Optional[int]:
+        if len(text) < MIN_PREFIX_LEN:
+            return None
+        node = 0
+        for ch in text:
+            node = self._goto[node].get(ch)
+            if node is None:
+                return None
+        s = self._shortest[node]
+        return s[1] if s else None
+
+    def resolve(self, city_name: str) -> int:
+        key = normalize_city(city_name)
+        if not key:
+            return self.default
+        zone = self.exact.get(key)
+        if zone is not None:
+            return zone
+        zone = self._find_longest(key)
+        if zone is not None:
+            return zone
+        zone = self._complete_prefix(key)
+        if zone is not None:
+            return zone
+        return self.default
+
+
+def _rows_to_mapping(rows: Iterable[list]) -> dict:
+    mapping = {}
+    for row in rows:
+        if len(row) < 2 or not row[0].strip() or row[0].lstrip().startswith("#"):
+            continue
+        mapping[row[0].strip()] = row[1].strip()
+    return mapping
+
+
+def load_zone_file(path: str) -> dict:
+    """
+    Таблица город → зона из файла.
+    JSON: {"Москва": 1, ...}; CSV: «город,зона» или «город;зона» по строке (заголовок без числа пропускается).
+    """
+    with open(path, encoding="utf-8-sig") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        sample = f.read(4096)
+        f.seek(0)
+        delimiter = ";" if sample.count(";") > sample.count(",") else ","
+        return _rows_to_mapping(csv.reader(f, delimiter=delimiter))
+
+
+def _settings_mapping() -> dict:
+    mapping = {}
+    path = getattr(settings, "FIVEPOST_CITY_ZONE_FILE", None)
+    if path:
+        try:
+            mapping.update(load_zone_file(str(path)))
+        except (OSError, ValueError, csv.Error) as e:
+            logger.warning("5post: не удалось прочитать таблицу зон %s: %s", path, e)
+    mapping.update(getattr(settings, "FIVEPOST_CITY_ZONE", None) or {})
+    return mapping
+
+
+def build_resolver(mapping: dict) -> ZoneResolver:
+    try:
+        default = int(mapping.get(DEFAULT_KEY, 1))
+    except (TypeError, ValueError):
+        default = 1
+    return ZoneResolver(mapping, default=default)
+
+
+_resolver: Optional[ZoneResolver] = None
+_resolver_source: Optional[tuple] = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> ZoneResolver:
+    """Резолвер из настроек; собирается один раз (пересобирается, если настройки подменили, например в тестах)."""
+    global _resolver, _resolver_source
+    source = (id(getattr(settings, "FIVEPOST_CITY_ZONE", None)), getattr(settings, "FIVEPOST_CITY_ZONE_FILE", None))
+    resolver = _resolver
+    if resolver is not None and _resolver_source == source:
+        return resolver
+    with _resolver_lock:
+        if _resolver is None or _resolver_source != source:
+            _resolver = build_resolver(_settings_mapping())
+            _resolver_source = source
+            logger.info("5post: таблица зон собрана, городов: %s", len(_resolver.exact))
+        return _resolver
+
+
+def reset_resolver() -> None:
+    """Пересобрать таблицу зон при следующем запросе (после замены файла)."""
+    global _resolver, _resolver_source
+    with _resolver_lock:
+        _resolver = None
+        _resolver_source = None
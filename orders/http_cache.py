@@ -0,0 +1,130 @@
+"""
+HTTP-кэширование публичных GET API (подсказки городов, ПВЗ, тарифы).
+
+Декоратор api_cache(source):
+- ответ 200 сохраняется в кэше Django по (source, параметры запроса) на max-age источника;
+- отдаются ETag (хэш тела), Last-Modified (время расчёта) и Cache-Control: public, max-age=<остаток>,
+  поэтому браузер и nginx (proxy_cache) повторно не обращаются к Django;
+- If-None-Match / If-Modified-Since → 304 без тела.
+Не кэшируются ошибки и ответы, где представление само выставило Cache-Control (например, пустой
+результат при недоступном API — см. add_never_cache_headers), а также ответы на запасных данных
+клиентов ТК (последний удачный ответ, просроченный тариф — circuit_breaker.note_fallback): им
+выставляется no-store.
+max-age по источникам — API_CACHE_MAX_AGE в settings (0 — кэш выключен).
+
+Ответ одинаков для всех посетителей, но SessionMiddleware (SESSION_SAVE_EVERY_REQUEST) добавил бы
+к нему Set-Cookie сессии и Vary: Cookie — такой ответ nginx не кэширует, а public рядом с cookie
+небезопасен. ApiCacheMiddleware (в MIDDLEWARE перед SessionMiddleware) убирает с таких ответов cookie
+сессии и CSRF и Vary: Cookie; если остались другие cookie — ответ становится private.
+Server-Timing на таких ответах не выставляется (store.perf): он был бы закэширован для всех.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    add_never_cache_headers,
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from .circuit_breaker import fallback_used, reset_fallback
+
+# Сколько секунд данные источника можно считать свежими
+DEFAULT_MAX_AGE = {
+    "cities": 600,  # справочник City, как CITY_SUGGEST_TTL
+    "cdek_cities": 86400,  # справочник городов СДЭК меняется редко
+    "cdek_pvz": 3600,
+    "fivepost_pvz": 3600,
+    "fivepost_cost": 3600,  # тариф по зонам из настроек
+    "russianpost_cost": 43200,  # как RUSSIANPOST_TARIFF_CACHE_TTL
+}
+
+
+def max_age_for(source: str) -> int:
+    overrides = getattr(settings, "API_CACHE_MAX_AGE", None) or {}
+    try:
+        return max(0, int(overrides.get(source, DEFAULT_MAX_AGE.get(source, 0))))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_AGE.get(source, 0)
+
+
+def _cache_key(source: str, request) -> str:
+    # Путь в ключе: один источник могут отдавать разные эндпоинты в разном формате
+    query = request.path + "?" + urlencode(sorted(request.GET.lists()), doseq=True)
+    return f"api_cache:{source}:{hashlib.md5(query.encode()).hexdigest()}"
+
+
+def api_cache(source: str):
+    """Кэширование GET API по политике источника source (см. DEFAULT_MAX_AGE)."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            max_age = max_age_for(source)
+            if request.method not in ("GET", "HEAD") or max_age <= 0:
+                return view_func(request, *args, **kwargs)
+            key = _cache_key(source, request)
+            entry = cache.get(key)
+            if entry is None:
+                reset_fallback()
+                response = view_func(request, *args, **kwargs)
+                if fallback_used() and not response.has_header("Cache-Control"):
+                    add_never_cache_headers(response)
+                if response.status_code != 200 or response.streaming or response.has_header("Cache-Control"):
+                    return response
+                entry = {
+                    "content": response.content,
+                    "content_type": response["Content-Type"],
+                    "etag": quote_etag(hashlib.md5(response.content).hexdigest()),
+                    "last_modified": int(time.time()),
+                }
+                cache.set(key, entry, max_age)
+
+            remaining = max(0, max_age - (int(time.time()) - entry["last_modified"]))
+            response = HttpResponse(entry["content"], content_type=entry["content_type"])
+            response["ETag"] = entry["etag"]
+            response["Last-Modified"] = http_date(entry["last_modified"])
+            patch_cache_control(response, public=True, max_age=remaining)
+            patch_vary_headers(response, ("Accept-Encoding",))
+            response = get_conditional_response(
+                request,
+                etag=entry["etag"],
+                last_modified=entry["last_modified"],
+                response=response,
+            )
+            response.api_cache_public = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class ApiCacheMiddleware:
+    """Ответы api_cache — без cookie сессии/CSRF и Vary: Cookie (см. описание модуля)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not getattr(response, "api_cache_public", False):
+            return response
+        for name in (settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME):
+            response.cookies.pop(name, None)
+        if response.has_header("Vary"):
+            vary = [v.strip() for v in response["Vary"].split(",") if v.strip().lower() != "cookie"]
+            if vary:
+                response["Vary"] = ", ".join(vary)
+            else:
+                del response["Vary"]
+        if response.cookies:
+            patch_cache_control(response, private=True)
+        return response
@@ -0,0 +1,55 @@
+"""
+Общий срок для HTTP-запросов к перевозчикам в пределах одного расчёта (orders.delivery_quotes).
+
+delivery_quotes выставляет срок потоку пула (deadline), клиенты ТК берут таймаут urlopen через
+http_timeout(обычный_таймаут): не больше, чем осталось до срока. Без срока — обычный таймаут.
+Так поток пула освобождается к дедлайну расчёта, а не через полный таймаут перевозчика.
+Таймаут урезанного сроком запроса — не сбой перевозчика: клиенты проверяют cut_by_deadline(e)
+и не засчитывают его предохранителю (иначе загруженные оформления открывали бы его здоровому API).
+"""
+import threading
+import time
+import urllib.error
+from contextlib import contextmanager
+from typing import Optional
+
+MIN_TIMEOUT = 0.1  # сек.: urlopen с нулевым таймаутом не ждёт вовсе
+
+_local = threading.local()
+
+
+@contextmanager
+def deadline(at: Optional[float]):
+    """Срок (time.monotonic()) для запросов в этом потоке; None — без срока."""
+    previous = getattr(_local, "at", None)
+    _local.at = at
+    try:
+        yield
+    finally:
+        _local.at = previous
+
+
+def remaining() -> Optional[float]:
+    """Секунд до срока (может быть ≤ 0) или None, если срока нет."""
+    at = getattr(_local, "at", None)
+    return None if at is None else at - time.monotonic()
+
+
+def http_timeout(default: float) -> float:
+    """Таймаут для urlopen; запоминает в потоке, урезан ли он сроком (см. cut_by_deadline)."""
+    left = remaining()
+    _local.cut = left is not None and left < default
+    if not _local.cut:
+        return default
+    return max(MIN_TIMEOUT, left)
+
+
+def is_timeout(exc: BaseException) -> bool:
+    if isinstance(exc, urllib.error.URLError) and not isinstance(exc, urllib.error.HTTPError):
+        exc = exc.reason if isinstance(exc.reason, BaseException) else exc
+    return isinstance(exc, TimeoutError)
+
+
+def cut_by_deadline(exc: BaseException) -> bool:
+    """Ошибка — таймаут последнего запроса потока, чей таймаут урезан сроком расчёта, а не обычный таймаут ТК."""
+    return getattr(_local, "cut", False) and is_timeout(exc)
@@ -0,0 +1,9 @@
+"""Фоновые задачи заказов (выполняет jobs: python manage.py run_jobs)."""
+from jobs.registry import register
+
+from .export_excel import export_pending_to_excel
+
+
+@register("orders.sync_queue_excel", "Выгрузка очереди заказов в Excel")
+def sync_queue_excel(job, progress):
+    return export_pending_to_excel(progress)
@@ -0,0 +1,154 @@
+"""
+Микробенчмарки 5post.
+
+1) Определение зоны: старый перебор маппинга с подстроками против ZoneResolver.
+   Таблица — из --file (JSON/CSV, как FIVEPOST_CITY_ZONE_FILE) или синтетическая на --cities городов.
+   Запросы: точные названия, «г. Город», «Город, область», начало названия, неизвестные города.
+2) Тариф: calculation_tariff в цикле против calculation_tariff_batch на --parcels посылках
+   (с проверкой, что результаты совпадают).
+
+Использование:
+  python manage.py bench_fivepost --cities 5000
+  python manage.py bench_fivepost --file deploy_data/fivepost_zones.csv --queries 20000
+  python manage.py bench_fivepost --parcels 200000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import fivepost_client
+from orders.fivepost_client import FIVEPOST_ZONE_TARIFFS, calculation_tariff, calculation_tariff_batch
+from orders.fivepost_zones import DEFAULT_KEY, build_resolver, load_zone_file
+
+SYLLABLES = ("но", "во", "си", "бир", "ск", "ка", "зань", "ом", "ту", "ла", "ря", "зань", "пер", "мь", "са", "ра", "тов", "ур", "ал", "ярос", "лавль", "ки", "ров")
+
+
+def legacy_zone_for_city(mapping: dict, city_name: str) -> int:
+    """Прежний алгоритм get_zone_for_city: перебор всего маппинга, первое совпадение подстроки в любую сторону."""
+    key = (city_name or "").strip().lower()
+    if not key:
+        return 1
+    for name, zone in mapping.items():
+        if name == DEFAULT_KEY:
+            continue
+        if name.lower() in key or key in name.lower():
+            try:
+                return int(zone)
+            except (TypeError, ValueError):
+                pass
+    try:
+        return int(mapping.get(DEFAULT_KEY, 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def synthetic_mapping(count: int, rng: random.Random) -> dict:
+    mapping = {}
+    while len(mapping) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        if rng.random() < 0.15:
+            name = f"{rng.choice(('Верхний', 'Нижний', 'Старый', 'Новый'))} {name}"
+        mapping[name] = rng.randint(1, 13)
+    mapping[DEFAULT_KEY] = 1
+    return mapping
+
+
+def make_queries(names: list, count: int, rng: random.Random) -> list:
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(name)
+        elif kind < 0.6:
+            queries.append(f"г. {name}")
+        elif kind < 0.75:
+            queries.append(f"{name}, {rng.choice(('область', 'край', 'Россия'))}")
+        elif kind < 0.9:
+            queries.append(name[: max(3, len(name) - 3)])
+        else:
+            queries.append(f"Неизвестный{rng.randint(1, 10**6)}")
+    return queries
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк определения тарифной зоны 5post по городу"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None, help="Таблица город → зона (JSON или CSV)")
+        parser.add_argument("--cities", type=int, default=3000, help="Размер синтетической таблицы (без --file)")
+        parser.add_argument("--queries", type=int, default=10000, help="Количество запросов")
+        parser.add_argument("--parcels", type=int, default=100000, help="Посылок для бенчмарка тарифа (0 — пропустить)")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self._bench_zones(rng, options)
+        if options["parcels"] > 0:
+            self._bench_tariffs(rng, options["parcels"])
+
+    def _bench_zones(self, rng, options):
+        if options["file"]:
+            try:
+                mapping = load_zone_file(options["file"])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Не удалось прочитать {options['file']}: {e}")
+        else:
+            mapping = synthetic_mapping(max(1, options["cities"]), rng)
+        names = [n for n in mapping if n != DEFAULT_KEY]
+        if not names:
+            raise CommandError("Таблица зон пуста.")
+        queries = make_queries(names, max(1, options["queries"]), rng)
+
+        t0 = time.perf_counter()
+        resolver = build_resolver(mapping)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        new = [resolver.resolve(q) for q in queries]
+        new_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        old = [legacy_zone_for_city(mapping, q) for q in queries]
+        old_s = time.perf_counter() - t0
+
+        differ = sum(1 for a, b in zip(new, old) if a != b)
+        n = len(queries)
+        self.stdout.write(f"Городов: {len(names)}, запросов: {n}")
+        self.stdout.write(f"Сборка ZoneResolver: {build_ms:.1f} мс")
+        self.stdout.write(f"Перебор (старый):   {old_s * 1e6 / n:.1f} мкс/запрос, всего {old_s * 1000:.0f} мс")
+        self.stdout.write(f"ZoneResolver:       {new_s * 1e6 / n:.1f} мкс/запрос, всего {new_s * 1000:.0f} мс")
+        if new_s > 0:
+            self.stdout.write(self.style.SUCCESS(f"Ускорение: x{old_s / new_s:.0f}"))
+        self.stdout.write(f"Разные ответы: {differ} ({differ * 100 / n:.1f}%) — старый алгоритм берёт первое совпадение подстроки")
+
+    def _bench_tariffs(self, rng, count):
+        zones = [rng.choice(list(FIVEPOST_ZONE_TARIFFS)) for _ in range(count)]
+        weights = [rng.randint(100, 25000) for _ in range(count)]
+        amounts = [rng.choice((0, round(rng.uniform(100, 50000), 2))) for _ in range(count)]
+        prepaid = [rng.random() < 0.7 for _ in range(count)]
+
+        t0 = time.perf_counter()
+        scalar = [calculation_tariff(z, w, a, p) for z, w, a, p in zip(zones, weights, amounts, prepaid)]
+        scalar_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        prices, days = calculation_tariff_batch(zones, weights, amounts, prepaid)
+        batch_s = time.perf_counter() - t0
+
+        mismatch = sum(
+            1 for r, p, d in zip(scalar, prices, days)
+            if r["price"] != p or r["delivery_days"] != d
+        )
+        engine = "NumPy" if fivepost_client.np is not None else "Python"
+        self.stdout.write("")
+        self.stdout.write(f"Тариф 5post, посылок: {count}")
+        self.stdout.write(f"calculation_tariff (цикл):        {scalar_s * 1000:.0f} мс")
+        self.stdout.write(f"calculation_tariff_batch ({engine}): {batch_s * 1000:.0f} мс")
+        if batch_s > 0:
+            self.stdout.write(self.style.SUCCESS(f"Ускорение: x{scalar_s / batch_s:.1f}"))
+        if mismatch:
+            self.stdout.write(self.style.ERROR(f"Расхождений с calculation_tariff: {mismatch}"))
+        else:
+            self.stdout.write("Результаты совпадают с calculation_tariff.")
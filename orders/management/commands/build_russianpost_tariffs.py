@@ -0,0 +1,116 @@
+"""
+Предрасчёт таблицы тарифов Почты России для самых частых индексов получателей.
+
+Берёт индексы из заказов (Order.russianpost_to_index) и/или из параметра --index,
+для каждого префикса индекса запрашивает tariff.pochta.ru по всем ступеням веса (500 г) с одной ценностью
+(--sumoc, по умолчанию SUMOC_REFERENCE) и сохраняет JSON, который подхватывает russianpost_client
+(RUSSIANPOST_TARIFF_TABLE). В таблице — пересылка без платы за ценность и доля этой платы (split_tariff):
+плата для ценности корзины считается при расчёте.
+
+Использование:
+  python manage.py build_russianpost_tariffs --top 50
+  python manage.py build_russianpost_tariffs --index 190000 --index 630000 -o deploy_data/russianpost_tariffs.json
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from orders.models import Order
+from orders.russianpost_client import (
+    SUMOC_REFERENCE,
+    WEIGHT_BRACKETS,
+    _object_code,
+    _prefix_len,
+    _table_key,
+    fetch_tariff,
+    split_tariff,
+)
+
+
+class Command(BaseCommand):
+    help = "Предрасчитать таблицу тарифов Почты России для частых индексов получателей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=50, help="Сколько самых частых индексов из заказов взять (по умолчанию 50)")
+        parser.add_argument("--index", action="append", default=[], help="Дополнительный индекс получателя (можно несколько раз)")
+        parser.add_argument("--sumoc", type=float, default=SUMOC_REFERENCE, help=f"Ценность для запросов, руб. (по умолчанию {SUMOC_REFERENCE})")
+        parser.add_argument("--sleep", type=float, default=0.2, help="Пауза между запросами к API, сек.")
+        parser.add_argument("-o", "--output", default=None, help="Путь к JSON (по умолчанию RUSSIANPOST_TARIFF_TABLE)")
+
+    def handle(self, *args, **options):
+        from_index = getattr(settings, "RUSSIANPOST_SENDER_INDEX", None)
+        if not from_index:
+            raise CommandError("Не настроен RUSSIANPOST_SENDER_INDEX в .env.")
+        out_path = options["output"] or getattr(settings, "RUSSIANPOST_TARIFF_TABLE", None)
+        if not out_path:
+            raise CommandError("Укажите -o/--output или RUSSIANPOST_TARIFF_TABLE в .env.")
+        out_path = str(out_path)
+
+        indexes = []
+        for raw in options["index"]:
+            raw = raw.strip()
+            if len(raw) != 6 or not raw.isdigit():
+                raise CommandError(f"Неверный индекс: {raw}")
+            indexes.append(raw)
+        top = max(0, options["top"])
+        if top:
+            frequent = (
+                Order.objects.exclude(russianpost_to_index="")
+                .values("russianpost_to_index")
+                .annotate(c=Count("id"))
+                .order_by("-c")[:top]
+            )
+            indexes.extend(r["russianpost_to_index"] for r in frequent)
+
+        # Один представитель на префикс: тариф в кэше считается одинаковым для всего префикса
+        prefix_len = _prefix_len()
+        by_prefix = {}
+        for idx in indexes:
+            if len(idx) == 6 and idx.isdigit():
+                by_prefix.setdefault(idx[:prefix_len], int(idx))
+        if not by_prefix:
+            self.stdout.write("Нет индексов для расчёта.")
+            return
+
+        obj = _object_code()
+        sumoc = max(0.01, options["sumoc"])
+        total = len(by_prefix) * len(WEIGHT_BRACKETS)
+        self.stdout.write(f"Префиксов: {len(by_prefix)}, запросов к API: {total}")
+
+        tariffs = {}
+        failed = 0
+        done = 0
+        t0 = time.perf_counter()
+        for prefix, to_index in sorted(by_prefix.items()):
+            for weight in WEIGHT_BRACKETS:
+                result = fetch_tariff(int(from_index), to_index, weight, sumoc, obj)
+                done += 1
+                if result is None:
+                    failed += 1
+                else:
+                    tariffs[_table_key(prefix, weight)] = split_tariff(result, sumoc)
+                if options["sleep"] > 0:
+                    time.sleep(options["sleep"])
+            self.stdout.write(f"  {prefix}xxx ({to_index}): {done}/{total}")
+
+        out_dir = os.path.dirname(out_path)
+        if out_dir and not os.path.isdir(out_dir):
+            os.makedirs(out_dir, exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "from_index": int(from_index),
+                "object": obj,
+                "prefix_len": prefix_len,
+                "generated_at": timezone.now().isoformat(),
+                "tariffs": tariffs,
+            }, f, ensure_ascii=False)
+
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(
+            f"Таблица записана: {out_path} ({len(tariffs)} тарифов, ошибок {failed}, {elapsed:.0f} с)"
+        ))
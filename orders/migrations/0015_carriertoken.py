@@ -0,0 +1,27 @@
+# Общий кэш токенов API перевозчиков (СДЭК, 5post) для всех воркеров
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0014_order_russianpost_to_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CarrierToken",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("carrier", models.CharField(max_length=20, unique=True, verbose_name="Перевозчик")),
+                ("token", models.TextField(blank=True, verbose_name="Токен")),
+                ("expires_at", models.DateTimeField(blank=True, null=True, verbose_name="Действует до")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="Обновлён")),
+            ],
+            options={
+                "verbose_name": "Токен перевозчика",
+                "verbose_name_plural": "Токены перевозчиков",
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Триграммный GIN-индекс по UPPER(name) для подсказок городов (icontains/istartswith без полного скана).
+# Только PostgreSQL: на других СУБД миграция ничего не делает.
+
+from django.db import migrations
+
+
+def create_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS orders_city_name_upper_trgm "
+        "ON orders_city USING gin (UPPER(name) gin_trgm_ops);"
+    )
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS orders_city_name_upper_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0015_carriertoken"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
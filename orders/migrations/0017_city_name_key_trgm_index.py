@@ -0,0 +1,36 @@
+# Подсказки городов из БД сравнивают название без учёта регистра и ё/е (orders.city_suggest):
+# триграммный индекс по REPLACE(UPPER(name), 'Ё', 'Е') вместо индекса по UPPER(name).
+# Только PostgreSQL: на других СУБД миграция ничего не делает.
+
+from django.db import migrations
+
+
+def create_key_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS orders_city_name_upper_trgm;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS orders_city_name_key_trgm "
+        "ON orders_city USING gin (REPLACE(UPPER(name), 'Ё', 'Е') gin_trgm_ops);"
+    )
+
+
+def drop_key_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS orders_city_name_key_trgm;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS orders_city_name_upper_trgm "
+        "ON orders_city USING gin (UPPER(name) gin_trgm_ops);"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0016_city_name_trgm_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_key_index, drop_key_index),
+    ]
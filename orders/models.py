@@ -250,3 +250,21 @@ class City(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class CarrierToken(models.Model):
+    """
+    Общий для всех воркеров токен API перевозчика (OAuth СДЭК, JWT 5post).
+    Строка блокируется select_for_update на время обновления — токен получает один воркер.
+    """
+    carrier = models.CharField("Перевозчик", max_length=20, unique=True)
+    token = models.TextField("Токен", blank=True)
+    expires_at = models.DateTimeField("Действует до", null=True, blank=True)
+    updated_at = models.DateTimeField("Обновлён", auto_now=True)
+
+    class Meta:
+        verbose_name = "Токен перевозчика"
+        verbose_name_plural = "Токены перевозчиков"
+
+    def __str__(self):
+        return self.carrier
@@ -2,43 +2,241 @@
 Клиент тарификатора Почты России (tariff.pochta.ru).
 Расчёт стоимости доставки по индексам отправителя и получателя.
 Документация: https://www.pochta.ru/support/business/api (блокируется по IP), описание параметров — в ответах API.
+
+Кэш тарифов: ключ — (индекс отправителя, префикс индекса получателя, ступень веса, объект), без ценности.
+Вес округляется вверх до ступени самой Почты (каждые полные и неполные 500 г): цена внутри ступени
+одна, и запрос к API идёт с её верхней границей. Плата за объявленную ценность — процент от суммы без
+ступеней: в кэше тариф хранится как пересылка без этой платы (base) и её доля от ценности (rate, из поля
+cover ответа), цена для точной ценности корзины — base + rate × ценность. Так один тариф годится для
+любой суммы заказа. Та же запись — в заранее рассчитанной таблице (RUSSIANPOST_TARIFF_TABLE,
+команда build_russianpost_tariffs). Если в ответе API нет cover, запись годится только для той же ценности.
+Пока API недоступен (предохранитель открыт), отдаётся просроченный тариф из кэша с пометкой stale —
+такие ответы не кэшируются в HTTP (circuit_breaker.note_fallback).
 """
 import json
 import logging
+import threading
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
+from bisect import bisect_left
+from collections import OrderedDict
 from typing import Optional
 
 from django.conf import settings
 
+from store import perf
+
+from .circuit_breaker import get_breaker, http_probe, is_breaker_failure, note_fallback
+from .http_deadline import cut_by_deadline, http_timeout
+
 logger = logging.getLogger(__name__)
 
 TARIFF_URL = "https://tariff.pochta.ru/tariff/v1/calculate"
 # Код объекта: 4040 = посылка с объявленной ценностью и наложенным платежом (требует sumoc)
 OBJECT_DEFAULT = 4040
 
+# Ступени веса (г) — как в тарифе Почты: за каждые полные и неполные 500 г, до 20 кг
+WEIGHT_STEP = 500
+MAX_WEIGHT = 20000
+WEIGHT_BRACKETS = tuple(range(WEIGHT_STEP, MAX_WEIGHT + 1, WEIGHT_STEP))
+# Объявленная ценность (руб.), с которой build_russianpost_tariffs запрашивает тарифы для таблицы
+SUMOC_REFERENCE = 1000
 
-def get_delivery_cost(
+_TARIFF_CACHE_TTL = 12 * 3600  # 12 часов
+_TARIFF_CACHE_MAX = 5000
+
+_tariff_cache: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+_tariff_cache_lock = threading.Lock()
+_tariff_table: Optional[dict] = None
+_tariff_table_path: Optional[str] = None
+
+
+def _probe() -> bool:
+    return http_probe(getattr(settings, "RUSSIANPOST_TARIFF_URL", None) or TARIFF_URL)
+
+
+_breaker = get_breaker("russianpost", probe=_probe)
+
+
+def _weight_step(weight_grams: int) -> int:
+    """Верхняя граница ступени веса Почты, в которую попадает weight_grams."""
+    i = bisect_left(WEIGHT_BRACKETS, max(1, int(weight_grams)))
+    return WEIGHT_BRACKETS[min(i, len(WEIGHT_BRACKETS) - 1)]
+
+
+def _sumoc(sumoc_rub: float) -> float:
+    return round(max(0.01, float(sumoc_rub)), 2)
+
+
+def _prefix_len() -> int:
+    try:
+        n = int(getattr(settings, "RUSSIANPOST_INDEX_PREFIX_LEN", 3) or 3)
+    except (TypeError, ValueError):
+        n = 3
+    return max(1, min(n, 6))
+
+
+def _object_code(object_code: Optional[int] = None) -> int:
+    return object_code if object_code is not None else getattr(settings, "RUSSIANPOST_OBJECT", None) or OBJECT_DEFAULT
+
+
+def tariff_cache_key(
     from_index: int,
     to_index: int,
     weight_grams: int,
-    sumoc_rub: float = 100.0,
     object_code: Optional[int] = None,
-) -> Optional[dict]:
+) -> tuple:
+    """Ключ кэша: (from, префикс to, ступень веса, объект) — ценность не входит, см. split_tariff."""
+    return (
+        int(from_index),
+        str(to_index)[:_prefix_len()],
+        _weight_step(weight_grams),
+        _object_code(object_code),
+    )
+
+
+def _table_key(prefix: str, weight_bracket: int) -> str:
+    return f"{prefix}:{weight_bracket}"
+
+
+def split_tariff(result: dict, sumoc_rub: float) -> dict:
     """
-    Расчёт стоимости доставки Почтой России через tariff.pochta.ru.
-    from_index, to_index — 6-значные индексы; weight_grams — вес в граммах;
-    sumoc_rub — объявленная ценность в руб. (для объекта 4040 минимум 0.01).
-    Возвращает {"price": float, "delivery_days": int | None, "name": str} или None.
+    Тариф API (fetch_tariff) → запись кэша и таблицы: {"base", "rate", "delivery_days", "name"},
+    base — цена без платы за ценность, rate — плата за рубль ценности. Без cover в ответе —
+    {"base": цена, "rate": None, "sumoc": ценность}: запись только для этой ценности.
     """
-    if not (100000 <= from_index <= 999999 and 100000 <= to_index <= 999999):
-        logger.warning("Russian Post: неверный формат индексов from=%s to=%s", from_index, to_index)
+    entry = {"delivery_days": result.get("delivery_days"), "name": result.get("name") or "Почта России"}
+    cover = result.get("cover")
+    if cover is None:
+        entry.update(base=result["price"], rate=None, sumoc=_sumoc(sumoc_rub))
+    else:
+        entry.update(base=round(result["price"] - cover, 2), rate=cover / _sumoc(sumoc_rub))
+    return entry
+
+
+def price_for(entry: dict, sumoc_rub: float) -> Optional[dict]:
+    """Цена записи кэша для ценности sumoc_rub или None, если запись для неё не годится."""
+    sumoc = _sumoc(sumoc_rub)
+    if entry.get("rate") is None:
+        if entry.get("sumoc") is None or _sumoc(entry["sumoc"]) != sumoc:
+            return None
+        price = entry["base"]
+    else:
+        price = entry["base"] + entry["rate"] * sumoc
+    return {"price": round(price, 2), "delivery_days": entry.get("delivery_days"), "name": entry.get("name") or "Почта России"}
+
+
+def _cache_ttl() -> int:
+    try:
+        return int(getattr(settings, "RUSSIANPOST_TARIFF_CACHE_TTL", _TARIFF_CACHE_TTL))
+    except (TypeError, ValueError):
+        return _TARIFF_CACHE_TTL
+
+
+def _cache_get(key: tuple, allow_stale: bool = False) -> Optional[dict]:
+    """Тариф из кэша. Просроченные записи не удаляются (вытесняются по LRU): allow_stale=True отдаёт и их."""
+    now = time.time()
+    with _tariff_cache_lock:
+        entry = _tariff_cache.get(key)
+        if entry is None:
+            return None
+        expire, value = entry
+        if now >= expire and not allow_stale:
+            return None
+        _tariff_cache.move_to_end(key)
+        return dict(value)
+
+
+def _cache_set(key: tuple, value: dict) -> None:
+    ttl = _cache_ttl()
+    if ttl <= 0:
+        return
+    with _tariff_cache_lock:
+        _tariff_cache[key] = (time.time() + ttl, dict(value))
+        _tariff_cache.move_to_end(key)
+        while len(_tariff_cache) > _TARIFF_CACHE_MAX:
+            _tariff_cache.popitem(last=False)
+
+
+def clear_tariff_cache() -> None:
+    """Сбросить кэш тарифов и перечитать таблицу при следующем запросе."""
+    global _tariff_table, _tariff_table_path
+    with _tariff_cache_lock:
+        _tariff_cache.clear()
+        _tariff_table = None
+        _tariff_table_path = None
+
+
+def _load_tariff_table() -> dict:
+    """
+    Заранее рассчитанная таблица тарифов (JSON, см. build_russianpost_tariffs).
+    Формат: {"from_index": 101000, "object": 4040, "tariffs": {"190:1000": {"base": ..., "rate": ..., ...}}}.
+    Загружается один раз на процесс; при ошибке чтения — пустая таблица.
+    """
+    global _tariff_table, _tariff_table_path
+    path = getattr(settings, "RUSSIANPOST_TARIFF_TABLE", None)
+    if not path:
+        return {}
+    path = str(path)
+    if _tariff_table is not None and _tariff_table_path == path:
+        return _tariff_table
+    table = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        if not isinstance(table, dict):
+            table = {}
+    except FileNotFoundError:
+        logger.info("Russian Post: таблица тарифов %s не найдена", path)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning("Russian Post: не удалось прочитать таблицу тарифов %s: %s", path, e)
+    _tariff_table = table
+    _tariff_table_path = path
+    return table
+
+
+def _table_get(key: tuple) -> Optional[dict]:
+    table = _load_tariff_table()
+    tariffs = table.get("tariffs")
+    if not tariffs:
+        return None
+    from_index, prefix, weight_bracket, obj = key
+    try:
+        if int(table.get("from_index") or 0) != from_index or int(table.get("object") or OBJECT_DEFAULT) != obj:
+            return None
+        if int(table.get("prefix_len") or len(prefix)) != len(prefix):
+            return None
+    except (TypeError, ValueError):
+        return None
+    value = tariffs.get(_table_key(prefix, weight_bracket))
+    if not isinstance(value, dict) or value.get("base") is None:
         return None
-    weight_grams = max(1, min(weight_grams, 20000))
-    sumoc_rub = max(0.01, float(sumoc_rub))
-    obj = object_code if object_code is not None else getattr(settings, "RUSSIANPOST_OBJECT", None) or OBJECT_DEFAULT
+    try:
+        return {
+            "base": float(value["base"]),
+            "rate": float(value["rate"]) if value.get("rate") is not None else None,
+            "sumoc": float(value["sumoc"]) if value.get("sumoc") is not None else None,
+            "delivery_days": int(value["delivery_days"]) if value.get("delivery_days") is not None else None,
+            "name": value.get("name") or "Почта России",
+        }
+    except (TypeError, ValueError):
+        return None
+
 
+def fetch_tariff(
+    from_index: int,
+    to_index: int,
+    weight_grams: int,
+    sumoc_rub: float,
+    object_code: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Запрос к tariff.pochta.ru без кэша. Возвращает {"price", "delivery_days", "name", "cover"} или None;
+    cover — плата за объявленную ценность, руб. (входит в price; None, если её нет в ответе).
+    """
+    obj = _object_code(object_code)
     base = getattr(settings, "RUSSIANPOST_TARIFF_URL", None) or TARIFF_URL
     params = {
         "from": from_index,
@@ -49,16 +247,22 @@ def get_delivery_cost(
     }
     url = base + "?" + urllib.parse.urlencode(params)
 
+    if not _breaker.allow():
+        logger.info("Russian Post tariff: предохранитель открыт, запрос пропущен")
+        return None
     req = urllib.request.Request(url, headers={"Accept": "application/json"})
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
+        with perf.span("http"), urllib.request.urlopen(req, timeout=http_timeout(15)) as resp:
             data = json.loads(resp.read().decode())
     except (urllib.error.HTTPError, urllib.error.URLError, TimeoutError, OSError) as e:
         logger.warning("Russian Post tariff request error: %s", e)
+        if is_breaker_failure(e) and not cut_by_deadline(e):
+            _breaker.record_failure(e)
         return None
     except json.JSONDecodeError as e:
         logger.warning("Russian Post tariff JSON error: %s", e)
         return None
+    _breaker.record_success()
 
     errors = data.get("errors") or data.get("error") or []
     if errors:
@@ -66,11 +270,15 @@ def get_delivery_cost(
         return None
 
     # Успех: сумма в поле pay (в копейках) или paynds (с НДС, в копейках)
-    pay_kopecks = data.get("pay") or data.get("paynds")
+    pay_field = "pay" if data.get("pay") else "paynds"
+    pay_kopecks = data.get(pay_field)
     if pay_kopecks is None:
         logger.warning("Russian Post: не найдена сумма в ответе, ключи: %s", list(data.keys())[:20])
         return None
     price = float(pay_kopecks) / 100.0
+    # Плата за ценность — в cover: {"val": без НДС, "valnds": с НДС}, в копейках
+    cover = data.get("cover") if isinstance(data.get("cover"), dict) else {}
+    cover_kopecks = cover.get("val" if pay_field == "pay" else "valnds")
 
     name = data.get("name") or data.get("typcatname") or "Почта России"
     # Срок доставки в ответе tariff.pochta.ru может не быть; при необходимости брать из справочников
@@ -79,4 +287,57 @@ def get_delivery_cost(
         "price": round(price, 2),
         "delivery_days": int(delivery_days) if delivery_days is not None else None,
         "name": name,
+        "cover": round(float(cover_kopecks) / 100.0, 2) if cover_kopecks is not None else None,
     }
+
+
+def get_delivery_cost(
+    from_index: int,
+    to_index: int,
+    weight_grams: int,
+    sumoc_rub: float = 100.0,
+    object_code: Optional[int] = None,
+    use_cache: bool = True,
+) -> Optional[dict]:
+    """
+    Расчёт стоимости доставки Почтой России через tariff.pochta.ru.
+    from_index, to_index — 6-значные индексы; weight_grams — вес в граммах;
+    sumoc_rub — объявленная ценность в руб. (для объекта 4040 минимум 0.01).
+    Сначала кэш процесса, затем предрасчитанная таблица, затем API (с верхней границей ступени веса
+    и точной ценностью); плата за ценность из кэша и таблицы пересчитывается для точной ценности.
+    use_cache=False — точный расчёт по переданным весу и ценности, без кэша.
+    Возвращает {"price": float, "delivery_days": int | None, "name": str} или None;
+    просроченный тариф при недоступном API — с "stale": True.
+    """
+    if not (100000 <= from_index <= 999999 and 100000 <= to_index <= 999999):
+        logger.warning("Russian Post: неверный формат индексов from=%s to=%s", from_index, to_index)
+        return None
+    weight_grams = max(1, min(weight_grams, MAX_WEIGHT))
+    sumoc_rub = _sumoc(sumoc_rub)
+    obj = _object_code(object_code)
+
+    if not use_cache:
+        return fetch_tariff(from_index, to_index, weight_grams, sumoc_rub, obj)
+
+    key = tariff_cache_key(from_index, to_index, weight_grams, obj)
+    cached = _cache_get(key)
+    result = price_for(cached, sumoc_rub) if cached is not None else None
+    if result is not None:
+        return result
+    table = _table_get(key)
+    result = price_for(table, sumoc_rub) if table is not None else None
+    if result is not None:
+        _cache_set(key, table)
+        return result
+    _, _, weight_bracket, _ = key
+    fetched = fetch_tariff(from_index, to_index, weight_bracket, sumoc_rub, obj)
+    if fetched is None:
+        # API недоступен — просроченный тариф лучше, чем никакого
+        note_fallback()
+        stale = _cache_get(key, allow_stale=True)
+        result = price_for(stale, sumoc_rub) if stale is not None else None
+        if result is not None:
+            result["stale"] = True
+        return result
+    _cache_set(key, split_tariff(fetched, sumoc_rub))
+    return {"price": fetched["price"], "delivery_days": fetched["delivery_days"], "name": fetched["name"]}
@@ -1,11 +1,13 @@
 """
 Сигналы: при создании/изменении/удалении Order ставим запись в очередь выгрузки.
+Изменения City сбрасывают индекс подсказок городов.
 """
 from django.db import transaction
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Order
+from . import city_suggest
+from .models import City, Order
 from .sync_queue import enqueue_order_sync
 
 
@@ -27,3 +29,9 @@ def order_post_save(sender, instance, created, **kwargs):
 @receiver(pre_delete, sender=Order)
 def order_pre_delete(sender, instance, **kwargs):
     enqueue_order_sync("delete", order=instance)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def city_changed(sender, **kwargs):
+    city_suggest.invalidate()
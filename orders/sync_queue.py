@@ -5,8 +5,12 @@ from .models import Order, OrderSyncQueue
 
 
 def _order_to_payload(order):
+    items = order.items.all()
+    # Позиции, подтянутые prefetch_related (пачка в API), не запрашиваются повторно
+    if "items" not in getattr(order, "_prefetched_objects_cache", {}):
+        items = items.select_related("variant__product")
     items_data = []
-    for oi in order.items.select_related("variant__product").all():
+    for oi in items:
         items_data.append({
             "variant_id": oi.variant_id,
             "product": oi.variant.product.name if oi.variant.product_id else None,
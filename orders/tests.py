@@ -1,3 +1,550 @@
-from django.test import TestCase
+"""
+Число SQL-запросов API выгрузки заказов не растёт с числом заказов и позиций.
+Клиенты перевозчиков: кэш тарифов Почты России, общий токен API, предохранитель, зоны 5post;
+параллельный расчёт доставки с общим дедлайном.
 
-# Create your tests here.
+python manage.py test --settings=store.test_settings
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store.testing import QueryCountMixin, seed_catalog
+
+from . import (
+    carrier_tokens,
+    cdek_client,
+    circuit_breaker,
+    city_suggest,
+    delivery_quotes,
+    fivepost_zones,
+    http_deadline,
+    russianpost_client,
+)
+from .models import CarrierToken, City, DeliveryMethod, Order, OrderItem
+
+
+class OrderBatchApiQueryCountTests(QueryCountMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(email="buyer@example.com", password="x")
+        self.method, _ = DeliveryMethod.objects.get_or_create(code="cdek_pvz", defaults={"name": "СДЭК ПВЗ"})
+        self.variants = [p.variants.first() for p in seed_catalog(10)]
+        self.orders = []
+
+    def _create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                user=self.user, name="Покупатель", email="buyer@example.com", phone="+70000000000",
+                delivery_method=self.method, total=Decimal("3000"),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, variant=v, quantity=1, price=v.price) for v in self.variants[:3]
+            ])
+            self.orders.append(order)
+
+    def test_order_detail_batch_api(self):
+        self._create_orders(2)
+        url = reverse("order_detail_batch_api")
+
+        def fetch():
+            return self.client.get(url, {"uuids": ",".join(str(o.uuid) for o in self.orders)})
+
+        self.assertQueryCountFlat(4, fetch, lambda: self._create_orders(30))
+
+
+@override_settings(RUSSIANPOST_TARIFF_TABLE=None, RUSSIANPOST_SENDER_INDEX=101000)
+class RussianPostTariffCacheTests(SimpleTestCase):
+    def setUp(self):
+        russianpost_client.clear_tariff_cache()
+        self.addCleanup(russianpost_client.clear_tariff_cache)
+        self.with_cover = True
+        patcher = mock.patch.object(russianpost_client, "fetch_tariff", side_effect=self.fake_fetch)
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_fetch(self, from_index, to_index, weight, sumoc, obj):
+        # Пересылка — 10 коп. за грамм ступени, плата за ценность — 4 %
+        cover = round(sumoc * 0.04, 2)
+        return {"price": round(weight / 10 + cover, 2), "delivery_days": 3, "name": "Посылка",
+                "cover": cover if self.with_cover else None}
+
+    def cost(self, weight, sumoc, to_index=190000):
+        return russianpost_client.get_delivery_cost(101000, to_index, weight, sumoc)["price"]
+
+    def test_weight_uses_carrier_step_and_value_is_exact(self):
+        self.assertEqual(self.cost(501, 500001), round(100 + 500001 * 0.04, 2))
+        self.assertEqual(self.fetch.call_args.args[2:4], (1000, 500001))
+
+    def test_cache_serves_any_value_within_weight_step(self):
+        self.cost(600, 1500)
+        self.assertEqual(self.cost(1000, 1500, to_index=190999), 160)
+        # Другая сумма корзины — тот же тариф, плата за ценность пересчитана
+        self.assertEqual(self.cost(1000, 2750.5), round(100 + 2750.5 * 0.04, 2))
+        self.assertEqual(self.cost(700, 3500000), round(100 + 3500000 * 0.04, 2))
+        self.assertEqual(self.fetch.call_count, 1)
+        self.cost(1001, 1500)
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_without_cover_cache_only_for_same_value(self):
+        self.with_cover = False
+        self.cost(1000, 1500)
+        self.cost(1000, 1500)
+        self.assertEqual(self.fetch.call_count, 1)
+        self.cost(1000, 2000)
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_precomputed_table(self):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"from_index": 101000, "object": 4040, "prefix_len": 3,
+                       "tariffs": {"190:1000": {"base": 100, "rate": 0.04, "delivery_days": 4, "name": "Посылка"}}}, f)
+        self.addCleanup(os.remove, path)
+
+        with self.settings(RUSSIANPOST_TARIFF_TABLE=path):
+            result = russianpost_client.get_delivery_cost(101000, 190123, 800, 12345.67)
+        self.assertEqual((result["price"], result["delivery_days"]), (round(100 + 12345.67 * 0.04, 2), 4))
+        self.fetch.assert_not_called()
+
+    def test_stale_tariff_is_marked_and_not_cached_over_http(self):
+        self.cost(1000, 1500)
+        self.fetch.side_effect = lambda *args: None
+        with mock.patch.object(russianpost_client.time, "time", return_value=time.time() + 13 * 3600):
+            result = russianpost_client.get_delivery_cost(101000, 190000, 1000, 2000)
+            self.assertEqual((result["price"], result["stale"]), (180, True))
+
+            response = self.client.get(reverse("russianpost_delivery_cost_api"), {"to_index": "190000", "sumoc": "2000"})
+        self.assertEqual(response.json()["price"], 180)
+        self.assertIn("no-store", response["Cache-Control"])
+
+
+@override_settings(PERF_SERVER_TIMING="all")
+class ApiCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_public_response_without_server_timing(self):
+        response = self.client.get(reverse("cdek_pvz_api"), {"city_code": "0"})
+        self.assertIn("public", response["Cache-Control"])
+        self.assertTrue(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_carrier_fallback_is_not_cached(self):
+        path = "/v2/deliverypoints?country_code=RU&city_code=44"
+        key = cdek_client._cache_key("GET", path, None)
+        cdek_client._last_good.set(key, [{"code": "NSK1", "name": "ПВЗ", "location": {"address": "ул. Ленина, 1"}}])
+        self.addCleanup(cdek_client._last_good._data.pop, key, None)
+        with mock.patch.object(cdek_client._breaker, "allow", return_value=False):
+            response = self.client.get(reverse("cdek_pvz_api"), {"city_code": "44"})
+        self.assertEqual(response.json()["results"][0]["code"], "NSK1")
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertNotIn("public", response["Cache-Control"])
+        self.assertTrue(response.has_header("Server-Timing"))
+
+        # API снова доступен — ответ рассчитывается заново, а не из кэша
+        with mock.patch("orders.views.get_delivery_points", return_value=[{"code": "NSK2"}]):
+            response = self.client.get(reverse("cdek_pvz_api"), {"city_code": "44"})
+        self.assertEqual(response.json()["results"][0]["code"], "NSK2")
+        self.assertIn("public", response["Cache-Control"])
+
+
+class CarrierTokenTests(TestCase):
+    def setUp(self):
+        carrier_tokens._memo.clear()
+        self.addCleanup(carrier_tokens._memo.clear)
+        self.issued = []
+
+    def fetch(self):
+        self.issued.append(f"token-{len(self.issued) + 1}")
+        return self.issued[-1], 3600
+
+    def other_worker(self, **kwargs):
+        # Другой воркер gunicorn: своя память процесса, общая таблица CarrierToken
+        carrier_tokens.forget("cdek")
+        return carrier_tokens.get_token("cdek", self.fetch, **kwargs)
+
+    def test_token_is_fetched_once_for_all_workers(self):
+        self.assertEqual(carrier_tokens.get_token("cdek", self.fetch), "token-1")
+        self.assertEqual(self.other_worker(), "token-1")
+        with self.assertNumQueries(0):
+            self.assertEqual(carrier_tokens.get_token("cdek", self.fetch), "token-1")
+        self.assertEqual(self.issued, ["token-1"])
+        self.assertEqual(CarrierToken.objects.get(carrier="cdek").token, "token-1")
+
+    def test_rejected_token_is_replaced_once(self):
+        carrier_tokens.get_token("cdek", self.fetch)
+        self.assertEqual(self.other_worker(failed_token="token-1"), "token-2")
+        # Второй воркер получил отказ на тот же токен — новый уже в таблице, запроса нет
+        self.assertEqual(self.other_worker(failed_token="token-1"), "token-2")
+        self.assertEqual(self.issued, ["token-1", "token-2"])
+
+    def test_expired_token_is_refreshed(self):
+        carrier_tokens.get_token("cdek", self.fetch)
+        CarrierToken.objects.filter(carrier="cdek").update(expires_at=timezone.now())
+        self.assertEqual(self.other_worker(), "token-2")
+
+    def test_fetch_error(self):
+        self.assertIsNone(carrier_tokens.get_token("cdek", lambda: None))
+        self.assertEqual(carrier_tokens.get_token("cdek", self.fetch), "token-1")
+
+    def test_database_error_falls_back_to_process_token(self):
+        with mock.patch.object(carrier_tokens, "_get_shared", side_effect=DatabaseError("нет БД")), \
+                self.assertLogs("orders.carrier_tokens", "WARNING"):
+            self.assertEqual(carrier_tokens.get_token("cdek", self.fetch), "token-1")
+        self.assertEqual(carrier_tokens.get_token("cdek", self.fetch), "token-1")
+        self.assertFalse(CarrierToken.objects.exists())
+
+
+@override_settings(CARRIER_BREAKER_FAILURES=3, CARRIER_BREAKER_RESET=30)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(circuit_breaker.time, "time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open(self, breaker):
+        with self.assertLogs("orders.circuit_breaker", "WARNING"):
+            for _ in range(3):
+                breaker.record_failure(TimeoutError("timed out"))
+        self.assertEqual(breaker.state, circuit_breaker.OPEN)
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = circuit_breaker.CircuitBreaker("test")
+        breaker.record_failure("5xx")
+        breaker.record_failure("5xx")
+        breaker.record_success()
+        breaker.record_failure("5xx")
+        breaker.record_failure("5xx")
+        self.assertTrue(breaker.allow())
+        self.open(breaker)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_without_probe_lets_one_request_through(self):
+        breaker = circuit_breaker.CircuitBreaker("test")
+        self.open(breaker)
+        self.now += 29
+        self.assertFalse(breaker.allow())
+        self.now += 1
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        # Пробный запрос не удался — снова open, отсчёт заново
+        with self.assertLogs("orders.circuit_breaker", "WARNING"):
+            breaker.record_failure("timeout")
+        self.assertEqual(breaker.state, circuit_breaker.OPEN)
+        self.now += 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.failures), (circuit_breaker.CLOSED, 0))
+
+    def test_probe_runs_in_background_and_closes(self):
+        results = [False, True]
+        breaker = circuit_breaker.CircuitBreaker("test", probe=lambda: results.pop(0))
+        with mock.patch.object(circuit_breaker.threading, "Timer") as timer:
+            self.open(breaker)
+            self.assertEqual(timer.call_args.args, (30.0, breaker._run_probe))
+            # С probe запросы не пропускаются — проверяет только фоновый поток
+            self.now += 60
+            self.assertFalse(breaker.allow())
+
+            with self.assertLogs("orders.circuit_breaker", "WARNING"):
+                breaker._run_probe()
+            self.assertEqual(breaker.state, circuit_breaker.OPEN)
+            self.assertEqual(timer.call_count, 2)
+            breaker._run_probe()
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failure_kinds(self):
+        def http_error(code):
+            return urllib.error.HTTPError("https://api", code, "", {}, None)
+
+        self.assertTrue(circuit_breaker.is_breaker_failure(TimeoutError()))
+        self.assertTrue(circuit_breaker.is_breaker_failure(urllib.error.URLError("refused")))
+        self.assertTrue(circuit_breaker.is_breaker_failure(http_error(503)))
+        self.assertFalse(circuit_breaker.is_breaker_failure(http_error(400)))
+
+    def test_get_breaker_is_shared_per_carrier(self):
+        name = "tests.breaker"
+        self.addCleanup(circuit_breaker._breakers.pop, name, None)
+        breaker = circuit_breaker.get_breaker(name)
+        probe = mock.Mock()
+        self.assertIs(circuit_breaker.get_breaker(name, probe=probe), breaker)
+        self.assertIs(breaker.probe, probe)
+        self.assertEqual(circuit_breaker.breakers_snapshot()[name]["state"], circuit_breaker.CLOSED)
+
+    def test_last_good_cache_evicts_least_recent(self):
+        cache = circuit_breaker.LastGoodCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_open_breaker_skips_carrier_request(self):
+        with mock.patch.object(russianpost_client._breaker, "allow", return_value=False), \
+                mock.patch.object(russianpost_client.urllib.request, "urlopen") as urlopen:
+            self.assertIsNone(russianpost_client.fetch_tariff(101000, 190000, 1000, 100))
+        urlopen.assert_not_called()
+
+
+class CitySuggestTests(TestCase):
+    NAMES = [
+        "Москва", "Московский", "Мосальск", "Санкт-Петербург", "Петергоф", "Петрозаводск", "Королёв",
+        "Орёл", "Орехово-Зуево", "Великий Новгород", "Нижний Новгород", "Новгородка", "Пермь",
+    ]
+
+    def setUp(self):
+        City.objects.bulk_create(City(name=name) for name in self.NAMES)
+        city_suggest.invalidate()
+        self.addCleanup(city_suggest.invalidate)
+
+    def test_prefix_then_infix(self):
+        self.assertEqual(city_suggest.suggest_cities("мос"), ["Мосальск", "Москва", "Московский"])
+        self.assertEqual(city_suggest.suggest_cities("петер"), ["Петергоф", "Санкт-Петербург"])
+        self.assertEqual(
+            city_suggest.suggest_cities(" новгород "),
+            ["Новгородка", "Великий Новгород", "Нижний Новгород"],
+        )
+        self.assertEqual(city_suggest.suggest_cities("новгород", limit=2), ["Новгородка", "Великий Новгород"])
+        # Короче триграммы — только с начала названия
+        self.assertEqual(city_suggest.suggest_cities("ер"), [])
+        self.assertEqual(city_suggest.suggest_cities("хабар"), [])
+
+    def test_yo(self):
+        self.assertEqual(city_suggest.suggest_cities("королев"), ["Королёв"])
+        self.assertEqual(city_suggest.suggest_cities("КОРОЛЁВ"), ["Королёв"])
+        self.assertEqual(city_suggest.suggest_cities("оре"), ["Орёл", "Орехово-Зуево"])
+
+    def test_matches_brute_force(self):
+        index = city_suggest.CityIndex(self.NAMES)
+        keys = sorted((city_suggest.normalize(n), n) for n in self.NAMES)
+        for q in ["мос", "ород", "город", "ов", "о", "рёл", "петер", "нов", "ий н", "зуево", "ква"]:
+            key = city_suggest.normalize(q)
+            prefix = [n for k, n in keys if k.startswith(key)]
+            infix = [n for k, n in keys if key in k and not k.startswith(key)] if len(key) >= 3 else []
+            self.assertEqual(index.suggest(q), prefix + infix, q)
+
+    @override_settings(CITY_SUGGEST_MAX_MEMORY=5)
+    def test_oversized_table_uses_db(self):
+        City.objects.bulk_create(City(name=name) for name in ["Yoshkar-Ola", "Yola", "Ayoka"])
+        with self.assertLogs("orders.city_suggest", "INFO"):
+            self.assertEqual(city_suggest.suggest_cities("yo"), ["Yola", "Yoshkar-Ola"])
+        self.assertIsNone(city_suggest._get_index())
+        self.assertEqual(city_suggest.suggest_cities("YOK"), ["Ayoka"])
+        self.assertEqual(city_suggest.suggest_cities("yol", limit=1), ["Yola"])
+
+    @skipUnless(connection.vendor == "postgresql", "UPPER для кириллицы — только в PostgreSQL")
+    @override_settings(CITY_SUGGEST_MAX_MEMORY=5)
+    def test_oversized_table_same_as_memory(self):
+        with self.assertLogs("orders.city_suggest", "INFO"):
+            self.assertEqual(city_suggest.suggest_cities("королев"), ["Королёв"])
+        self.assertEqual(city_suggest.suggest_cities("петер"), ["Петергоф", "Санкт-Петербург"])
+        self.assertEqual(city_suggest.suggest_cities("орё"), ["Орёл", "Орехово-Зуево"])
+
+
+class FivepostZoneTests(SimpleTestCase):
+    ZONES = {
+        "Москва": 1,
+        "Новгород": 4,
+        "Нижний Новгород": 3,
+        "Новосибирск": 5,
+        "Новокузнецк": 6,
+        "Орёл": 2,
+        "__default__": 7,
+    }
+
+    def setUp(self):
+        fivepost_zones.reset_resolver()
+        self.addCleanup(fivepost_zones.reset_resolver)
+        self.resolver = fivepost_zones.build_resolver(self.ZONES)
+
+    def test_exact_and_normalized(self):
+        self.assertEqual(self.resolver.resolve("Москва"), 1)
+        self.assertEqual(self.resolver.resolve("  г. МОСКВА "), 1)
+        self.assertEqual(self.resolver.resolve("город Орел"), 2)
+
+    def test_longest_whole_word_inside_text(self):
+        self.assertEqual(self.resolver.resolve("Нижний Новгород, Нижегородская обл."), 3)
+        self.assertEqual(self.resolver.resolve("Россия, г. Новгород"), 4)
+        # «Новгородская» — не «Новгород»: только целые слова
+        self.assertEqual(self.resolver.resolve("Новгородская обл."), 7)
+
+    def test_prefix_completes_shortest_name(self):
+        self.assertEqual(self.resolver.resolve("Новосиб"), 5)
+        self.assertEqual(self.resolver.resolve("Нов"), 4)
+        self.assertEqual(self.resolver.resolve("Но"), 7)
+        self.assertEqual(self.resolver.resolve(""), 7)
+
+    def test_matches_brute_force(self):
+        names = {fivepost_zones.normalize_city(n): z for n, z in self.ZONES.items() if n != "__default__"}
+
+        def expected(text):
+            key = fivepost_zones.normalize_city(text)
+            if key in names:
+                return names[key]
+            found = [
+                (len(name), -m.start(), zone) for name, zone in names.items()
+                for m in re.finditer(rf"(?<!\w){re.escape(name)}(?!\w)", key)
+            ]
+            if found:
+                return max(found)[2]
+            starts = [(len(name), zone) for name, zone in names.items() if len(key) >= 3 and name.startswith(key)]
+            return min(starts)[1] if starts else 7
+
+        for text in ["новгород нижний", "москва новосибирск", "новокузнецк-москва", "нижний новгородский",
+                     "в новосибирске", "орел, москва, нижний новгород", "новок", "моск", "xновгород"]:
+            self.assertEqual(self.resolver.resolve(text), expected(text), text)
+
+    def test_get_resolver_from_settings(self):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("город;зона\nКазань;2\nМосква;3\n__default__;9\n")
+        self.addCleanup(os.remove, path)
+
+        with self.settings(FIVEPOST_CITY_ZONE_FILE=path, FIVEPOST_CITY_ZONE={"Москва": 1}):
+            resolver = fivepost_zones.get_resolver()
+            self.assertIs(fivepost_zones.get_resolver(), resolver)
+            self.assertEqual((resolver.resolve("Казань"), resolver.resolve("Москва"), resolver.resolve("Тверь")), (2, 1, 9))
+        with self.settings(FIVEPOST_CITY_ZONE_FILE=None, FIVEPOST_CITY_ZONE={"Тверь": 4}):
+            self.assertEqual(fivepost_zones.get_resolver().resolve("Тверь"), 4)
+
+
+class DeliveryQuotesTests(TestCase):
+    PARAMS = {"city": "Москва", "city_code": None, "to_index": 190000, "weight": 1000, "sumoc": 100}
+
+    def setUp(self):
+        DeliveryMethod.objects.update(is_active=False)
+        for i, code in enumerate(["cdek_pvz", "fivepost_pvz", "russianpost"]):
+            DeliveryMethod.objects.update_or_create(code=code, defaults={"name": code, "sort_order": i, "is_active": True})
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.called = []
+        self.use_pool(3)
+
+    def use_pool(self, workers):
+        pool = ThreadPoolExecutor(max_workers=workers)
+        patcher = mock.patch.object(delivery_quotes, "_executor", pool)
+        patcher.start()
+        # Сначала отпустить зависшие расчёты, затем дождаться пула
+        self.addCleanup(pool.shutdown)
+        self.addCleanup(self.release.set)
+        self.addCleanup(patcher.stop)
+        return pool
+
+    def quote(self, carrier, result=None, hang=False):
+        def run(params):
+            self.called.append(carrier)
+            if hang:
+                self.release.wait(5)
+            return dict(result or {"status": "ok", "price": 100})
+        return run
+
+    def patch_quotes(self, **funcs):
+        patcher = mock.patch.dict(delivery_quotes.QUOTE_FUNCS, funcs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_partial_results_at_deadline(self):
+        self.patch_quotes(
+            cdek=self.quote("cdek"),
+            fivepost=self.quote("fivepost", hang=True),
+            russianpost=self.quote("russianpost", {"status": "error", "error": "нет тарифа"}),
+        )
+        result = delivery_quotes.get_quotes(self.PARAMS, deadline=0.2)
+
+        quotes = result["quotes"]
+        self.assertEqual({c: q["status"] for c, q in quotes.items()}, {"cdek": "ok", "fivepost": "timeout", "russianpost": "error"})
+        self.assertIn("time_ms", quotes["cdek"])
+        self.assertEqual([m["carrier"] for m in result["methods"]], ["cdek", "fivepost", "russianpost"])
+        self.assertLess(result["elapsed_ms"], 2000)
+
+    def test_queued_quotes_are_cancelled_at_deadline(self):
+        pool = self.use_pool(1)
+        self.patch_quotes(
+            cdek=self.quote("cdek", hang=True),
+            fivepost=self.quote("fivepost"),
+            russianpost=self.quote("russianpost"),
+        )
+        result = delivery_quotes.get_quotes(self.PARAMS, deadline=0.1)
+        self.release.set()
+        pool.shutdown(wait=True)
+
+        self.assertEqual({q["status"] for q in result["quotes"].values()}, {"timeout"})
+        self.assertEqual(self.called, ["cdek"])
+
+    def test_quote_started_after_deadline_is_skipped(self):
+        self.patch_quotes(cdek=self.quote("cdek"))
+        result = delivery_quotes._run_quote("cdek", self.PARAMS, time.monotonic() - 1)
+        self.assertEqual(result["status"], "timeout")
+        self.assertEqual(self.called, [])
+
+    @override_settings(RUSSIANPOST_SENDER_INDEX=101000, RUSSIANPOST_TARIFF_TABLE=None)
+    def test_deadline_cut_does_not_trip_breaker(self):
+        russianpost_client.clear_tariff_cache()
+        self.addCleanup(russianpost_client.clear_tariff_cache)
+        timeouts = []
+
+        def slow_urlopen(req, timeout):
+            timeouts.append(timeout)
+            time.sleep(timeout)
+            raise TimeoutError("timed out")
+
+        pool = self.use_pool(1)
+        self.patch_quotes(cdek=self.quote("cdek"), fivepost=self.quote("fivepost"))
+        with mock.patch.object(russianpost_client.urllib.request, "urlopen", side_effect=slow_urlopen), \
+                mock.patch.object(russianpost_client._breaker, "record_failure") as record_failure, \
+                self.assertLogs("orders.russianpost_client", "WARNING"):
+            result = delivery_quotes.get_quotes(self.PARAMS, deadline=0.3)
+            pool.shutdown(wait=True)
+        self.assertEqual(result["quotes"]["russianpost"]["status"], "timeout")
+        self.assertLess(timeouts[0], 0.3)
+        record_failure.assert_not_called()
+
+        # Без срока расчёта таймаут — обычный сбой перевозчика
+        with mock.patch.object(russianpost_client.urllib.request, "urlopen", side_effect=TimeoutError("timed out")), \
+                mock.patch.object(russianpost_client._breaker, "record_failure") as record_failure, \
+                self.assertLogs("orders.russianpost_client", "WARNING"):
+            self.assertIsNone(russianpost_client.fetch_tariff(101000, 190000, 1000, 100))
+        record_failure.assert_called_once()
+
+    def test_cut_by_deadline(self):
+        timeout = urllib.error.URLError(TimeoutError("timed out"))
+        self.assertEqual(http_deadline.http_timeout(15), 15)
+        self.assertFalse(http_deadline.cut_by_deadline(timeout))
+        with http_deadline.deadline(time.monotonic() + 5):
+            self.assertLessEqual(http_deadline.http_timeout(15), 5)
+            self.assertTrue(http_deadline.cut_by_deadline(timeout))
+            self.assertFalse(http_deadline.cut_by_deadline(ConnectionRefusedError()))
+            self.assertEqual(http_deadline.http_timeout(2), 2)
+            self.assertFalse(http_deadline.cut_by_deadline(timeout))
+
+    @override_settings(DELIVERY_QUOTES_DEADLINE=0.2)
+    def test_api(self):
+        self.patch_quotes(
+            cdek=self.quote("cdek"),
+            fivepost=self.quote("fivepost", hang=True),
+            russianpost=self.quote("russianpost"),
+        )
+        url = reverse("delivery_quotes_api")
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+        data = self.client.get(url, {"city": "Москва", "to_index": "190000", "weight": "1200"}).json()
+        self.assertTrue(data["ok"])
+        self.assertEqual({c: q["status"] for c, q in data["quotes"].items()}, {"cdek": "ok", "fivepost": "timeout", "russianpost": "ok"})
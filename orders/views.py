@@ -1,14 +1,21 @@
-import re
 from datetime import datetime, timezone as dt_timezone
 
 from django.conf import settings
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import add_never_cache_headers
 from django.views.decorators.http import require_GET
 
+from store import perf
+
+from .carrier_tokens import store_token
 from .cdek_client import get_cities, get_delivery_cost, get_delivery_points, get_token
+from .circuit_breaker import breakers_snapshot
+from .city_suggest import suggest_cities
+from .delivery_quotes import cdek_tariffs_from_result, get_quotes
 from .fivepost_client import get_delivery_cost as fivepost_get_delivery_cost, get_pvz_by_city
-from .models import City, Order, OrderSyncQueue
+from .http_cache import api_cache
+from .models import Order, OrderSyncQueue
 from .russianpost_client import get_delivery_cost as russianpost_get_delivery_cost
 from .sync_queue import _order_to_payload
 
@@ -18,7 +25,8 @@ def _cdek_diagnose_step(name, timeout_sec, callable_fn):
     import time
     t0 = time.time()
     try:
-        result = callable_fn()
+        with perf.span("http"):
+            result = callable_fn()
         elapsed = (time.time() - t0) * 1000
         return {"step": name, "ok": result is not None and result is not False, "time_ms": round(elapsed), "error": None}
     except Exception as e:
@@ -105,6 +113,7 @@ def cdek_diagnostic_api(request):
         "has_credentials": bool(account and secure),
         "steps": steps,
         "summary": "Все шаги ок" if all(s["ok"] for s in steps) else "Есть ошибки — см. steps",
+        "breakers": breakers_snapshot(),
     }, json_dumps_params={"ensure_ascii": False})
 
 
@@ -144,14 +153,13 @@ def cdek_refresh_token_api(request):
 
     t0 = time.time()
     try:
-        with urllib.request.urlopen(req, timeout=12) as resp:
+        with perf.span("http"), urllib.request.urlopen(req, timeout=12) as resp:
             body = json.loads(resp.read().decode())
             token = body.get("access_token")
             elapsed = round((time.time() - t0) * 1000)
             if token:
-                import orders.cdek_client as cdek_mod
-                cdek_mod._cdek_token = token
-                cdek_mod._cdek_token_expire = time.time() + int(body.get("expires_in", 3599)) - 10
+                # Токен сразу получают все воркеры, а не только обслуживший запрос
+                store_token("cdek", token, int(body.get("expires_in", 3599)) - 10)
                 return JsonResponse({
                     "ok": True,
                     "message": "Токен обновлён",
@@ -240,6 +248,7 @@ def cdek_status_api(request):
         "cities_ok": cities_ok,
         "cities_test_count": cities_count,
         "error": error,
+        "breakers": breakers_snapshot(),
     }, json_dumps_params={"ensure_ascii": False})
 
 
@@ -275,11 +284,13 @@ def _city_to_result(c):
 
 
 @require_GET
+@api_cache("cdek_cities")
 def cdek_cities_api(request):
     """
     Подсказки городов из справочника СДЭК. Для шага доставки ТК СДЭК.
     GET /api/cdek/cities/?q=моск → {"results": [{"code": 44, "city": "Москва", "region": "Москва"}, ...]}
     ?debug=1 — диагностика. CDEK_CITIES_FALLBACK_ONLY=True — только локальный список (без API).
+    Ответ API кэшируется (api_cache); запасной список при недоступном API и debug — нет.
     """
     q = (request.GET.get("q") or "").strip()
     debug = request.GET.get("debug")
@@ -291,14 +302,16 @@ def cdek_cities_api(request):
         return [c for c in _CDEK_CITIES_FALLBACK if q_lower in c["city"].lower()]
 
     fallback_only = getattr(settings, "CDEK_CITIES_FALLBACK_ONLY", False)
+    api_failed = False
     if fallback_only:
         cities = _fallback_cities()
     else:
         try:
             cities = get_cities(country_code="RU", name_filter=q)
         except (TimeoutError, OSError, ConnectionError):
-            cities = _fallback_cities()
+            cities = None
         if not cities:
+            api_failed = True
             cities = _fallback_cities()
 
     if debug:
@@ -313,12 +326,14 @@ def cdek_cities_api(request):
         results = [_city_to_result(c) for c in (cities or [])[:20]]
         resp = JsonResponse({"results": results}, json_dumps_params={"ensure_ascii": False})
 
-    resp["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp["Pragma"] = "no-cache"
+    if debug or api_failed:
+        add_never_cache_headers(resp)
+        resp["Pragma"] = "no-cache"
     return resp
 
 
 @require_GET
+@api_cache("cdek_pvz")
 def cdek_pvz_api(request):
     """
     Список ПВЗ СДЭК по коду города.
@@ -332,7 +347,10 @@ def cdek_pvz_api(request):
         return JsonResponse({"results": []}, json_dumps_params={"ensure_ascii": False})
     points = get_delivery_points(country_code="RU", city_code=city_code)
     if not points:
-        return JsonResponse({"results": []}, json_dumps_params={"ensure_ascii": False})
+        # Пусто может означать недоступный API — такой ответ не кэшируем
+        resp = JsonResponse({"results": []}, json_dumps_params={"ensure_ascii": False})
+        add_never_cache_headers(resp)
+        return resp
     results = []
     for p in points:
         loc = p.get("location") or {}
@@ -346,6 +364,7 @@ def cdek_pvz_api(request):
 
 
 @require_GET
+@api_cache("fivepost_cost")
 def fivepost_delivery_cost_api(request):
     """
     Расчёт стоимости доставки 5post по городу (тариф по зоне).
@@ -380,6 +399,7 @@ def fivepost_delivery_cost_api(request):
 
 
 @require_GET
+@api_cache("fivepost_pvz")
 def fivepost_pvz_api(request):
     """
     Список ПВЗ 5post по городу (по названию).
@@ -389,10 +409,14 @@ def fivepost_pvz_api(request):
     if not city_name:
         return JsonResponse({"results": []}, json_dumps_params={"ensure_ascii": False})
     results = get_pvz_by_city(city_name, max_results=50)
-    return JsonResponse({"results": results}, json_dumps_params={"ensure_ascii": False})
+    resp = JsonResponse({"results": results}, json_dumps_params={"ensure_ascii": False})
+    if not results:
+        add_never_cache_headers(resp)
+    return resp
 
 
 @require_GET
+@api_cache("russianpost_cost")
 def russianpost_delivery_cost_api(request):
     """
     Расчёт стоимости доставки Почтой России по индексу получателя (tariff.pochta.ru).
@@ -441,16 +465,17 @@ def russianpost_delivery_cost_api(request):
 
 
 @require_GET
+@api_cache("cities")
 def cities_autocomplete_api(request):
     """
     Подсказки городов для поля «Город» при оформлении заказа.
     GET /api/cities/?q=моск → {"results": ["Москва", "Московский", ...]}
+    Сначала города, начинающиеся с q, затем содержащие q (см. city_suggest).
     """
     q = (request.GET.get("q") or "").strip()
     if not q:
         return JsonResponse({"results": []})
-    qs = City.objects.filter(name__icontains=q).order_by("name").values_list("name", flat=True)[:20]
-    return JsonResponse({"results": list(qs)}, json_dumps_params={"ensure_ascii": False})
+    return JsonResponse({"results": suggest_cities(q)}, json_dumps_params={"ensure_ascii": False})
 
 
 def _require_order_api_key(request):
@@ -680,44 +705,7 @@ def cdek_delivery_cost_api(request):
             status=502,
         )
 
-    items = result.get("tariff_codes") or []
-    raw = []
-    for t in items:
-        mode_val = t.get("delivery_mode") or t.get("mode")
-        try:
-            mode_int = int(mode_val) if mode_val is not None else None
-        except (TypeError, ValueError):
-            mode_int = None
-        raw.append({
-            "tariff_code": t.get("tariff_code"),
-            "name": t.get("tariff_name", ""),
-            "delivery_sum": float(t.get("delivery_sum", 0)),
-            "period_min": int(t.get("period_min", 0)),
-            "period_max": int(t.get("period_max", 0)),
-            "delivery_mode": mode_int,
-        })
-
-    # Исключаем невыгодные тарифы (Сборный груз — LTL для юрлиц)
-    exclude_names = ("сборный груз",)
-    filtered = [t for t in raw if not any(
-        ex in (t.get("name") or "").lower() for ex in exclude_names
-    )]
-
-    # Убираем дубликаты по (shortName, period): оставляем только самый дешёвый
-    def _short_name(name: str) -> str:
-        s = (name or "").lower()
-        for p in ("дверь-дверь", "склад-склад", "дверь-склад", "склад-дверь"):
-            s = s.replace(p, "").strip()
-        s = re.sub(r"\s*до\s+\d+\s*$", "", s, flags=re.I).strip()
-        return s or "доставка"
-
-    seen: dict = {}
-    for t in filtered:
-        mode = t.get("delivery_mode")
-        key = (_short_name(t["name"]), t["period_min"], t["period_max"], mode)
-        if key not in seen or t["delivery_sum"] < seen[key]["delivery_sum"]:
-            seen[key] = t
-    tariffs = sorted(seen.values(), key=lambda x: x["delivery_sum"])
+    raw, filtered, tariffs = cdek_tariffs_from_result(result)
 
     payload = {
         "ok": True,
@@ -741,3 +729,64 @@ def cdek_delivery_cost_api(request):
             },
         }
     return JsonResponse(payload, json_dumps_params={"ensure_ascii": False})
+
+
+@require_GET
+def delivery_quotes_api(request):
+    """
+    Расчёт доставки всеми активными ТК за один запрос (параллельно, с общим дедлайном).
+
+    GET /api/delivery/quotes/?city=Москва&to_index=190000&weight=1000&sumoc=100
+
+    Параметры:
+    - city: город получателя (СДЭК, 5post)
+    - city_code: код города СДЭК (опционально, вместо поиска по названию)
+    - to_index: 6-значный индекс (Почта России)
+    - weight: вес в граммах (по умолчанию 1000), sumoc: объявленная ценность, руб.
+
+    Ответ:
+    {
+      "ok": true,
+      "elapsed_ms": 1840,
+      "methods": [{"id": 1, "code": "cdek_pvz", "name": "...", "delivery_type": "pvz", "carrier": "cdek"}, ...],
+      "quotes": {
+        "cdek": {"status": "ok", "city_code": 44, "tariffs": [...], "time_ms": 1840},
+        "fivepost": {"status": "ok", "zone": 1, "price": 187, "delivery_days": 3, "time_ms": 0},
+        "russianpost": {"status": "timeout", "error": "..."}
+      }
+    }
+    status: ok | error | skipped (не хватает параметров) | timeout (не уложился в дедлайн).
+    """
+    city_name = (request.GET.get("city") or "").strip()
+    city_code = None
+    try:
+        city_code = int(request.GET.get("city_code") or 0) or None
+    except (TypeError, ValueError):
+        city_code = None
+    to_index_raw = (request.GET.get("to_index") or "").strip()
+    to_index = int(to_index_raw) if len(to_index_raw) == 6 and to_index_raw.isdigit() else None
+    if not city_name and not city_code and not to_index:
+        return JsonResponse(
+            {"ok": False, "error": "Укажите city, city_code или to_index."},
+            json_dumps_params={"ensure_ascii": False},
+            status=400,
+        )
+    try:
+        weight = int(request.GET.get("weight", 1000))
+        weight = max(500, min(weight, 30000))
+    except (TypeError, ValueError):
+        weight = 1000
+    try:
+        sumoc = float(request.GET.get("sumoc", 100))
+        sumoc = max(0.01, min(sumoc, 3000000))
+    except (TypeError, ValueError):
+        sumoc = 100
+
+    result = get_quotes({
+        "city": city_name,
+        "city_code": city_code,
+        "to_index": to_index,
+        "weight": weight,
+        "sumoc": sumoc,
+    })
+    return JsonResponse({"ok": True, **result}, json_dumps_params={"ensure_ascii": False})
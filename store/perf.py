@@ -0,0 +1,254 @@
+"""
+Замер времени запросов: SQL (число и время), отрисовка шаблонов, HTTP к перевозчикам, общее время.
+
+PerfMiddleware (первым в MIDDLEWARE) собирает замеры запроса в объект в contextvar:
+- SQL — connection.execute_wrapper на время запроса;
+- шаблоны — обёртка над render() шаблонов Django (только верхний уровень, include не суммируются дважды);
+- HTTP — участки span("http") вокруг urlopen в клиентах СДЭК, 5post, Почты России.
+  Расчёт по всем ТК сразу идёт в пуле потоков — там замеряется ожидание ответов, а не сумма потоков.
+
+Результат: заголовок Server-Timing (PERF_SERVER_TIMING: staff / all / off; staff — только если вью уже
+загрузила request.user), запись JSON в лог store.perf (доля PERF_LOG_SAMPLE_RATE и все запросы дольше
+PERF_SLOW_MS) и окно последних PERF_WINDOW запросов на каждую вью в памяти воркера — p50/p95/p99
+на /backend/perf/ (только персонал).
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from django.utils.functional import empty
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("total", "db", "queries", "tpl", "http")
+PERCENTILES = (50, 95, 99)
+
+
+class Timings:
+    """Замеры одного запроса (мс)."""
+
+    __slots__ = ("db", "queries", "tpl", "http", "_tpl_depth")
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.tpl = 0.0
+        self.http = 0.0
+        self._tpl_depth = 0
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("perf_timings", default=None)
+
+_windows: dict[str, deque] = {}
+_counts: dict[str, int] = {}
+_lock = threading.Lock()
+_started_at = timezone.now()
+_template_patched = False
+
+
+def current() -> Optional[Timings]:
+    """Замеры текущего запроса или None (вне запроса, в потоках пула)."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Добавить время блока к замеру name ("http", "tpl", "db") текущего запроса."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timings, name, getattr(timings, name) + (time.perf_counter() - t0) * 1000)
+
+
+def _sql_wrapper(timings: Timings):
+    def wrapper(execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            timings.db += (time.perf_counter() - t0) * 1000
+            timings.queries += 1
+
+    return wrapper
+
+
+def _patch_templates() -> None:
+    """Обернуть render() шаблонов Django один раз на процесс."""
+    global _template_patched
+    if _template_patched:
+        return
+    from django.template.backends.django import Template
+
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None or timings._tpl_depth:
+            return original(self, context, request)
+        timings._tpl_depth += 1
+        t0 = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            timings._tpl_depth -= 1
+            timings.tpl += (time.perf_counter() - t0) * 1000
+
+    Template.render = render
+    _template_patched = True
+
+
+def _record(view: str, total: float, timings: Timings) -> None:
+    window = int(getattr(settings, "PERF_WINDOW", 1000))
+    row = (total, timings.db, timings.queries, timings.tpl, timings.http)
+    with _lock:
+        values = _windows.get(view)
+        if values is None or values.maxlen != window:
+            values = _windows[view] = deque(values or (), maxlen=window)
+        values.append(row)
+        _counts[view] = _counts.get(view, 0) + 1
+
+
+def _percentile(sorted_values: list, p: int) -> float:
+    """Перцентиль методом ближайшего ранга."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def snapshot() -> list[dict]:
+    """Сводка по вьюхам: число запросов, p50/p95/p99 по каждому замеру окна. Сортировка — по p95 общего времени."""
+    with _lock:
+        windows = {view: list(values) for view, values in _windows.items()}
+        counts = dict(_counts)
+    result = []
+    for view, rows in windows.items():
+        item = {"view": view, "requests": counts.get(view, 0), "window": len(rows)}
+        for i, metric in enumerate(METRICS):
+            values = sorted(row[i] for row in rows)
+            item[metric] = {f"p{p}": round(_percentile(values, p), 1) for p in PERCENTILES}
+            item[metric]["max"] = round(values[-1], 1)
+        result.append(item)
+    result.sort(key=lambda item: item["total"]["p95"], reverse=True)
+    return result
+
+
+def reset() -> None:
+    global _started_at
+    with _lock:
+        _windows.clear()
+        _counts.clear()
+        _started_at = timezone.now()
+
+
+def server_timing(total: float, timings: Timings) -> str:
+    return ", ".join((
+        f'db;dur={timings.db:.1f};desc="SQL x{timings.queries}"',
+        f"tpl;dur={timings.tpl:.1f}",
+        f"http;dur={timings.http:.1f}",
+        f"total;dur={total:.1f}",
+    ))
+
+
+def _show_server_timing(request) -> bool:
+    mode = str(getattr(settings, "PERF_SERVER_TIMING", "staff")).lower()
+    if mode == "all":
+        return True
+    if mode == "staff":
+        # request.user ленивый: если вью к нему не обращалась, не загружать ради заголовка сессию и
+        # пользователя (два лишних запроса на каждый ответ API). Сотрудник видит замеры на страницах.
+        user = getattr(request, "user", None)
+        if user is None or getattr(user, "_wrapped", None) is empty:
+            return False
+        return bool(user.is_staff)
+    return False
+
+
+def _is_public(response) -> bool:
+    return getattr(response, "api_cache_public", False) or "public" in response.get("Cache-Control", "")
+
+
+class PerfMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PERF_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _patch_templates()
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        t0 = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                wrapper = _sql_wrapper(timings)
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = (time.perf_counter() - t0) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unresolved>"
+        _record(view, total, timings)
+        # Публично кэшируемый ответ (orders.http_cache) получили бы все — замеры в нём не нужны
+        if _show_server_timing(request) and not _is_public(response):
+            response["Server-Timing"] = server_timing(total, timings)
+        self._log(request, response, view, total, timings)
+        return response
+
+    def _log(self, request, response, view: str, total: float, timings: Timings) -> None:
+        slow_ms = float(getattr(settings, "PERF_SLOW_MS", 1000))
+        sample = float(getattr(settings, "PERF_LOG_SAMPLE_RATE", 0.01))
+        if total < slow_ms and (sample <= 0 or random.random() >= sample):
+            return
+        logger.info(json.dumps({
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total, 1),
+            "db_ms": round(timings.db, 1),
+            "queries": timings.queries,
+            "tpl_ms": round(timings.tpl, 1),
+            "http_ms": round(timings.http, 1),
+            "slow": total >= slow_ms,
+            "pid": os.getpid(),
+        }, ensure_ascii=False))
+
+
+@staff_member_required
+def perf_stats_view(request):
+    """
+    GET /backend/perf/ — p50/p95/p99 по вьюхам в памяти этого воркера (у каждого процесса gunicorn своё окно).
+    ?reset=1 — очистить окна.
+    """
+    if request.GET.get("reset"):
+        reset()
+    response = JsonResponse({
+        "pid": os.getpid(),
+        "since": _started_at.isoformat(),
+        "window": int(getattr(settings, "PERF_WINDOW", 1000)),
+        "units": "ms",
+        "views": snapshot(),
+    }, json_dumps_params={"ensure_ascii": False, "indent": 2})
+    add_never_cache_headers(response)
+    return response
@@ -0,0 +1,73 @@
+"""
+Sync queue export to Excel with constant memory.
+
+Rows are read with queryset.iterator() in chunks and written to an openpyxl write-only workbook
+backed by a temporary file. Only the ids that were actually written are marked as sent, so records
+queued while the export was running stay pending. Marking is returned as a callback: the job worker
+calls it only after the file is stored, so a failed save leaves the rows pending. Runs in the
+background job worker (jobs app).
+"""
+import tempfile
+
+from django.db import transaction
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+
+def export_queue_file(
+    qs, *, title, headers, widths, row, filename_prefix, sent_status,
+    wrap_headers=False, chunk_size=CHUNK_SIZE, progress=None,
+):
+    """
+    Write qs to a temporary .xlsx file. row(obj) -> list of cell values; widths — column widths in
+    header order; progress(done, total) is called after every chunk.
+    Returns (filename, file positioned at 0, mark_sent): mark_sent() sets status=sent_status,
+    sent_at=now on the exported rows and must be called once the file is persisted.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+
+    total = qs.count() if progress else 0
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    # In write-only mode widths must be set before the first row
+    for i, w in enumerate(widths[: len(headers)], 1):
+        ws.column_dimensions[get_column_letter(i)].width = min(w, 50)
+    bold = Font(bold=True)
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = bold
+        if wrap_headers:
+            cell.alignment = Alignment(wrap_text=True, vertical="top")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    exported_ids = []
+    for obj in qs.iterator(chunk_size=chunk_size):
+        ws.append(row(obj))
+        exported_ids.append(obj.pk)
+        if progress and len(exported_ids) % chunk_size == 0:
+            progress(len(exported_ids), max(total, len(exported_ids)))
+
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    try:
+        wb.save(tmp)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+
+    now = timezone.now()
+
+    def mark_sent():
+        with transaction.atomic():
+            for i in range(0, len(exported_ids), chunk_size):
+                qs.filter(pk__in=exported_ids[i:i + chunk_size]).update(status=sent_status, sent_at=now)
+
+    if progress:
+        progress(len(exported_ids), len(exported_ids))
+    return f"{filename_prefix}_{now.strftime('%Y%m%d_%H%M')}.xlsx", tmp, mark_sent
@@ -47,9 +47,15 @@ INSTALLED_APPS = [
     'catalog',
     'users',
     'orders',
+    'jobs',
+    'bench',
 ]
 
 MIDDLEWARE = [
+    # Первым: замеряет весь запрос (store.perf)
+    'store.perf.PerfMiddleware',
+    # До сессий: снимает cookie сессии с публично кэшируемых ответов API (orders.http_cache)
+    'orders.http_cache.ApiCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,8 +77,16 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Шаблоны читаются и компилируются один раз на процесс (воркер gunicorn).
+            # При runserver кэш сбрасывается автоперезагрузкой, когда шаблон меняется.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+            # catalog.*: значения ленивые, см. TEMPLATE_LAZY_CONTEXT
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -86,6 +100,10 @@ TEMPLATES = [
     },
 ]
 
+# Переменные контекст-процессоров catalog (cart_count, favorites_count, categories, hide_hero_nav) считаются,
+# только когда шаблон к ним обращается. False — считать при каждой отрисовке, как раньше (для сравнения: bench_templates)
+TEMPLATE_LAZY_CONTEXT = os.environ.get('TEMPLATE_LAZY_CONTEXT', 'True').lower() in ('true', '1', 'yes')
+
 WSGI_APPLICATION = 'store.wsgi.application'
 
 
@@ -136,6 +154,8 @@ if _FIVEPOST_ZONE_RAW:
         FIVEPOST_CITY_ZONE = _json.loads(_FIVEPOST_ZONE_RAW)
     except Exception:
         pass
+# Полная таблица город → зона из файла (JSON {"Город": зона} или CSV «город;зона»); FIVEPOST_CITY_ZONE её перекрывает
+FIVEPOST_CITY_ZONE_FILE = os.environ.get('FIVEPOST_CITY_ZONE_FILE', '').strip() or None
 
 # Почта России (tariff.pochta.ru): индекс отправителя для расчёта тарифа
 RUSSIANPOST_SENDER_INDEX = os.environ.get('RUSSIANPOST_SENDER_INDEX', '').strip() or None
@@ -148,6 +168,68 @@ if RUSSIANPOST_SENDER_INDEX is not None:
         RUSSIANPOST_SENDER_INDEX = None
 RUSSIANPOST_OBJECT = int(os.environ.get('RUSSIANPOST_OBJECT', '4040'))  # 4040 = посылка с ОЦ и наложенным
 RUSSIANPOST_TARIFF_URL = os.environ.get('RUSSIANPOST_TARIFF_URL', '').strip() or None
+# Кэш тарифов: TTL в секундах и длина префикса индекса получателя в ключе кэша
+RUSSIANPOST_TARIFF_CACHE_TTL = int(os.environ.get('RUSSIANPOST_TARIFF_CACHE_TTL', '43200'))
+RUSSIANPOST_INDEX_PREFIX_LEN = int(os.environ.get('RUSSIANPOST_INDEX_PREFIX_LEN', '3'))
+# Предрасчитанная таблица тарифов (JSON, команда build_russianpost_tariffs); пусто = не использовать
+RUSSIANPOST_TARIFF_TABLE = os.environ.get('RUSSIANPOST_TARIFF_TABLE', '').strip() or None
+
+# Параллельный расчёт доставки (/api/delivery/quotes/): общий дедлайн (сек) и размер пула потоков
+DELIVERY_QUOTES_DEADLINE = float(os.environ.get('DELIVERY_QUOTES_DEADLINE', '8'))
+DELIVERY_QUOTES_MAX_WORKERS = int(os.environ.get('DELIVERY_QUOTES_MAX_WORKERS', '8'))
+
+# Предохранитель API перевозчиков: открывается после N таймаутов/5xx подряд, проверка доступности через N сек
+CARRIER_BREAKER_FAILURES = int(os.environ.get('CARRIER_BREAKER_FAILURES', '5'))
+CARRIER_BREAKER_RESET = float(os.environ.get('CARRIER_BREAKER_RESET', '30'))
+
+# Подсказки городов: справочник в памяти воркера, перечитывается раз в CITY_SUGGEST_TTL сек.;
+# если городов больше CITY_SUGGEST_MAX_MEMORY — поиск в БД (триграммный индекс, миграция orders 0017)
+CITY_SUGGEST_TTL = int(os.environ.get('CITY_SUGGEST_TTL', '600'))
+CITY_SUGGEST_MAX_MEMORY = int(os.environ.get('CITY_SUGGEST_MAX_MEMORY', '200000'))
+
+# HTTP-кэш публичных GET API (orders.http_cache): max-age по источникам в секундах, 0 — не кэшировать.
+# Из .env JSON переопределяет значения по умолчанию: API_CACHE_MAX_AGE='{"cdek_pvz":1800,"cities":0}'
+API_CACHE_MAX_AGE = {}
+_API_CACHE_RAW = os.environ.get('API_CACHE_MAX_AGE', '').strip()
+if _API_CACHE_RAW:
+    try:
+        import json as _json
+        API_CACHE_MAX_AGE = _json.loads(_API_CACHE_RAW)
+    except Exception:
+        pass
+
+# Кэш отрисованных карточек товаров в каталоге (сек.). Ключ включает updated_at товара,
+# поэтому правка товара, варианта или фото сразу даёт новую карточку. 0 — не кэшировать.
+CATALOG_CARD_CACHE_TTL = int(os.environ.get('CATALOG_CARD_CACHE_TTL', '3600'))
+# Матрица вариантов страницы товара (catalog.variant_matrix), сек.; сбрасывается по updated_at товара
+CATALOG_VARIANT_MATRIX_TTL = int(os.environ.get('CATALOG_VARIANT_MATRIX_TTL', '3600'))
+# Индекс фасетного фильтра каталога (catalog.facets) в памяти воркера: пересборка раз в N сек.
+# (в своём воркере — сразу после изменения витрины)
+CATALOG_FACETS_TTL = int(os.environ.get('CATALOG_FACETS_TTL', '300'))
+# Снимок дерева категорий в памяти воркера (catalog.category_tree), сек.
+CATEGORY_TREE_TTL = int(os.environ.get('CATEGORY_TREE_TTL', '300'))
+# Уменьшенные копии фото товаров (catalog.thumbnails): формат webp или jpeg, качество 1–95
+THUMBNAILS_ENABLED = os.environ.get('THUMBNAILS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+THUMBNAIL_FORMAT = os.environ.get('THUMBNAIL_FORMAT', 'webp').strip().lower()
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', '80'))
+# Через сколько секунд снова пробовать уменьшить фото, которое не открылось как изображение
+THUMBNAIL_RETRY_AFTER = int(os.environ.get('THUMBNAIL_RETRY_AFTER', '3600'))
+
+# Фоновые задачи (jobs, python manage.py run_jobs): файлы выгрузок вне MEDIA_ROOT (отдаются только через админку),
+# пауза опроса пустой очереди (сек.), «зависшая» задача (сек.), сколько дней хранить завершённые
+JOBS_FILES_ROOT = os.environ.get('JOBS_FILES_ROOT', '').strip() or BASE_DIR / 'private' / 'jobs'
+JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', '2'))
+JOBS_STALE_AFTER = int(os.environ.get('JOBS_STALE_AFTER', '3600'))
+JOBS_KEEP_DAYS = int(os.environ.get('JOBS_KEEP_DAYS', '7'))
+
+# Замер запросов (store.perf): заголовок Server-Timing (staff — только персоналу, all — всем, off),
+# доля запросов в лог logs/perf.log (0.01 = 1%; медленнее PERF_SLOW_MS мс пишутся всегда),
+# сколько последних запросов на вью хранить для p50/p95/p99 на /backend/perf/
+PERF_ENABLED = os.environ.get('PERF_ENABLED', 'True').lower() in ('true', '1', 'yes')
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'staff').strip().lower()
+PERF_LOG_SAMPLE_RATE = float(os.environ.get('PERF_LOG_SAMPLE_RATE', '0.01'))
+PERF_SLOW_MS = float(os.environ.get('PERF_SLOW_MS', '1000'))
+PERF_WINDOW = int(os.environ.get('PERF_WINDOW', '1000'))
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -184,6 +266,16 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Сборка для продакшена: имена с хэшем содержимого и готовые .gz/.br (store.storage), nginx отдаёт их
+# с вечным кэшем. Требует collectstatic при каждом деплое — без манифеста {% static %} падает.
+STATIC_MANIFEST = os.environ.get('STATIC_MANIFEST', 'False').lower() in ('true', '1', 'yes')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'store.storage.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
 # Media (uploaded files, e.g. product images)
 MEDIA_URL = '/media/'
@@ -198,6 +290,10 @@ LOGGING = {
             "format": "%(asctime)s [%(levelname)s] %(message)s",
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
+        "perf": {
+            "format": "%(asctime)s %(message)s",
+            "datefmt": "%Y-%m-%d %H:%M:%S",
+        },
     },
     "handlers": {
         "cart_file": {
@@ -206,12 +302,23 @@ LOGGING = {
             "filename": str(BASE_DIR / "logs" / "cart.log"),
             "formatter": "cart",
         },
+        "perf_file": {
+            "level": "INFO",
+            "class": "logging.FileHandler",
+            "filename": str(BASE_DIR / "logs" / "perf.log"),
+            "formatter": "perf",
+        },
     },
     "loggers": {
         "catalog.cart": {
             "handlers": ["cart_file"],
             "level": "INFO",
         },
+        "store.perf": {
+            "handlers": ["perf_file"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -265,6 +372,8 @@ UNFOLD = {
                     {"title": "Добавить товар", "link": "/backend/catalog/product/add/", "icon": "add_circle"},
                     {"title": "Добавить категорию", "link": "/backend/catalog/category/add/", "icon": "add"},
                     {"title": "Добавить бренд", "link": "/backend/catalog/brand/add/", "icon": "add"},
+                    {"title": "Фоновые задачи", "link": "/backend/jobs/job/", "icon": "pending_actions"},
+                    {"title": "Время запросов", "link": "/backend/perf/", "icon": "speed"},
                 ],
             },
         ],
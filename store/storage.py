@@ -0,0 +1,62 @@
+"""
+Static files storage for production builds (STATIC_MANIFEST=True).
+
+ManifestStaticFilesStorage gives every file a content-hashed name (store.3f2a1c9e0b7d.css),
+so nginx can serve /static/ with far-future immutable caching. After collectstatic hashes the files,
+text assets are precompressed next to them (.gz always, .br if the brotli package is installed)
+for nginx gzip_static / brotli_static — no compression work per request.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml", ".ico", ".ttf", ".otf", ".eot")
+MIN_SIZE = 512  # bytes; smaller files are not worth a second request path
+MIN_SAVING = 0.05  # keep a variant only if it is at least 5% smaller
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_file(path: str) -> dict:
+    """
+    Write path.gz (and path.br if brotli is available) and remove stale variants that are no longer written.
+    Returns {"gz": size, "br": size} of written variants.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    written = {}
+    brotli = _brotli()
+    variants = {
+        "gz": lambda d: gzip.compress(d, compresslevel=9, mtime=0),
+        "br": (lambda d: brotli.compress(d, quality=11)) if brotli is not None else None,
+    }
+    for ext, compress in variants.items():
+        target = f"{path}.{ext}"
+        packed = compress(data) if compress is not None and len(data) >= MIN_SIZE else None
+        if packed is not None and len(packed) <= len(data) * (1 - MIN_SAVING):
+            with open(target, "wb") as f:
+                f.write(packed)
+            written[ext] = len(packed)
+        elif os.path.exists(target):
+            # A variant left from an older build of the same file would be served instead of it
+            os.remove(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus precompressed .gz/.br variants of hashed text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(hashed_name))
@@ -0,0 +1,23 @@
+"""
+Настройки для тестов: python manage.py test --settings=store.test_settings
+
+По умолчанию — SQLite в памяти, схема строится по моделям (часть миграций — SQL только для PostgreSQL).
+TEST_DB=postgres — локальный PostgreSQL из DB_* в .env (пользователю нужно право CREATEDB), с миграциями.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import os
+
+if os.environ.get('TEST_DB', 'sqlite').lower() != 'postgres':
+    DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+    MIGRATION_MODULES = {app: None for app in ('catalog', 'orders', 'users', 'jobs')}
+
+# Быстрые хэши паролей, без файлов логов и сборки статики, без обращений к хранилищу за копиями фото
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+LOGGING = {'version': 1, 'disable_existing_loggers': False}
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+THUMBNAILS_ENABLED = False
+ORDER_SYNC_API_KEY = None
+USER_SYNC_API_KEY = None
@@ -0,0 +1,111 @@
+"""
+Общее для тестов приложений: наполнение каталога и проверка числа SQL-запросов.
+
+QueryCountMixin.assertQueryCountFlat — число запросов страницы не больше заданного и не растёт
+с объёмом данных (N товаров, вариантов, строк корзины): так ловятся запросы в цикле по строкам.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SIZES = ("S", "M", "L", "XL")
+
+
+def seed_catalog(count, variants=2, category=None):
+    """
+    count товаров по variants вариантов (размеры SIZES) с фото; витрина и индексы пересобираются.
+    Возвращает список Product.
+    """
+    from catalog import category_tree, facets, listing
+    from catalog.models import (
+        Category,
+        Product,
+        ProductAttribute,
+        ProductAttributeValue,
+        ProductMedia,
+        ProductVariant,
+        ProductVariantAttribute,
+    )
+
+    if category is None:
+        root, _ = Category.objects.get_or_create(slug="odezhda", defaults={"name": "Одежда"})
+        category, _ = Category.objects.get_or_create(slug="futbolki", defaults={"name": "Футболки", "parent": root})
+    size, _ = ProductAttribute.objects.get_or_create(code="size", defaults={"name": "Размер"})
+    values = [
+        ProductAttributeValue.objects.get_or_create(attribute=size, value=label)[0]
+        for label in SIZES[:variants]
+    ]
+    start = Product.objects.count()
+    products = Product.objects.bulk_create([
+        Product(category=category, name=f"Товар {i}", slug=f"tovar-{i}", article=f"A{i}")
+        for i in range(start, start + count)
+    ])
+    product_variants = ProductVariant.objects.bulk_create([
+        ProductVariant(product=p, sku=f"A{start + n}-{value.value}", price=Decimal("1000") + n,
+                       pv=Decimal("10"), stock=100, is_default=not j, weight_g=300)
+        for n, p in enumerate(products)
+        for j, value in enumerate(values)
+    ])
+    ProductVariantAttribute.objects.bulk_create([
+        ProductVariantAttribute(variant=v, attribute_value=values[i % len(values)])
+        for i, v in enumerate(product_variants)
+    ])
+    ProductMedia.objects.bulk_create([
+        ProductMedia(product=p, file=f"products/test/{p.slug}.jpg") for p in products
+    ])
+    listing.refresh_all()
+    facets.invalidate()
+    category_tree.invalidate()
+    return products
+
+
+def add_variants(product, count):
+    """Добавить товару count вариантов без характеристик."""
+    from catalog import listing
+    from catalog.models import ProductVariant
+
+    start = product.variants.count()
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product=product, sku=f"{product.article}-x{i}", price=Decimal("500") + i, stock=5)
+        for i in range(start, start + count)
+    ])
+    product.save(update_fields=["updated_at"])
+    listing.refresh_products([product.pk])
+
+
+def cart_for(variants):
+    """Корзина в формате cart_logic: по строке на вариант."""
+    return {f"i_{v.pk:012d}": {"p": v.product_id, "v": v.pk, "q": 1} for v in variants}
+
+
+class QueryCountMixin:
+    """Для TestCase: кэши процесса (дерево категорий, фасеты) сбрасываются перед каждым тестом."""
+
+    def setUp(self):
+        from catalog import category_tree, facets
+
+        super().setUp()
+        cache.clear()
+        facets.invalidate()
+        category_tree.invalidate()
+
+    def count_queries(self, fetch):
+        with CaptureQueriesContext(connection) as ctx:
+            response = fetch()
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertQueryCountFlat(self, limit, fetch, grow):
+        """
+        fetch() — запрос страницы, grow() — увеличить объём данных. Первый вызов fetch() прогревает
+        кэши процесса; затем число запросов до и после grow() должно совпасть и быть не больше limit.
+        """
+        fetch()
+        before = self.count_queries(fetch)
+        grow()
+        fetch()
+        after = self.count_queries(fetch)
+        self.assertLessEqual(before, limit, f"запросов {before}, ожидалось не больше {limit}")
+        self.assertEqual(before, after, f"число запросов растёт с объёмом данных: {before} → {after}")
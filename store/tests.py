@@ -0,0 +1,157 @@
+"""
+Замер запросов (store.perf): формат Server-Timing, кому он показывается, перцентили окна и /backend/perf/.
+Предсжатие статики (store.storage.compress_file): пороги и удаление устаревших .gz/.br.
+
+python manage.py test --settings=store.test_settings
+"""
+import gzip
+import os
+import re
+import tempfile
+from unittest import mock
+
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import perf, storage
+
+SERVER_TIMING = re.compile(
+    r'^db;dur=\d+\.\d;desc="SQL x\d+", tpl;dur=\d+\.\d, http;dur=\d+\.\d, total;dur=\d+\.\d$'
+)
+
+
+# Ответ API без кэша: вью не обращается к request.user
+@override_settings(API_CACHE_MAX_AGE={"cdek_pvz": 0})
+class PerfTests(TestCase):
+    def setUp(self):
+        perf.reset()
+        self.addCleanup(perf.reset)
+        User = get_user_model()
+        self.staff = User.objects.create_user(email="staff@example.com", password="x", is_staff=True)
+        self.customer = User.objects.create_user(email="customer@example.com", password="x")
+
+    def test_server_timing_format(self):
+        timings = perf.Timings()
+        timings.db, timings.queries, timings.tpl, timings.http = 12.34, 3, 5.0, 120.06
+        self.assertEqual(
+            perf.server_timing(150.0, timings),
+            'db;dur=12.3;desc="SQL x3", tpl;dur=5.0, http;dur=120.1, total;dur=150.0',
+        )
+
+    def test_staff_only_by_default(self):
+        response = self.client.get(reverse("perf_stats"))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        self.client.force_login(self.customer)
+        self.assertFalse(self.client.get(reverse("perf_stats")).has_header("Server-Timing"))
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("perf_stats"))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], SERVER_TIMING)
+
+    def test_user_is_not_loaded_for_header(self):
+        self.client.force_login(self.staff)
+        with mock.patch("django.contrib.auth.get_user", wraps=auth.get_user) as get_user:
+            response = self.client.get(reverse("cdek_pvz_api"), {"city_code": "0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Server-Timing"))
+        get_user.assert_not_called()
+
+    def test_modes(self):
+        with self.settings(PERF_SERVER_TIMING="all"):
+            response = self.client.get(reverse("cdek_pvz_api"), {"city_code": "0"})
+        self.assertRegex(response["Server-Timing"], SERVER_TIMING)
+
+        self.client.force_login(self.staff)
+        with self.settings(PERF_SERVER_TIMING="off"):
+            self.assertFalse(self.client.get(reverse("perf_stats")).has_header("Server-Timing"))
+
+    def test_percentiles(self):
+        timings = perf.Timings()
+        with self.settings(PERF_WINDOW=50):
+            for total in range(1, 101):
+                timings.queries = total % 3
+                perf._record("slow", float(total), timings)
+            perf._record("fast", 1.0, timings)
+        slow, fast = perf.snapshot()
+        self.assertEqual((slow["view"], slow["requests"], slow["window"]), ("slow", 100, 50))
+        # В окне последние 50 запросов: 51..100 мс
+        self.assertEqual(slow["total"], {"p50": 75.0, "p95": 98.0, "p99": 100.0, "max": 100.0})
+        self.assertEqual(slow["queries"]["max"], 2)
+        self.assertEqual((fast["view"], fast["total"]["p99"]), ("fast", 1.0))
+
+    def test_stats_view(self):
+        perf._record("catalog:list", 10.0, perf.Timings())
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse("perf_stats")).json()
+        self.assertEqual(data["units"], "ms")
+        self.assertEqual([item["view"] for item in data["views"]], ["catalog:list"])
+
+        response = self.client.get(reverse("perf_stats"), {"reset": "1"})
+        self.assertEqual(response.json()["views"], [])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+
+
+class CompressFileTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        # Без brotli в окружении .br не пишется; подменяем модуль, чтобы проверить оба варианта
+        brotli = mock.Mock()
+        brotli.compress.side_effect = lambda data, quality: gzip.compress(data)[:-1]
+        patcher = mock.patch.object(storage, "_brotli", return_value=brotli)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def variants(self, path):
+        return sorted(ext for ext in ("gz", "br") if os.path.exists(f"{path}.{ext}"))
+
+    def test_compressible_file(self):
+        data = b"body { color: red; }\n" * 100
+        path = self.write("site.css", data)
+        written = storage.compress_file(path)
+        self.assertEqual(sorted(written), ["br", "gz"])
+        with gzip.open(path + ".gz") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(written["gz"], os.path.getsize(path + ".gz"))
+
+    def test_thresholds(self):
+        small = self.write("small.js", b"x" * (storage.MIN_SIZE - 1))
+        self.assertEqual((storage.compress_file(small), self.variants(small)), ({}, []))
+        noise = self.write("noise.ico", os.urandom(4096))
+        self.assertEqual((storage.compress_file(noise), self.variants(noise)), ({}, []))
+
+    def test_outdated_variants_are_removed(self):
+        path = self.write("app.js", b"console.log(1);\n" * 100)
+        storage.compress_file(path)
+        self.assertEqual(self.variants(path), ["br", "gz"])
+
+        # Тот же путь, содержимое больше не сжимается — старые .gz/.br отдавались бы вместо файла
+        self.write("app.js", os.urandom(4096))
+        self.assertEqual(storage.compress_file(path), {})
+        self.assertEqual(self.variants(path), [])
+
+        self.write("app.js", b"console.log(1);\n" * 100)
+        storage.compress_file(path)
+        self.write("app.js", b"x")
+        storage.compress_file(path)
+        self.assertEqual(self.variants(path), [])
+
+        # brotli пропал из окружения — .br от прошлой сборки удаляется
+        self.write("app.js", b"console.log(1);\n" * 100)
+        storage.compress_file(path)
+        with mock.patch.object(storage, "_brotli", return_value=None):
+            self.assertEqual(sorted(storage.compress_file(path)), ["gz"])
+        self.assertEqual(self.variants(path), ["gz"])
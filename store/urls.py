@@ -20,6 +20,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import RedirectView
 
+from store.perf import perf_stats_view
+
 from orders.views import (
     cities_autocomplete_api,
     cdek_cities_api,
@@ -28,6 +30,7 @@ from orders.views import (
     cdek_pvz_api,
     cdek_refresh_token_api,
     cdek_status_api,
+    delivery_quotes_api,
     fivepost_delivery_cost_api,
     fivepost_pvz_api,
     order_detail_api,
@@ -42,6 +45,8 @@ from users.api_sync import (
 )
 
 urlpatterns = [
+    # До админки: иначе /backend/perf/ перехватит admin.site.urls
+    path("backend/perf/", perf_stats_view, name="perf_stats"),
     path("backend/", admin.site.urls),
     path("account/", include("users.urls")),
     path("catalog/", include("catalog.urls")),
@@ -82,6 +87,9 @@ urlpatterns = [
     path("api/fivepost/delivery-cost", fivepost_delivery_cost_api, name="fivepost_delivery_cost_api_no_slash"),
     path("api/fivepost/pvz/", fivepost_pvz_api, name="fivepost_pvz_api"),
     path("api/fivepost/pvz", fivepost_pvz_api, name="fivepost_pvz_api_no_slash"),
+    # Все ТК сразу: параллельный расчёт с общим дедлайном
+    path("api/delivery/quotes/", delivery_quotes_api, name="delivery_quotes_api"),
+    path("api/delivery/quotes", delivery_quotes_api, name="delivery_quotes_api_no_slash"),
     # Почта России: расчёт по индексу получателя (tariff.pochta.ru)
     path("api/russianpost/delivery-cost/", russianpost_delivery_cost_api, name="russianpost_delivery_cost_api"),
     path("api/russianpost/delivery-cost", russianpost_delivery_cost_api, name="russianpost_delivery_cost_api_no_slash"),
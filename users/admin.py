@@ -1,9 +1,9 @@
 from django.contrib import admin
-from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.urls import path
 
-from .export_excel import export_pending_to_excel
+from jobs.views import enqueue_view
+
 from .models import User, UserAddress, UserSyncQueue
 
 
@@ -67,7 +67,7 @@ class UserSyncQueueAdmin(admin.ModelAdmin):
         extra = [
             path(
                 "export-excel/",
-                staff_member_required(export_pending_to_excel),
+                enqueue_view("users.sync_queue_excel"),
                 name="users_usersyncqueue_export_excel",
             ),
         ]
@@ -1,61 +1,45 @@
 """
 Выгрузка очереди пользователей в Excel.
 """
-from django.http import HttpResponse
-from django.utils import timezone
+from store.services.queue_export import export_queue_file
 
 from .models import UserSyncQueue
 
 
 HEADERS = ["id", "action", "user_uuid", "created_at", "uuid", "email", "first_name", "last_name", "phone", "is_business_user", "referred_by_uuid", "is_active", "date_joined"]
 PAYLOAD_KEYS = ["uuid", "email", "first_name", "last_name", "phone", "is_business_user", "referred_by_uuid", "is_active", "date_joined"]
-
-
-def export_pending_to_excel(request):
-    """Экспорт всех pending записей в Excel, затем пометка как sent."""
-    from openpyxl import Workbook
-    from openpyxl.styles import Alignment, Font
-    from openpyxl.utils import get_column_letter
-
+# Ширина колонок
+WIDTHS = [8, 12, 38, 18, 38, 28, 18, 18, 16, 8, 38, 6, 22]
+
+
+def _row(r):
+    payload = r.payload or {}
+    row = [
+        r.id,
+        r.action,
+        str(r.user_uuid) if r.user_uuid else "",
+        r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else "",
+    ]
+    for k in PAYLOAD_KEYS:
+        v = payload.get(k)
+        row.append(v if v is not None else "")
+    return row
+
+
+def export_pending_to_excel(progress=None):
+    """
+    Экспорт всех pending записей в Excel. Выполняется фоновой задачей (users.jobs);
+    возвращает (имя файла, файл, mark_sent) — пометку выгруженных как sent воркер делает после сохранения файла.
+    """
     qs = UserSyncQueue.objects.filter(status=UserSyncQueue.Status.PENDING).order_by("created_at")
-    rows = list(qs)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Очередь выгрузки"
-
-    ws.append(HEADERS)
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(wrap_text=True, vertical="top")
-
-    for r in rows:
-        payload = r.payload or {}
-        row = [
-            r.id,
-            r.action,
-            str(r.user_uuid) if r.user_uuid else "",
-            r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else "",
-        ]
-        for k in PAYLOAD_KEYS:
-            v = payload.get(k)
-            row.append(v if v is not None else "")
-        ws.append(row)
-
-    # Ширина колонок
-    widths = [8, 12, 38, 18, 38, 28, 18, 18, 16, 8, 38, 6, 22]
-    for i, w in enumerate(widths[: len(HEADERS)], 1):
-        ws.column_dimensions[get_column_letter(i)].width = min(w, 50)
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return export_queue_file(
+        qs,
+        title="Очередь выгрузки",
+        headers=HEADERS,
+        widths=WIDTHS,
+        row=_row,
+        filename_prefix="user_sync_queue",
+        sent_status=UserSyncQueue.Status.SENT,
+        wrap_headers=True,
+        progress=progress,
     )
-    fname = f"user_sync_queue_{timezone.now().strftime('%Y%m%d_%H%M')}.xlsx"
-    response["Content-Disposition"] = f'attachment; filename="{fname}"'
-
-    wb.save(response)
-
-    now = timezone.now()
-    qs.update(status=UserSyncQueue.Status.SENT, sent_at=now)
-
-    return response
@@ -0,0 +1,9 @@
+"""Фоновые задачи пользователей (выполняет jobs: python manage.py run_jobs)."""
+from jobs.registry import register
+
+from .export_excel import export_pending_to_excel
+
+
+@register("users.sync_queue_excel", "Выгрузка очереди пользователей в Excel")
+def sync_queue_excel(job, progress):
+    return export_pending_to_excel(progress)
@@ -0,0 +1,34 @@
+"""
+Число SQL-запросов API выгрузки пользователей не растёт с числом пользователей.
+
+python manage.py test --settings=store.test_settings
+"""
+from django.test import TestCase
+from django.urls import reverse
+
+from store.testing import QueryCountMixin
+
+from .models import User
+
+
+class UserBatchApiQueryCountTests(QueryCountMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.mentor = User.objects.create_user(email="mentor@example.com", password="x")
+        self.users = []
+
+    def _create_users(self, count):
+        start = len(self.users)
+        for i in range(start, start + count):
+            self.users.append(User.objects.create_user(
+                email=f"user{i}@example.com", password="x", referred_by=self.mentor,
+            ))
+
+    def test_user_detail_batch_api(self):
+        self._create_users(2)
+        url = reverse("user_detail_batch_api")
+
+        def fetch():
+            return self.client.get(url, {"uuids": ",".join(str(u.uuid) for u in self.users)})
+
+        self.assertQueryCountFlat(1, fetch, lambda: self._create_users(30))